@@ -11,3 +11,8 @@ class IsMerchant(BasePermission):
 class IsAgent(BasePermission):
     def has_permission(self, request, view):
         return request.user.role == 'Agent'
+
+class CanScanTickets(BasePermission):
+    # Gate scanners: users granted `api.scan_tickets`, directly or through a group
+    def has_permission(self, request, view):
+        return request.user.has_perm('api.scan_tickets')
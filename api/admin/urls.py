@@ -1,10 +1,12 @@
 from django.urls import path
-from .views import promote_to_merchant, list_merchants, list_agents, ticket_sales_log, update_payout_settings
+from .views import promote_to_merchant, list_merchants, list_agents, ticket_sales_log, update_payout_settings, admission_stats, agent_velocity
 
 urlpatterns = [
     path('promote-to-merchant/<uuid:user_id>/', promote_to_merchant, name='promote_to_merchant'),
     path('merchants/', list_merchants, name='list_merchants'),
     path('agents/', list_agents, name='list_agents'),
+    path('agents/<uuid:user_id>/velocity/', agent_velocity, name='agent_velocity'),
+    path('admission-stats/', admission_stats, name='admission_stats'),
     path('ticket-sales-log/', ticket_sales_log, name='ticket_sales_log'),
     path('update-payout-settings/', update_payout_settings, name='update_payout_settings'),
 
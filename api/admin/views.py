@@ -11,8 +11,11 @@ from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
 from django.db.models import Count, Sum
 import csv
+from django.conf import settings
 from django.utils import timezone
 from decimal import Decimal
+from api.middleware import admission_controller
+from api.ticket.velocity import velocity_limiter
 
 
 @swagger_auto_schema(
@@ -282,3 +285,64 @@ def update_payout_settings(request):
         return Response({
             "error": str(e)
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@swagger_auto_schema(
+    method='GET',
+    operation_summary="Admission Control Stats",
+    operation_description="In-flight, admitted and rejected request counts per lane, for all the worker "
+                          "processes of the host serving this request (or only that process with the 'local' "
+                          "backend).",
+    responses={200: "Counters per lane (critical, default, heavy)."}
+)
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def admission_stats(request):
+    """
+    Report the admission control counters of this host (or process, see `ADMISSION_BACKEND`).
+
+    Returns:
+    - `lanes`: `in_flight`, `admitted` and `rejected` per lane, and the configured limits.
+    """
+    return Response({
+        "lanes": admission_controller.stats(),
+        "limits": {
+            "max_in_flight": settings.ADMISSION_MAX_IN_FLIGHT,
+            "critical_reserve": settings.ADMISSION_CRITICAL_RESERVE,
+            "heavy_limit": settings.ADMISSION_HEAVY_LIMIT,
+        },
+    }, status=status.HTTP_200_OK)
+
+
+@swagger_auto_schema(
+    method='GET',
+    operation_summary="Agent Sales Velocity",
+    operation_description="Tickets sold by an agent over the last minute and hour, with the configured limits. "
+                          "With `TICKET_VELOCITY_BACKEND = 'local'` the counts are those of the worker process "
+                          "serving the request (`scope`: `process`), not the agent's total.",
+    responses={
+        200: "Velocity per window.",
+        404: "User not found.",
+    }
+)
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def agent_velocity(request, user_id):
+    """
+    Report an agent's current ticket sales velocity.
+
+    - user_id (UUID): The unique identifier of the agent's user.
+
+    Returns:
+    - `minute` and `hour`: Tickets sold in the sliding window and its limit (null if unlimited).
+    - `scope`: `shared` for counts across all processes, `process` for this process only.
+    """
+    if not User.objects.filter(pk=user_id).exists():
+        return Response({"error": "User not found."}, status=status.HTTP_404_NOT_FOUND)
+
+    return Response({
+        "user_id": user_id,
+        "backend": settings.TICKET_VELOCITY_BACKEND,
+        "scope": "shared" if settings.TICKET_VELOCITY_BACKEND == 'cache' else "process",
+        **velocity_limiter.velocity(user_id),
+    }, status=status.HTTP_200_OK)
@@ -1,6 +1,17 @@
 from django.apps import AppConfig
+from django.core.signals import request_started
 
 
 class ApiConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "api"
+
+    def ready(self):
+        from api import checks  # noqa: F401
+        from api.ticket.catalog import sync_catalog
+        from api.ticket.code_filter import start_code_filter
+
+        # Drop stale ticket type catalogs before any view reads them
+        request_started.connect(sync_catalog, dispatch_uid="sync_ticket_type_catalog")
+        # Build the ticket code filter in the background once the process serves requests
+        request_started.connect(start_code_filter, dispatch_uid="start_ticket_code_filter")
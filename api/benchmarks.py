@@ -0,0 +1,393 @@
+"""
+Benchmarks run by `manage.py benchmark <name>`, against the configured database.
+
+Each benchmark creates its own fixtures and reports its figures through `report(line)`;
+the command rolls everything back afterwards.
+"""
+import io
+import random
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.test.utils import override_settings
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory, force_authenticate
+from django.utils import timezone
+
+from api.allocator import CODE_CHARS, ticket_codes
+from api.models import Agent, PayoutRequest, Ticket, TicketType, User, Voucher, Wallet, uuid7
+from api.parsers import FastJSONParser
+from api.payout.serializer import PayoutRequestSerializer, payout_request_encoder
+from api.renderers import FastJSONRenderer
+from api.signed_codes import sign_ticket_code, verify_ticket_code
+from api.ticket.archive import archive_expired_tickets, table_sizes
+from api.ticket.issuance import issue_tickets
+from api.ticket.pagination import CURSOR_FIELDS, decode_cursor, keyset_page, split_page
+from api.ticket.serializer import TicketSerializer, ticket_row_encoder
+from api.ticket.views import _signed_code_result, check_ticket_validity, check_tickets_validity
+from api.voucher.serializer import VoucherListSerializer, voucher_list_encoder
+
+# name -> (function, default number of rows, description)
+BENCHMARKS = {}
+
+
+def benchmark(name, rows, description):
+    def register(func):
+        BENCHMARKS[name] = (func, rows, description)
+        return func
+    return register
+
+
+class Measurement:
+    seconds = 0.0
+    queries = 0
+
+
+@contextmanager
+def measure():
+    """
+    Time the block and count the queries it runs.
+    """
+    measurement = Measurement()
+
+    # Counted with a wrapper rather than the query log, which keeps only the last 9000
+    def count(execute, sql, params, many, context):
+        measurement.queries += 1
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(count):
+        start = time.perf_counter()
+        yield measurement
+        measurement.seconds = time.perf_counter() - start
+
+
+def make_agent(login_id='BEN-001', balance=Decimal('10000000.00')):
+    user = User.objects.create_user(username=login_id, password='benchmark', login_id=login_id, role='Agent')
+    Wallet.objects.create(user=user, voucher_balance=balance)
+    Agent.objects.create(user=user)
+    return user
+
+
+def make_ticket_type(name='Benchmark', **fields):
+    fields.setdefault('unit_price', Decimal('10.00'))
+    fields.setdefault('expiration_date', timezone.now() + timedelta(days=30))
+    return TicketType.objects.create(name=name, **fields)
+
+
+def seed_tickets(count, agent, ticket_type, prefix='S', batch_size=5000, make_id=uuid7, **fields):
+    """
+    Insert `count` tickets with codes `<prefix><serial>`, bypassing the code allocator.
+    """
+    fields.setdefault('valid_until', ticket_type.expiration_date)
+    width = 8 - len(prefix)
+    for start in range(0, count, batch_size):
+        Ticket.objects.bulk_create([
+            Ticket(id=make_id(), ticket_code=f"{prefix}{serial:0{width}d}", buyer_name='Seed', buyer_contact='0',
+                   agent=agent, ticket_type=ticket_type, **fields)
+            for serial in range(start, min(start + batch_size, count))
+        ], batch_size=batch_size)
+
+
+def per_row(label, measurement, rows, unit='ticket'):
+    return (f"{label}: {measurement.seconds * 1000 / rows:.3f} ms and {measurement.queries / rows:.2f} queries "
+            f"per {unit} ({rows / measurement.seconds:,.0f} {unit}s/s)")
+
+
+def _probe_ticket_code():
+    # How ticket codes were picked before the allocator: random guesses checked one by one
+    while True:
+        code = ''.join(random.choices(CODE_CHARS, k=8))
+        if not Ticket.objects.filter(ticket_code=code).exists():
+            return code
+
+
+def _issue_one_by_one(agent, ticket_type, quantity):
+    # The path `create_tickets` used before bulk issuance: a validated serializer, a
+    # probed random code and an INSERT per ticket
+    for _ in range(quantity):
+        serializer = TicketSerializer(
+            data={'ticket_type': ticket_type.pk, 'buyer_name': 'Bench', 'buyer_contact': '0'},
+            context={'agent': agent},
+        )
+        serializer.is_valid(raise_exception=True)
+        Ticket.objects.create(ticket_code=_probe_ticket_code(), agent=agent, valid_until=ticket_type.expiration_date,
+                              **serializer.validated_data)
+
+
+@benchmark('issuance', rows=500, description="Per-ticket cost of one create_tickets batch, bulk vs one by one.")
+def issuance_benchmark(rows, report):
+    agent = make_agent()
+    ticket_type = make_ticket_type()
+    seed_tickets(10000, agent, ticket_type)
+
+    with measure() as one_by_one:
+        _issue_one_by_one(agent, ticket_type, rows)
+    with measure() as bulk:
+        issue_tickets(agent, ticket_type, rows, 'Bench', '0')
+
+    report(f"Batch of {rows} tickets, 10,000 already in the table")
+    report(per_row("One by one", one_by_one, rows))
+    report(per_row("Bulk      ", bulk, rows))
+
+
+@benchmark('allocation', rows=10_000_000,
+           description="Ticket code allocation rate with `rows` tickets in the table, allocator vs random probing.")
+def allocation_benchmark(rows, report):
+    codes = 10000
+    agent = make_agent()
+    ticket_type = make_ticket_type()
+    seed_tickets(rows, agent, ticket_type)
+
+    with measure() as probing:
+        for _ in range(codes):
+            _probe_ticket_code()
+    with measure() as one_at_a_time:
+        for _ in range(codes):
+            ticket_codes.allocate()
+    with measure() as batches:
+        for _ in range(codes // 1000):
+            ticket_codes.allocate(1000)
+
+    report(f"{codes:,} ticket codes, {rows:,} tickets already in the table")
+    report(per_row("Random probing           ", probing, codes, unit='code'))
+    report(per_row("Allocator, 1 per call    ", one_at_a_time, codes, unit='code'))
+    report(per_row("Allocator, 1000 per call ", batches, codes, unit='code'))
+
+
+@benchmark('uuid-inserts', rows=200_000,
+           description="Ticket insert throughput with random (uuid4) vs time-ordered (uuid7) primary keys.")
+def uuid_inserts_benchmark(rows, report):
+    agent = make_agent()
+    ticket_type = make_ticket_type()
+    # The existing rows carry random keys, as before uuid7
+    seed_tickets(rows, agent, ticket_type, make_id=uuid.uuid4)
+
+    results = {}
+    for label, make_id in (("uuid4", uuid.uuid4), ("uuid7", uuid7)):
+        with transaction.atomic():
+            with measure() as results[label]:
+                seed_tickets(rows, agent, ticket_type, prefix='N', batch_size=1000, make_id=make_id)
+            transaction.set_rollback(True)
+
+    report(f"{rows:,} tickets inserted in batches of 1000, {rows:,} already in the table")
+    for label, measurement in results.items():
+        report(per_row(label, measurement, rows))
+
+
+@benchmark('archive', rows=200_000,
+           description="Hot ticket table and index sizes before and after archiving half of `rows` tickets.")
+def archive_benchmark(rows, report):
+    agent = make_agent()
+    live = make_ticket_type(name='Live')
+    expired = make_ticket_type(name='Expired', expiration_date=timezone.now() - timedelta(days=365))
+    seed_tickets(rows - rows // 2, agent, live, prefix='L')
+    seed_tickets(rows // 2, agent, expired, prefix='E')
+
+    def report_sizes(label):
+        for table, size in table_sizes().items():
+            report(f"{label} {table}: {size['rows']:,} rows, data {size['data_bytes']} bytes, "
+                   f"indexes {size['index_bytes']} bytes")
+
+    report_sizes("Before")
+    with measure() as archiving:
+        archived = archive_expired_tickets(retention_days=90)
+    report_sizes("After ")
+    report(per_row("Archiving", archiving, archived))
+
+
+@benchmark('pagination', rows=1_000_000,
+           description="Cost of one page of the ticket listing at increasing depths, keyset vs OFFSET.")
+def pagination_benchmark(rows, report):
+    page_size = 100
+    pages = 20
+    agent = make_agent()
+    ticket_type = make_ticket_type()
+    seed_tickets(rows, agent, ticket_type)
+
+    tickets = Ticket.objects.values(*CURSOR_FIELDS, 'ticket_code')
+    ordered = tickets.order_by('created_at', 'id')
+
+    report(f"Pages of {page_size} tickets, {rows:,} tickets in the table, {pages} pages read at each depth")
+    for depth in (0.0, 0.1, 0.5, 0.9):
+        offset = int((rows - page_size * pages) * depth)
+        # The cursor a client scrolling this far would hold, looked up outside the measurement
+        cursor = None
+        if offset:
+            row = ordered[offset - 1:offset].get()
+            cursor = (row['created_at'], row['id'])
+
+        with measure() as by_offset:
+            for page in range(pages):
+                start = offset + page * page_size
+                list(ordered[start:start + page_size])
+        with measure() as by_keyset:
+            for page in range(pages):
+                page_rows, next_cursor = split_page(list(keyset_page(tickets, cursor, page_size)), page_size)
+                cursor = decode_cursor(next_cursor)
+
+        report(f"Offset {offset:>9,}: OFFSET {by_offset.seconds * 1000 / pages:8.2f} ms per page, "
+               f"keyset {by_keyset.seconds * 1000 / pages:8.2f} ms per page")
+
+
+def seed_vouchers(count, owner, seller, batch_size=5000):
+    for start in range(0, count, batch_size):
+        Voucher.objects.bulk_create([
+            Voucher(voucher_code=f"SV{serial:08d}", owner=owner, seller=seller, amount=Decimal('1500.50'))
+            for serial in range(start, min(start + batch_size, count))
+        ], batch_size=batch_size)
+
+
+def seed_payout_requests(count, user, batch_size=5000):
+    for start in range(0, count, batch_size):
+        PayoutRequest.objects.bulk_create([
+            PayoutRequest(user=user, amount=Decimal('250.00'), salary=Decimal('99.99'), payment_id=f"SP{serial:08d}")
+            for serial in range(start, min(start + batch_size, count))
+        ], batch_size=batch_size)
+
+
+@benchmark('encoders', rows=20000,
+           description="Rows per second of the ticket, voucher and payout listings, ModelSerializer vs row encoder.")
+def encoders_benchmark(rows, report):
+    agent = make_agent()
+    seller = make_agent(login_id='BEN-002')
+    seed_tickets(rows, agent, make_ticket_type())
+    seed_vouchers(rows, agent, seller)
+    seed_payout_requests(rows, agent)
+
+    # The serializer querysets join what the serializers read, as the listings did
+    listings = (
+        ("Tickets ", Ticket.objects.select_related('agent'), TicketSerializer, ticket_row_encoder),
+        ("Vouchers", Voucher.objects.select_related('owner'), VoucherListSerializer, voucher_list_encoder),
+        ("Payouts ", PayoutRequest.objects.select_related('user'), PayoutRequestSerializer, payout_request_encoder),
+    )
+
+    report(f"{rows:,} rows per listing, including the query")
+    for label, queryset, serializer_class, encoder in listings:
+        with measure() as serializer:
+            serializer_class(queryset.all(), many=True).data
+        with measure() as encoded:
+            encoder.render(queryset.all())
+        report(per_row(f"{label} serializer", serializer, rows, unit='row'))
+        report(per_row(f"{label} encoder   ", encoded, rows, unit='row'))
+
+
+@benchmark('renderers', rows=20000,
+           description="Rendering and parsing large ticket and voucher lists, DRF's JSON classes vs the orjson ones.")
+def renderers_benchmark(rows, report):
+    repeat = 5
+    agent = make_agent()
+    seller = make_agent(login_id='BEN-002')
+    seed_tickets(rows, agent, make_ticket_type())
+    seed_vouchers(rows, agent, seller)
+
+    payloads = (
+        ("Tickets ", {"tickets": ticket_row_encoder.render(Ticket.objects.all())}),
+        ("Vouchers", {"vouchers": voucher_list_encoder.render(Voucher.objects.all())}),
+        # Unformatted rows: datetimes, decimals and UUIDs left to the renderer
+        ("Raw rows", {"vouchers": list(Voucher.objects.values())}),
+    )
+
+    report(f"{rows:,} rows per list, best of {repeat} renders and parses")
+    for label, data in payloads:
+        times = {}
+        for name, renderer, parser in (("DRF   ", JSONRenderer(), JSONParser()),
+                                       ("orjson", FastJSONRenderer(), FastJSONParser())):
+            render_times, parse_times = [], []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                body = renderer.render(data)
+                render_times.append(time.perf_counter() - start)
+                start = time.perf_counter()
+                parser.parse(io.BytesIO(body))
+                parse_times.append(time.perf_counter() - start)
+            times[name] = (body, min(render_times), min(parse_times))
+
+        bodies = {body for body, _, _ in times.values()}
+        report(f"{label}: {len(next(iter(bodies))) / 2 ** 20:.1f} MiB, "
+               f"{'identical output' if len(bodies) == 1 else 'OUTPUT DIFFERS'}")
+        for name, (_, render_seconds, parse_seconds) in times.items():
+            report(f"  {name}: render {render_seconds * 1000:7.1f} ms ({rows / render_seconds:,.0f} rows/s), "
+                   f"parse {parse_seconds * 1000:7.1f} ms ({rows / parse_seconds:,.0f} rows/s)")
+
+
+@benchmark('batch-check', rows=100_000,
+           description="Ticket validation throughput of the batch endpoint vs one check-ticket call per code.")
+def batch_check_benchmark(rows, report):
+    codes = 5000
+    batch_size = 500
+    agent = make_agent()
+    seed_tickets(rows, agent, make_ticket_type())
+    # Half of the checked codes exist, half are mistyped
+    ticket_codes = [f"S{serial:07d}" for serial in random.sample(range(rows), codes // 2)]
+    ticket_codes += [f"X{serial:07d}" for serial in range(codes - len(ticket_codes))]
+    random.shuffle(ticket_codes)
+
+    factory = APIRequestFactory()
+
+    def call(view, request, **kwargs):
+        force_authenticate(request, agent)
+        response = view(request, **kwargs)
+        response.render()
+        return response
+
+    # The code filter and the ticket cache are left out: both endpoints share them, and the
+    # filter's background build cannot see the benchmark's uncommitted tickets
+    with override_settings(TICKET_CODE_FILTER_ENABLED=False, TICKET_CACHE_SIZE=0):
+        with measure() as single:
+            for ticket_code in ticket_codes:
+                call(check_ticket_validity, factory.get(f'/api/ticket/check-ticket/{ticket_code}/'),
+                     ticket_code=ticket_code)
+        with measure() as batch:
+            for start in range(0, codes, batch_size):
+                call(check_tickets_validity, factory.post('/api/ticket/check-tickets/', {
+                    'ticket_codes': ticket_codes[start:start + batch_size],
+                }, format='json'))
+
+    report(f"{codes:,} codes (half of them unknown), {rows:,} tickets in the table")
+    report(per_row("check-ticket, one call per code ", single, codes, unit='code'))
+    report(per_row(f"check-tickets, {batch_size} codes per call", batch, codes, unit='code'))
+
+
+@benchmark('signed-codes', rows=100_000,
+           description="Signed ticket code throughput: signing and CPU-only verification vs a database lookup.")
+def signed_codes_benchmark(rows, report):
+    type_count = 20
+    lookups = min(rows, 5000)
+    agent = make_agent()
+    ticket_types = [make_ticket_type(name=f"Benchmark {index}") for index in range(type_count)]
+    expired = make_ticket_type(name='Expired', expiration_date=timezone.now() - timedelta(days=1))
+    ticket_types.append(expired)
+    seed_tickets(lookups, agent, ticket_types[0])
+
+    serials = [f"S{serial:07d}" for serial in range(rows)]
+    with measure() as signing:
+        genuine = [sign_ticket_code(serial, ticket_types[index % type_count].id)
+                   for index, serial in enumerate(serials)]
+    # Same serial and type tag, wrong MAC
+    forged = [code[:-1] + ('A' if code[-1] != 'A' else 'B') for code in genuine]
+    expired_codes = [sign_ticket_code(serial, expired.id) for serial in serials]
+
+    with measure() as verifying:
+        for code in genuine:
+            verify_ticket_code(code, ticket_types)
+    with measure() as rejecting:
+        for code in forged:
+            verify_ticket_code(code, ticket_types)
+    with measure() as expiring:
+        for code in expired_codes:
+            _signed_code_result(code, ticket_types)
+    with measure() as looking_up:
+        for serial in serials[:lookups]:
+            Ticket.objects.filter(ticket_code=serial).exists()
+
+    report(f"{rows:,} codes over {len(ticket_types)} ticket types, lookups over {lookups:,} tickets")
+    report(per_row("Signing                        ", signing, rows, unit='code'))
+    report(per_row("Verifying genuine codes        ", verifying, rows, unit='code'))
+    report(per_row("Rejecting forged codes         ", rejecting, rows, unit='code'))
+    report(per_row("Answering expired codes (check)", expiring, rows, unit='code'))
+    report(per_row("Database lookup, for reference ", looking_up, lookups, unit='code'))
@@ -0,0 +1,17 @@
+from django.conf import settings
+from django.core.checks import Error, register
+
+
+@register()
+def check_ticket_cache_backend(app_configs, **kwargs):
+    """
+    The ticket cache reads a shared revision on every lookup, which only pays off on a
+    network cache (Memcached or Redis).
+    """
+    if settings.TICKET_CACHE_SIZE > 0 and not settings.SHARED_MEMORY_CACHE:
+        return [Error(
+            "TICKET_CACHE_SIZE is set but the cache backend is not Memcached or Redis.",
+            hint="Point CACHE_BACKEND/CACHE_LOCATION to Memcached or Redis, or set TICKET_CACHE_SIZE=0.",
+            id='api.E001',
+        )]
+    return []
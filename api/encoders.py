@@ -0,0 +1,162 @@
+import copy
+
+from drf_yasg import openapi
+from rest_framework import serializers
+
+fields_param = openapi.Parameter(
+    'fields',
+    openapi.IN_QUERY,
+    description="Comma-separated fields to return (default: all). Nested objects not listed in `expand` "
+                "come back as their id.",
+    type=openapi.TYPE_STRING,
+    required=False,
+)
+expand_param = openapi.Parameter(
+    'expand',
+    openapi.IN_QUERY,
+    description="Comma-separated nested objects to return in full when `fields` is given.",
+    type=openapi.TYPE_STRING,
+    required=False,
+)
+
+
+class RowEncoder:
+    """
+    Read-only fast path for a ModelSerializer: encodes `values()` rows into the same
+    dicts the serializer would build from model instances, without instantiating models
+    or walking the serializer machinery per row.
+
+    The serializer's own bound fields do the formatting (`field.to_representation`), so
+    dates, decimals, choices and so on come out exactly as before. Supports plain model
+    fields, `PrimaryKeyRelatedField` and nested ModelSerializers on foreign keys; custom
+    `to_representation()` logic must be mirrored by a subclass.
+
+    `select()` narrows an encoder to a sparse fieldset; `value_fields` follows, so the
+    unrequested columns and joins are left out of the query.
+
+    - `serializer_class`: The ModelSerializer to mirror.
+    - `prefix` (str): Lookup prefix of the row keys (used for nested serializers).
+    """
+
+    def __init__(self, serializer_class, prefix=''):
+        self.serializer_class = serializer_class
+        self.prefix = prefix
+        self._fields = None
+        self.expanded = None
+
+    def _compile(self):
+        fields = []
+        for name, field in self.serializer_class().fields.items():
+            if field.write_only:
+                continue
+            if '.' in field.source or field.source == '*':
+                raise ValueError(f"{self.serializer_class.__name__}.{name}: dotted sources are not supported.")
+
+            key = self.prefix + field.source
+            if isinstance(field, serializers.BaseSerializer):
+                nested = RowEncoder(type(field), prefix=f"{key}__")
+                fields.append((name, key, None, nested))
+            elif isinstance(field, serializers.PrimaryKeyRelatedField):
+                # DRF renders the bare primary key unless a pk_field is set
+                fields.append((name, key, field.pk_field.to_representation if field.pk_field else None, None))
+            elif isinstance(field, serializers.RelatedField):
+                raise ValueError(f"{self.serializer_class.__name__}.{name}: only primary key relations are supported.")
+            else:
+                fields.append((name, key, field.to_representation, None))
+        return fields
+
+    @property
+    def fields(self):
+        if self._fields is None:
+            self._fields = self._compile()
+        return self._fields
+
+    @property
+    def expandable(self):
+        """
+        Names of the fields rendered as nested objects.
+        """
+        return {name for name, _, _, nested in self.fields if nested is not None}
+
+    def is_expanded(self, name):
+        return self.expanded is None or name in self.expanded
+
+    def select(self, fields=None, expand=()):
+        """
+        Return a copy of the encoder limited to `fields` (all fields if None). When
+        `fields` is given, nested objects are rendered as their id unless listed in
+        `expand`; expanding a field also selects it.
+
+        Raises:
+        - ValueError: If a name is unknown or cannot be expanded.
+        """
+        names = [name for name, _, _, _ in self.fields]
+        unknown = sorted(set(fields or ()).union(expand) - set(names))
+        if unknown:
+            raise ValueError(f"Unknown field(s): {', '.join(unknown)}.")
+        not_expandable = sorted(set(expand) - self.expandable)
+        if not_expandable:
+            raise ValueError(f"Field(s) cannot be expanded: {', '.join(not_expandable)}.")
+
+        encoder = copy.copy(self)
+        if fields is None:
+            return encoder
+
+        encoder.expanded = set(expand)
+        encoder._fields = []
+        for name, key, to_representation, nested in self.fields:
+            if name not in fields and name not in expand:
+                continue
+            if nested is not None and name not in expand:
+                # The foreign key column holds the id, no join needed
+                to_representation, nested = None, None
+            encoder._fields.append((name, key, to_representation, nested))
+        return encoder
+
+    def select_from_params(self, query_params):
+        """
+        `select()` driven by the `fields` and `expand` query parameters.
+
+        Raises:
+        - ValueError: If a name is unknown or cannot be expanded.
+        """
+        def names(param):
+            names = [name.strip() for name in query_params.get(param, '').split(',') if name.strip()]
+            return names or None
+
+        return self.select(names('fields'), names('expand') or ())
+
+    @property
+    def value_fields(self):
+        """
+        The `values()` lookups the encoder reads.
+        """
+        lookups = []
+        for _, key, _, nested in self.fields:
+            lookups.append(key)
+            if nested is not None:
+                lookups.extend(nested.value_fields)
+        return lookups
+
+    def encode(self, row):
+        data = {}
+        for name, key, to_representation, nested in self.fields:
+            value = row[key]
+            if value is None:
+                data[name] = None
+            elif nested is not None:
+                data[name] = nested.encode(row)
+            elif to_representation is None:
+                data[name] = value
+            else:
+                data[name] = to_representation(value)
+        return data
+
+    def encode_many(self, rows):
+        return [self.encode(row) for row in rows]
+
+    def render(self, queryset):
+        """
+        Encode every row of `queryset`.
+        """
+        return self.encode_many(queryset.values(*self.value_fields))
@@ -0,0 +1,156 @@
+import functools
+import hashlib
+import json
+import random
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from drf_yasg import openapi
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+from api.models import IdempotencyKey
+
+IDEMPOTENCY_KEY_HEADER = 'Idempotency-Key'
+
+POLL_INTERVAL = 0.05
+# Share of claims that also purge expired keys, and how many rows one purge deletes at most
+PURGE_PROBABILITY = 0.01
+PURGE_BATCH_SIZE = 1000
+
+idempotency_key_param = openapi.Parameter(
+    IDEMPOTENCY_KEY_HEADER,
+    openapi.IN_HEADER,
+    description="Optional unique key; retrying with the same key returns the original response.",
+    type=openapi.TYPE_STRING,
+    required=False,
+)
+
+
+def _fingerprint(request):
+    body = json.dumps(request.data, sort_keys=True, default=str)
+    return hashlib.sha256(body.encode('utf-8')).hexdigest()
+
+
+def _replay(record, fingerprint):
+    if record.fingerprint != fingerprint:
+        return Response({"error": "This Idempotency-Key was already used with a different request."},
+                        status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+
+    data = json.loads(record.response_body) if record.response_body is not None else None
+    response = Response(data, status=record.status_code)
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def _claim(key, fingerprint):
+    """
+    Insert the pending record for `key`. Returns None if another request holds it.
+    """
+    try:
+        # Savepoint, so a duplicate key does not break a surrounding transaction
+        with transaction.atomic():
+            return IdempotencyKey.objects.create(
+                key=key, fingerprint=fingerprint,
+                expires_at=timezone.now() + timedelta(seconds=settings.IDEMPOTENCY_PENDING_TIMEOUT),
+            )
+    except IntegrityError:
+        return None
+
+
+def purge_expired_keys(limit=PURGE_BATCH_SIZE):
+    """
+    Delete up to `limit` expired records. Returns the number deleted.
+    """
+    expired = list(
+        IdempotencyKey.objects.filter(expires_at__lt=timezone.now()).values_list('pk', flat=True)[:limit]
+    )
+    if not expired:
+        return 0
+    return IdempotencyKey.objects.filter(pk__in=expired, expires_at__lt=timezone.now()).delete()[0]
+
+
+def idempotent(view_func):
+    """
+    Make a write view safe to retry with an `Idempotency-Key` header.
+
+    The first request with a key claims it by inserting an `IdempotencyKey` row and runs
+    the view; its response is stored on the row for `IDEMPOTENCY_KEY_TTL` seconds.
+    Repeats return the stored response without running the view again, and duplicates
+    that arrive while the first request is still running wait for it (up to
+    `IDEMPOTENCY_WAIT_TIMEOUT` seconds). A claim whose request never finishes (e.g. the
+    worker died) is released after `IDEMPOTENCY_PENDING_TIMEOUT` seconds. Server errors
+    and 429s are not stored, so the client can retry them. Requests without the header
+    are unaffected.
+
+    Records live in the database rather than the cache, so they are never evicted before
+    they expire; a small share of requests purges the expired ones.
+
+    Apply it below `@api_view`/`@permission_classes` so authentication and permissions
+    run first.
+    """
+    @functools.wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        key = request.headers.get(IDEMPOTENCY_KEY_HEADER)
+        if not key:
+            return view_func(request, *args, **kwargs)
+
+        if len(key) > 255:
+            return Response({"error": "Idempotency-Key must be at most 255 characters."},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        key_hash = hashlib.sha256(key.encode('utf-8')).hexdigest()
+        record_key = f"{view_func.__name__}:{request.user.pk}:{key_hash}"
+        fingerprint = _fingerprint(request)
+        deadline = time.monotonic() + settings.IDEMPOTENCY_WAIT_TIMEOUT
+
+        while True:
+            claim = _claim(record_key, fingerprint)
+            if claim is not None:
+                break
+
+            record = IdempotencyKey.objects.filter(key=record_key).first()
+            if record is not None and record.expires_at <= timezone.now():
+                # Stale record (finished long ago, or its request died): drop it and claim again
+                IdempotencyKey.objects.filter(pk=record.pk, expires_at__lte=timezone.now()).delete()
+                continue
+
+            if record is not None and record.status_code is not None:
+                return _replay(record, fingerprint)
+
+            if time.monotonic() >= deadline:
+                return Response({"error": "A request with this Idempotency-Key is still being processed."},
+                                status=status.HTTP_409_CONFLICT)
+
+            # Another request holds the key, wait for it to finish (or for the claim to expire)
+            time.sleep(POLL_INTERVAL)
+
+        if random.random() < PURGE_PROBABILITY:
+            purge_expired_keys()
+
+        # By primary key: if this request outlived its claim, a later claimer's record is left alone
+        claimed = IdempotencyKey.objects.filter(pk=claim.pk, status_code__isnull=True)
+        try:
+            response = view_func(request, *args, **kwargs)
+        except Exception:
+            claimed.delete()
+            raise
+
+        if (response.status_code >= 500 or response.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+                or not hasattr(response, 'data')):
+            claimed.delete()
+            return response
+
+        claimed.update(
+            status_code=response.status_code,
+            response_body=JSONRenderer().render(response.data).decode('utf-8') if response.data is not None else None,
+            expires_at=timezone.now() + timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL),
+        )
+
+        return response
+
+    return wrapper
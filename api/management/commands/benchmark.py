@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from api.benchmarks import BENCHMARKS
+
+
+class Command(BaseCommand):
+    help = "Run a benchmark against the configured database. Everything it writes is rolled back."
+
+    def add_arguments(self, parser):
+        parser.add_argument('name', choices=sorted(BENCHMARKS),
+                            help="; ".join(f"{name}: {description}"
+                                           for name, (_, _, description) in sorted(BENCHMARKS.items())))
+        parser.add_argument('--rows', type=int, default=None,
+                            help="Size of the benchmark (tickets, codes...); each benchmark has its own default.")
+
+    def handle(self, *args, **options):
+        func, default_rows, description = BENCHMARKS[options['name']]
+        rows = options['rows'] or default_rows
+        self.stdout.write(description)
+
+        with transaction.atomic():
+            func(rows, self.stdout.write)
+            transaction.set_rollback(True)
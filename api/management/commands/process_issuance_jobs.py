@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from api.models import TicketIssuanceJob
+from api.ticket.jobs import run_issuance_job
+
+
+class Command(BaseCommand):
+    help = "Run pending background ticket issuance jobs."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=None, help="Maximum number of jobs to run.")
+        parser.add_argument('--resume', action='store_true',
+                            help="Also resume running jobs whose worker stopped heartbeating for longer than "
+                                 "TICKET_ISSUANCE_LEASE_SECONDS.")
+
+    def handle(self, *args, **options):
+        statuses = ['pending', 'running'] if options['resume'] else ['pending']
+        jobs = TicketIssuanceJob.objects.filter(status__in=statuses).order_by('created_at')
+        job_ids = list(jobs.values_list('id', flat=True)[:options['limit']])
+
+        for job_id in job_ids:
+            run_issuance_job(job_id, resume=options['resume'])
+            job = TicketIssuanceJob.objects.get(pk=job_id)
+            self.stdout.write(f"Job {job.id}: {job.status} ({job.issued}/{job.quantity} tickets issued)")
+
+        self.stdout.write(self.style.SUCCESS(f"Processed {len(job_ids)} issuance job(s)."))
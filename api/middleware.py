@@ -0,0 +1,267 @@
+import contextlib
+import mmap
+import os
+import struct
+import threading
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.http import JsonResponse
+from django.urls import Resolver404, resolve
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+CRITICAL = 'critical'
+DEFAULT = 'default'
+HEAVY = 'heavy'
+
+# Url names of the endpoints that must keep working under load: gate validation and sales
+CRITICAL_ENDPOINTS = {
+    'check_ticket_validity', 'check_tickets_validity', 'redeem_ticket',
+    'create_tickets', 'admission_stats',
+}
+
+# Url names of listings and reports that can scan large tables
+HEAVY_ENDPOINTS = {
+    'get_agent_tickets', 'get_ticket_type_snapshot', 'ticket_sales_log',
+    'list_merchants', 'list_agents', 'list_all_merchants', 'payout_requests', 'sold_vouchers', 'bought_vouchers',
+}
+
+
+LANES = (CRITICAL, DEFAULT, HEAVY)
+
+# Counters kept per lane
+IN_FLIGHT, ADMITTED, REJECTED = range(3)
+
+
+class LocalCounters:
+    """
+    Admission counters of this process.
+    """
+
+    def __init__(self):
+        self._counts = {lane: [0, 0, 0] for lane in LANES}
+
+    def locked(self):
+        return contextlib.nullcontext()
+
+    def totals(self):
+        return {lane: list(counts) for lane, counts in self._counts.items()}
+
+    def add(self, lane, counter, delta):
+        self._counts[lane][counter] += delta
+
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class HostCounters:
+    """
+    Admission counters shared by every process of the host through a memory-mapped
+    file, so the limits hold across gunicorn workers. Each process owns a row (its pid
+    and its counters per lane) and updates it under an exclusive `flock` on the file.
+    The slots of a process that exited, e.g. a worker killed mid-request, are freed
+    the next time the totals are read.
+    """
+    ROW = struct.Struct('q' + 'q' * len(LANES) * 3)
+    ROWS = 256
+
+    def __init__(self, path):
+        self.path = path
+        self._pid = None
+        self._fd = None
+        self._map = None
+        self._row = None
+
+    def _attach(self):
+        # A forked child needs its own open file, or `flock` would not exclude its
+        # parent, and its own row
+        pid = os.getpid()
+        if self._pid == pid:
+            return
+
+        size = self.ROW.size * self.ROWS
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        try:
+            if os.fstat(fd).st_size < size:
+                os.ftruncate(fd, size)
+            mapping = mmap.mmap(fd, size)
+
+            # The row left by an earlier process with this pid, else a free one
+            rows = list(self.ROW.iter_unpack(mapping))
+            row = next((index for index, (row_pid, *_) in enumerate(rows) if row_pid == pid), None)
+            if row is None:
+                row = next((index for index, (row_pid, *_) in enumerate(rows)
+                            if row_pid == 0 or not _process_alive(row_pid)), None)
+            if row is None:
+                raise RuntimeError(f"No free admission counter row left in {self.path}.")
+            self.ROW.pack_into(mapping, row * self.ROW.size, pid, *[0] * (self.ROW.size // 8 - 1))
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+
+        if self._map is not None:
+            self._map.close()
+            os.close(self._fd)
+        self._fd, self._map, self._row, self._pid = fd, mapping, row, pid
+
+    @contextlib.contextmanager
+    def locked(self):
+        self._attach()
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def totals(self):
+        totals = {lane: [0, 0, 0] for lane in LANES}
+        for row, (pid, *counts) in enumerate(self.ROW.iter_unpack(self._map)):
+            if pid == 0:
+                continue
+            if pid != self._pid and any(counts[IN_FLIGHT::3]) and not _process_alive(pid):
+                self.ROW.pack_into(self._map, row * self.ROW.size, *[0] * (self.ROW.size // 8))
+                continue
+            for index, lane in enumerate(LANES):
+                for counter in (IN_FLIGHT, ADMITTED, REJECTED):
+                    totals[lane][counter] += counts[index * 3 + counter]
+        return totals
+
+    def add(self, lane, counter, delta):
+        offset = self._row * self.ROW.size + 8 * (1 + LANES.index(lane) * 3 + counter)
+        value, = struct.unpack_from('q', self._map, offset)
+        struct.pack_into('q', self._map, offset, value + delta)
+
+
+class AdmissionController:
+    """
+    Limits on concurrent requests, by lane, counted across the processes of the host
+    (`ADMISSION_BACKEND = 'host'`) or per process (`'local'`, also used where `fcntl`
+    is missing).
+
+    Every request takes a slot out of `ADMISSION_MAX_IN_FLIGHT`; the last
+    `ADMISSION_CRITICAL_RESERVE` slots are only given to the critical lane, and the heavy
+    lane is further capped at `ADMISSION_HEAVY_LIMIT`. Requests that find no slot are
+    rejected at once instead of queueing behind the ones already running.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = LocalCounters()
+        self._host = None
+
+    def _counters(self):
+        if settings.ADMISSION_BACKEND != 'host' or fcntl is None:
+            return self._local
+        if self._host is None or self._host.path != settings.ADMISSION_HOST_FILE:
+            self._host = HostCounters(settings.ADMISSION_HOST_FILE)
+        return self._host
+
+    @staticmethod
+    def _has_room(lane, in_flight):
+        total = sum(in_flight.values())
+        if lane == CRITICAL:
+            return total < settings.ADMISSION_MAX_IN_FLIGHT
+        if total >= settings.ADMISSION_MAX_IN_FLIGHT - settings.ADMISSION_CRITICAL_RESERVE:
+            return False
+        return lane != HEAVY or in_flight[HEAVY] < settings.ADMISSION_HEAVY_LIMIT
+
+    def acquire(self, lane):
+        with self._lock:
+            counters = self._counters()
+            with counters.locked():
+                in_flight = {name: counts[IN_FLIGHT] for name, counts in counters.totals().items()}
+                if not self._has_room(lane, in_flight):
+                    counters.add(lane, REJECTED, 1)
+                    return False
+                counters.add(lane, IN_FLIGHT, 1)
+                counters.add(lane, ADMITTED, 1)
+                return True
+
+    def release(self, lane):
+        with self._lock:
+            counters = self._counters()
+            with counters.locked():
+                counters.add(lane, IN_FLIGHT, -1)
+
+    def stats(self):
+        with self._lock:
+            counters = self._counters()
+            with counters.locked():
+                return {
+                    lane: {"in_flight": counts[IN_FLIGHT], "admitted": counts[ADMITTED], "rejected": counts[REJECTED]}
+                    for lane, counts in counters.totals().items()
+                }
+
+
+admission_controller = AdmissionController()
+
+
+def request_lane(request):
+    try:
+        url_name = resolve(request.path_info).url_name
+    except Resolver404:
+        return DEFAULT
+
+    if url_name in CRITICAL_ENDPOINTS:
+        return CRITICAL
+    if url_name in HEAVY_ENDPOINTS:
+        return HEAVY
+    return DEFAULT
+
+
+def _overloaded_response():
+    response = JsonResponse({"error": "The server is busy, please retry shortly."}, status=503)
+    response['Retry-After'] = str(settings.ADMISSION_RETRY_AFTER)
+    return response
+
+
+class AdmissionControlMiddleware:
+    """
+    Shed requests with 503 + Retry-After when their lane has no free slot (see
+    `AdmissionController`). Works for sync and async views alike.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        if not settings.ADMISSION_CONTROL_ENABLED:
+            return self.get_response(request)
+
+        lane = request_lane(request)
+        if not admission_controller.acquire(lane):
+            return _overloaded_response()
+        try:
+            return self.get_response(request)
+        finally:
+            admission_controller.release(lane)
+
+    async def __acall__(self, request):
+        if not settings.ADMISSION_CONTROL_ENABLED:
+            return await self.get_response(request)
+
+        lane = request_lane(request)
+        if not admission_controller.acquire(lane):
+            return _overloaded_response()
+        try:
+            return await self.get_response(request)
+        finally:
+            admission_controller.release(lane)
@@ -1,3 +1,5 @@
+import os
+import time
 import uuid
 import random
 import string
@@ -5,10 +7,24 @@ from datetime import datetime
 from phonenumber_field.modelfields import PhoneNumberField
 from django.contrib.auth.models import AbstractUser, Group, Permission
 from django.db import models
+from django.db.models import F
+from django.utils import timezone
+
+
+def uuid7():
+    """
+    Time-ordered UUID in the version 7 layout: a 48-bit millisecond timestamp followed by
+    random bits. New rows are appended near the end of InnoDB's clustered index instead of
+    being scattered across it, and the value keeps the usual UUID string format.
+    """
+    value = (time.time_ns() // 1_000_000) << 80 | int.from_bytes(os.urandom(10), 'big')
+    value = value & ~(0xF << 76) | 0x7 << 76  # version 7
+    value = value & ~(0x3 << 62) | 0x2 << 62  # RFC 4122 variant
+    return uuid.UUID(int=value)
 
 
 class User(AbstractUser):
-    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    id = models.UUIDField(primary_key=True, default=uuid7, editable=False)
 
     #Custom Fields
     login_id = models.CharField(max_length=7, unique=True)
@@ -54,14 +70,42 @@ class Agent(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='agent')
 
 class Wallet(models.Model):
-    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    id = models.UUIDField(primary_key=True, default=uuid7, editable=False)
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='wallet')
     voucher_balance = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
     bonus_balance = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
     #account_number = models.IntegerField(max_length=10, null=True, blank=True)
 
+    def debit_voucher_balance(self, amount):
+        """
+        Deduct `amount` from the voucher balance if the wallet holds at least that much.
+
+        The check and the deduction run as one conditional UPDATE, so concurrent debits
+        never lose updates and the row lock is only held for the rest of the caller's
+        transaction. Call it as late as possible inside that transaction.
+
+        Returns:
+        - True if the wallet was debited, False if the balance was insufficient.
+        """
+        debited = Wallet.objects.filter(pk=self.pk, voucher_balance__gte=amount).update(
+            voucher_balance=F('voucher_balance') - amount
+        )
+
+        if debited:
+            self.refresh_from_db(fields=['voucher_balance'])
+
+        return bool(debited)
+
+    def credit_voucher_balance(self, amount):
+        """
+        Add `amount` back to the voucher balance with a single UPDATE, e.g. to refund
+        a reservation that could not be fulfilled.
+        """
+        Wallet.objects.filter(pk=self.pk).update(voucher_balance=F('voucher_balance') + amount)
+        self.refresh_from_db(fields=['voucher_balance'])
+
 class Voucher(models.Model):
-    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    id = models.UUIDField(primary_key=True, default=uuid7, editable=False)
     voucher_code = models.CharField(max_length=20, unique=True)
     owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='owned_vouchers')
     seller = models.ForeignKey(User, on_delete=models.CASCADE, related_name='sold_vouchers')
@@ -79,12 +123,50 @@ class TicketType(models.Model):
     unit_price = models.DecimalField(max_digits=10, decimal_places=2)
     description = models.TextField(blank=True, null=True)
     expiration_date = models.DateTimeField()
+    # Maximum number of tickets that can be sold, empty for unlimited
+    inventory_limit = models.PositiveIntegerField(null=True, blank=True)
+    # Set when the type is deleted; its tickets become invalid without being rewritten
+    deleted_at = models.DateTimeField(null=True, blank=True, editable=False)
+    # Time of the latest lottery draw; checks only look up winners of types that were drawn
+    last_draw_at = models.DateTimeField(null=True, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
-class Ticket(models.Model):
-    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
-    ticket_code = models.CharField(max_length=8, unique=True)
+class TicketInventoryStripe(models.Model):
+    """
+    One slice of a capped ticket type's stock. Sales update a single random stripe, so
+    concurrent sellers rarely wait on the same row; the capacities add up to the limit.
+    """
+    ticket_type = models.ForeignKey(TicketType, on_delete=models.CASCADE, related_name='inventory_stripes')
+    stripe = models.PositiveSmallIntegerField()
+    capacity = models.PositiveIntegerField(default=0)
+    sold = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('ticket_type', 'stripe')
+
+def ticket_valid_until(valid_until, ticket_type):
+    return ticket_type.expiration_date if ticket_type is not None else valid_until
+
+
+def ticket_is_valid(valid, redeemed_at, ticket_type, now=None):
+    if ticket_type is None or not valid or redeemed_at is not None:
+        return False
+    return ticket_type.expiration_date > (now or timezone.now())
+
+
+class TicketValidityMixin:
+    # Validity is derived from the ticket type at read time, so changing or deleting a type
+    # never rewrites its tickets. `ticket_type` is the ticket's type, or None if it was deleted.
+    def effective_valid_until(self, ticket_type):
+        return ticket_valid_until(self.valid_until, ticket_type)
+
+    def is_valid(self, ticket_type, now=None):
+        return ticket_is_valid(self.valid, self.redeemed_at, ticket_type, now)
+
+class Ticket(TicketValidityMixin, models.Model):
+    id = models.UUIDField(primary_key=True, default=uuid7, editable=False)
+    ticket_code = models.CharField(max_length=16, unique=True)
     buyer_name = models.CharField(max_length=50)
     buyer_contact = models.CharField(max_length=50)
     agent = models.ForeignKey(User, on_delete=models.CASCADE, related_name='tickets')
@@ -93,6 +175,96 @@ class Ticket(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     valid_until = models.DateTimeField(editable=False)
     valid =models.BooleanField(default=True)
+    issuance_job = models.ForeignKey('TicketIssuanceJob', on_delete=models.SET_NULL, null=True, blank=True,
+                                     related_name='tickets')
+    # Set once, by the single conditional update in `api.ticket.redemption.redeem_ticket`
+    redeemed_at = models.DateTimeField(null=True, blank=True, editable=False)
+    redeemed_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, editable=False,
+                                    related_name='redeemed_tickets')
+    redeemed_location = models.CharField(max_length=100, blank=True, default='', editable=False)
+
+    class Meta:
+        indexes = [
+            # Offline scanner sync reads the tickets of a type changed since a cursor
+            models.Index(fields=['ticket_type', 'updated_at']),
+            # Keyset pagination of the ticket listing, for admins and per agent
+            models.Index(fields=['created_at', 'id']),
+            models.Index(fields=['agent', 'created_at', 'id']),
+        ]
+        permissions = [
+            ('scan_tickets', "Can scan tickets at the gates"),
+        ]
+
+class ArchivedTicket(TicketValidityMixin, models.Model):
+    """
+    An expired ticket moved out of the Ticket table by `manage.py archive_tickets`.
+    Columns are copied as they were, including the original timestamps.
+    """
+    id = models.UUIDField(primary_key=True, editable=False)
+    ticket_code = models.CharField(max_length=16, unique=True)
+    buyer_name = models.CharField(max_length=50)
+    buyer_contact = models.CharField(max_length=50)
+    agent = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archived_tickets')
+    ticket_type = models.ForeignKey(TicketType, on_delete=models.SET_NULL, null=True, related_name='archived_tickets')
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    valid_until = models.DateTimeField()
+    valid = models.BooleanField(default=True)
+    redeemed_at = models.DateTimeField(null=True, blank=True)
+    redeemed_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    redeemed_location = models.CharField(max_length=100, blank=True, default='')
+    archived_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+class TicketIssuanceJob(models.Model):
+    STATUS_CHOICES = (
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    )
+
+    id = models.UUIDField(primary_key=True, default=uuid7, editable=False)
+    agent = models.ForeignKey(User, on_delete=models.CASCADE, related_name='ticket_issuance_jobs')
+    ticket_type = models.ForeignKey(TicketType, on_delete=models.SET_NULL, null=True)
+    buyer_name = models.CharField(max_length=50)
+    buyer_contact = models.CharField(max_length=50)
+    quantity = models.PositiveIntegerField()
+    issued = models.PositiveIntegerField(default=0)
+    unit_price = models.DecimalField(max_digits=10, decimal_places=2)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    error = models.TextField(blank=True)
+    # Lease of the worker running the job: it heartbeats with every chunk, and another
+    # worker may only take a running job over once the heartbeat is older than the lease
+    worker_id = models.CharField(max_length=32, blank=True, editable=False)
+    heartbeat_at = models.DateTimeField(null=True, blank=True, editable=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+class Draw(models.Model):
+    """
+    A lottery draw among the valid tickets of a ticket type sold until `tickets_until`.
+    Running the sampling again with the same `seed` and cutoff picks the same winners.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid7, editable=False)
+    ticket_type = models.ForeignKey(TicketType, on_delete=models.PROTECT, related_name='draws')
+    winner_count = models.PositiveIntegerField()
+    seed = models.CharField(max_length=64)
+    # Latest creation time of the candidate tickets; empty for draws made before it was recorded
+    tickets_until = models.DateTimeField(null=True)
+    candidate_count = models.PositiveIntegerField(default=0)
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='draws')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+class DrawWinner(models.Model):
+    # No foreign key to Ticket: winning tickets stay listed after they are archived
+    draw = models.ForeignKey(Draw, on_delete=models.CASCADE, related_name='winners')
+    rank = models.PositiveIntegerField()
+    ticket_id = models.UUIDField()
+    ticket_code = models.CharField(max_length=16, db_index=True)
+
+    class Meta:
+        unique_together = ('draw', 'rank')
+        ordering = ['draw', 'rank']
 
 class PayoutRequest(models.Model):
     STATUS_CHOICES = (
@@ -109,6 +281,28 @@ class PayoutRequest(models.Model):
     payment_id = models.CharField(max_length=100, blank=True, null=True, unique=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+class CodeBlock(models.Model):
+    """
+    A reserved block of sequence numbers for `api.allocator.CodeAllocator`; the
+    auto-increment id is the block number.
+    """
+    name = models.CharField(max_length=20)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+class IdempotencyKey(models.Model):
+    """
+    A claimed `Idempotency-Key` (see `api.idempotency`). The row is inserted when the
+    first request starts, which makes the unique `key` the claim, and holds the stored
+    response once it finishes. Rows past `expires_at` are ignored and purged.
+    """
+    key = models.CharField(max_length=200, unique=True)
+    fingerprint = models.CharField(max_length=64)
+    # Empty while the first request is still running
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    response_body = models.TextField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
 class PayoutSettings(models.Model):
     monthly_quota = models.PositiveIntegerField(default=210)
     full_salary = models.DecimalField(max_digits=10, decimal_places=2, default=1000.00)
@@ -0,0 +1,36 @@
+import codecs
+import io
+
+from django.conf import settings
+from rest_framework.parsers import JSONParser
+
+from api.renderers import FastJSONRenderer, orjson
+
+# orjson turns integers over 64 bits into floats, so bodies with a run of 20 digits go
+# through the stdlib parser. Digits are mapped to '0' and everything else to ' ' to find
+# such a run with a plain substring search, much faster than a regex on large bodies.
+DIGITS = bytes(ord('0') if chr(byte).isdigit() else ord(' ') for byte in range(128)) + b' ' * 128
+LONG_NUMBER = b'0' * 20
+
+
+class FastJSONParser(JSONParser):
+    """
+    `JSONParser` backed by orjson. Bodies orjson rejects (invalid JSON, NaN/Infinity,
+    lone surrogates...) are handed to the stdlib parser, so the accepted input and the
+    error messages stay the same. Without orjson installed it is a plain `JSONParser`.
+    """
+    renderer_class = FastJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        if orjson is None or codecs.lookup(encoding).name != 'utf-8':
+            return super().parse(stream, media_type, parser_context)
+
+        data = stream.read()
+        if LONG_NUMBER not in data.translate(DIGITS):
+            try:
+                return orjson.loads(data)
+            except orjson.JSONDecodeError:
+                pass
+        return super().parse(io.BytesIO(data), media_type, parser_context)
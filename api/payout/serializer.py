@@ -6,6 +6,7 @@ from django.utils import timezone
 from datetime import timedelta, time
 from api.utilities import generate_payment_id, calculate_salary
 from api.admin.serializer import UserDSerializer
+from api.encoders import RowEncoder
 
 
 
@@ -15,6 +16,9 @@ class PayoutRequestSerializer(serializers.ModelSerializer):
         model = PayoutRequest
         fields = ['amount', 'requested_at', 'status', 'payment_id', 'user', 'salary']
 
+# `values()` fast path of PayoutRequestSerializer for listings
+payout_request_encoder = RowEncoder(PayoutRequestSerializer)
+
 class PayoutRequestCreateSerializer(serializers.ModelSerializer):
     class Meta:
         model = PayoutRequest
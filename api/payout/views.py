@@ -2,7 +2,8 @@ from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.permissions import IsAdminUser
-from .serializer import PayoutRequestCreateSerializer, PayoutRequestSerializer, PayoutRequestStatusSerializer
+from .serializer import PayoutRequestCreateSerializer, PayoutRequestSerializer, PayoutRequestStatusSerializer, \
+    payout_request_encoder
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
 from api.models import PayoutRequest, PayoutSettings, Ticket
@@ -11,18 +12,22 @@ from django.core.exceptions import ValidationError
 from django.db import DatabaseError
 from django.utils import  timezone
 from api.utilities import calculate_salary
+from api.idempotency import idempotent, idempotency_key_param
+from api.encoders import fields_param, expand_param
 
 
 
 @swagger_auto_schema(
     method='POST',
     request_body=PayoutRequestCreateSerializer,
+    manual_parameters=[idempotency_key_param],
     responses={
         201: "Payout request created successfully.",
 
     }
 )
 @api_view(['POST'])
+@idempotent
 def request_payout(request):
     """
     Request a payout based on the user's bonus balance.
@@ -118,6 +123,8 @@ def get_payout_by_id(request, payout_id):
             description="Filter requests by a specific user (admin only).",
             type=openapi.TYPE_STRING,
         ),
+        fields_param,
+        expand_param,
     ],
     responses={
         200: openapi.Response(
@@ -135,9 +142,12 @@ def list_payout_requests(request):
     **Query Parameters:**
     - `status` (str, optional): Filter by payout request status (e.g., 'pending', 'approved', 'rejected').
     - `user_id` (int, optional): Filter requests by a specific user (admin only).
+    - `fields` (str, optional): Comma-separated fields to return; `user` comes back as an id
+      unless also listed in `expand` (str, optional).
 
     **Responses:**
     - 200: A list of payout requests.
+    - 400: Invalid status, or unknown field in `fields` or `expand`.
     """
     status_filter = request.query_params.get('status')
     user_id = request.query_params.get('user_id')
@@ -159,19 +169,20 @@ def list_payout_requests(request):
             if status_filter:
                 payout_requests = payout_requests.filter(status=status_filter)
 
-        serializer = PayoutRequestSerializer(payout_requests, many=True)
+        encoder = payout_request_encoder.select_from_params(request.query_params)
+        data = encoder.render(payout_requests)
     except DatabaseError:
         return Response({"error": "A database error occurred while fetching payout requests."},
                     status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-    except ValidationError as e:
+    except (ValidationError, ValueError) as e:
         return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
     except Exception as e:
         return Response({"error": "An unexpected error occurred.", "details": str(e)},
                     status=status.HTTP_500_INTERNAL_SERVER_ERROR)
     return Response({
         "message": "Payout requests retrieved successfully.",
-        "data": serializer.data
+        "data": data
     }, status=status.HTTP_200_OK)
 @swagger_auto_schema(
     method='PUT',
@@ -0,0 +1,62 @@
+import decimal
+import math
+
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class _Fallback(Exception):
+    """
+    Raised from `default()` for values orjson would format differently from DRF.
+    """
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    `JSONRenderer` backed by orjson, with the same output byte for byte.
+
+    orjson writes datetimes, dates and UUIDs natively in DRF's format (UTC as a trailing
+    `Z`); the other values it does not know (decimals, lazy strings, querysets...) go
+    through DRF's `JSONEncoder.default()`. Anything orjson would render differently or
+    reject (indented output, non-string dict keys, integers over 64 bits, timezone-aware
+    times, decimals whose float needs an exponent or is not finite) makes it fall back to
+    the stdlib encoder. Plain floats are the exception: those needing an exponent come
+    out as `1e16` / `0.00001` rather than `1e+16` / `1e-05`, and NaN or infinity as null
+    instead of an error. Without orjson installed it is a plain `JSONRenderer`.
+    """
+
+    def __init__(self):
+        self._encoder = self.encoder_class()
+
+    def default(self, obj):
+        if isinstance(obj, decimal.Decimal):
+            value = float(obj)
+            # json writes floats with repr(), which differs from orjson for exponents
+            if not math.isfinite(value) or 'e' in repr(value):
+                raise _Fallback
+            return value
+        return self._encoder.default(obj)
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+
+        if (
+            orjson is None
+            or self.ensure_ascii
+            or not self.compact
+            or self.get_indent(accepted_media_type, renderer_context or {}) is not None
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        try:
+            ret = orjson.dumps(data, default=self.default, option=orjson.OPT_UTC_Z)
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        # Same escaping as DRF, so the output stays a strict javascript subset
+        return ret.replace('\u2028'.encode(), b'\\u2028').replace('\u2029'.encode(), b'\\u2029')
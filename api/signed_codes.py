@@ -0,0 +1,58 @@
+import functools
+import hashlib
+import hmac
+
+from django.conf import settings
+
+from api.allocator import CODE_CHARS, encode_base
+
+SERIAL_LENGTH = 8
+TAG_LENGTH = 2
+MAC_LENGTH = 6
+SIGNED_CODE_LENGTH = SERIAL_LENGTH + TAG_LENGTH + MAC_LENGTH
+
+
+def _digest(message):
+    key = (settings.TICKET_CODE_SIGNING_KEY or '').encode('utf-8')
+    return int.from_bytes(hmac.new(key, message.encode('utf-8'), hashlib.sha256).digest()[:8], 'big')
+
+
+@functools.lru_cache(maxsize=1024)
+def _type_tag(ticket_type_id):
+    # Short, public hint of the ticket type so verification only tries matching types
+    digest = int.from_bytes(hashlib.blake2b(ticket_type_id.bytes, digest_size=8).digest(), 'big')
+    return encode_base(digest % len(CODE_CHARS) ** TAG_LENGTH, CODE_CHARS, TAG_LENGTH)
+
+
+def _mac(serial, ticket_type_id):
+    return encode_base(_digest(f"{serial}:{ticket_type_id.hex}") % len(CODE_CHARS) ** MAC_LENGTH,
+                       CODE_CHARS, MAC_LENGTH)
+
+
+def sign_ticket_code(serial, ticket_type_id):
+    """
+    Build a signed ticket code: the allocated `serial`, a tag of the ticket type and a
+    keyed MAC over both, so a verifier can tell genuine codes and their type apart
+    without the database.
+    """
+    return f"{serial}{_type_tag(ticket_type_id)}{_mac(serial, ticket_type_id)}"
+
+
+def is_signed_code(ticket_code):
+    return len(ticket_code) == SIGNED_CODE_LENGTH
+
+
+def verify_ticket_code(ticket_code, ticket_types):
+    """
+    Return the ticket type a signed `ticket_code` was issued for, picked from
+    `ticket_types`, or None if the code was not signed with our key (forged or mistyped).
+    """
+    ticket_code = ticket_code.upper()
+    serial = ticket_code[:SERIAL_LENGTH]
+    tag = ticket_code[SERIAL_LENGTH:SERIAL_LENGTH + TAG_LENGTH]
+    mac = ticket_code[SERIAL_LENGTH + TAG_LENGTH:]
+
+    for ticket_type in ticket_types:
+        if _type_tag(ticket_type.id) == tag and hmac.compare_digest(_mac(serial, ticket_type.id), mac):
+            return ticket_type
+    return None
@@ -1,3 +1,1171 @@
-from django.test import TestCase
+import datetime
+import hashlib
+import io
+import os
+import tempfile
+import threading
+import uuid
+from datetime import timedelta
+from decimal import Decimal
+from unittest import addModuleCleanup, mock, skipIf
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import Permission
+from django.core.cache import cache
+from django.db import connection, connections, transaction
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings, skipUnlessDBFeature
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from api import checks, middleware
+from api.allocator import CodeAllocator, ticket_codes
+from api.idempotency import purge_expired_keys
+from api.models import (
+    Agent, ArchivedTicket, CodeBlock, IdempotencyKey, PayoutRequest, Ticket, TicketIssuanceJob, TicketType, User,
+    Voucher, Wallet,
+)
+from api.parsers import FastJSONParser
+from api.payout.serializer import PayoutRequestSerializer, payout_request_encoder
+from api.renderers import FastJSONRenderer
+from api.ticket import code_filter, draws, jobs
+from api.ticket.archive import archive_expired_tickets
+from api.ticket.catalog import CATALOG_VERSION_KEY, ticket_type_catalog
+from api.ticket.inventory import configure_inventory, inventory_status
+from api.ticket.issuance import issue_tickets
+from api.ticket.serializer import TicketSerializer, ticket_row_encoder
+from api.ticket.ticket_cache import ticket_cache
+from api.ticket.velocity import velocity_limiter
+from api.voucher.serializer import VoucherListSerializer, voucher_list_encoder
+
+
+def setUpModule():
+    # The process-wide code filter builds in a thread on its own connection, which cannot see
+    # (or wait for) the test transaction; scans in these tests always go to the database
+    patcher = mock.patch.object(code_filter.ticket_code_filter, '_start_build')
+    patcher.start()
+    addModuleCleanup(patcher.stop)
+
+
+def create_agent(login_id='AGT-001', balance=Decimal('10000.00')):
+    user = User.objects.create_user(username=login_id, password='x', login_id=login_id, role='Agent')
+    Wallet.objects.create(user=user, voucher_balance=balance)
+    Agent.objects.create(user=user)
+    return user
+
+
+def create_ticket_type(name='Draw', **fields):
+    fields.setdefault('unit_price', Decimal('10.00'))
+    fields.setdefault('expiration_date', timezone.now() + timedelta(days=3))
+    ticket_type = TicketType.objects.create(name=name, **fields)
+    ticket_type_catalog.invalidate()
+    return ticket_type
+
+
+def agent_client(agent):
+    client = APIClient()
+    client.force_authenticate(agent)
+    return client
+
+
+def seed_tickets(count, agent, ticket_type):
+    Ticket.objects.bulk_create([
+        Ticket(ticket_code=f"SEED{serial:04d}", buyer_name='B', buyer_contact='1', agent=agent,
+               ticket_type=ticket_type, valid_until=ticket_type.expiration_date)
+        for serial in range(count)
+    ])
+
+
+def create_scanner(login_id='SCN-001'):
+    user = User.objects.create_user(username=login_id, password='x', login_id=login_id, role='Agent')
+    user.user_permissions.add(Permission.objects.get(codename='scan_tickets'))
+    return user
+
+
+def create_admin(login_id='ADM-001'):
+    return User.objects.create_user(username=login_id, password='x', login_id=login_id, role='Admin', is_staff=True)
+
+
+def run_in_threads(count, target):
+    """
+    Start `target(index)` in `count` threads at once and wait for them. Exceptions are
+    re-raised, and each thread closes its own database connection.
+    """
+    barrier = threading.Barrier(count)
+    errors = []
+
+    def run(index):
+        try:
+            barrier.wait()
+            target(index)
+        except Exception as e:
+            errors.append(e)
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=run, args=(index,)) for index in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if errors:
+        raise errors[0]
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class IdempotencyKeyTests(TestCase):
+    def setUp(self):
+        self.agent = create_agent()
+        self.ticket_type = create_ticket_type()
+        self.client = agent_client(self.agent)
+
+    def create_tickets(self, key, quantity=2):
+        return self.client.post('/api/ticket/create-ticket/', {
+            'ticket_type': str(self.ticket_type.pk), 'quantity': quantity, 'buyer_name': 'B', 'buyer_contact': '1',
+        }, format='json', HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_repeat_replays_the_stored_response(self):
+        first = self.create_tickets('key-1')
+        second = self.create_tickets('key-1')
+
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(second.status_code, 201)
+        self.assertEqual(second['Idempotent-Replayed'], 'true')
+        self.assertEqual(second.json()['tickets'], first.json()['tickets'])
+        self.assertEqual(Ticket.objects.count(), 2)
+
+    def test_key_reused_with_another_body_is_rejected(self):
+        self.create_tickets('key-1')
+
+        self.assertEqual(self.create_tickets('key-1', quantity=3).status_code, 422)
+        self.assertEqual(Ticket.objects.count(), 2)
+
+    def test_expired_key_runs_the_view_again(self):
+        self.create_tickets('key-1')
+        IdempotencyKey.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+
+        self.assertEqual(self.create_tickets('key-1').status_code, 201)
+        self.assertEqual(Ticket.objects.count(), 4)
+
+    @override_settings(IDEMPOTENCY_WAIT_TIMEOUT=0)
+    def test_slow_request_keeps_its_claim(self):
+        # Another request claimed the key 90 seconds ago and is still issuing
+        key_hash = hashlib.sha256(b'key-1').hexdigest()
+        IdempotencyKey.objects.create(
+            key=f"create_tickets:{self.agent.pk}:{key_hash}", fingerprint='',
+            expires_at=timezone.now() + timedelta(seconds=settings.IDEMPOTENCY_PENDING_TIMEOUT - 90),
+        )
+
+        self.assertEqual(self.create_tickets('key-1').status_code, 409)
+        self.assertEqual(Ticket.objects.count(), 0)
+
+    def test_purge_deletes_only_expired_keys(self):
+        self.create_tickets('key-1')
+        self.create_tickets('key-2')
+        IdempotencyKey.objects.filter(key__endswith=hashlib.sha256(b'key-1').hexdigest()).update(
+            expires_at=timezone.now() - timedelta(seconds=1)
+        )
+
+        self.assertEqual(purge_expired_keys(), 1)
+        self.assertEqual(IdempotencyKey.objects.count(), 1)
+
+
+@override_settings(TICKET_ISSUANCE_CHUNK_SIZE=10, TICKET_ISSUANCE_LEASE_SECONDS=60)
+class IssuanceJobLeaseTests(TestCase):
+    def setUp(self):
+        self.agent = create_agent()
+        self.ticket_type = create_ticket_type()
+        self.job = TicketIssuanceJob.objects.create(
+            agent=self.agent, ticket_type=self.ticket_type, buyer_name='B', buyer_contact='1',
+            quantity=25, unit_price=self.ticket_type.unit_price,
+        )
+
+    def hold_lease(self, heartbeat_at):
+        TicketIssuanceJob.objects.filter(pk=self.job.pk).update(
+            status='running', worker_id='other', heartbeat_at=heartbeat_at
+        )
+
+    def test_pending_job_is_issued(self):
+        jobs.run_issuance_job(self.job.pk)
+
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.status, 'completed')
+        self.assertEqual(self.job.issued, 25)
+        self.assertEqual(Ticket.objects.filter(issuance_job=self.job).count(), 25)
+
+    def test_resume_skips_job_with_live_lease(self):
+        self.hold_lease(timezone.now())
+
+        jobs.run_issuance_job(self.job.pk, resume=True)
+
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.worker_id, 'other')
+        self.assertEqual(Ticket.objects.filter(issuance_job=self.job).count(), 0)
+
+    def test_resume_takes_over_expired_lease(self):
+        self.hold_lease(timezone.now() - timedelta(seconds=61))
+
+        jobs.run_issuance_job(self.job.pk, resume=True)
+
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.status, 'completed')
+        self.assertEqual(Ticket.objects.filter(issuance_job=self.job).count(), 25)
+
+    def test_chunk_is_rolled_back_after_losing_the_lease(self):
+        issue_tickets = jobs.issue_tickets
+
+        def issue_then_lose_lease(*args, **kwargs):
+            tickets = issue_tickets(*args, **kwargs)
+            TicketIssuanceJob.objects.filter(pk=self.job.pk).update(worker_id='other')
+            return tickets
+
+        with mock.patch.object(jobs, 'issue_tickets', side_effect=issue_then_lose_lease):
+            jobs.run_issuance_job(self.job.pk)
+
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.status, 'running')
+        self.assertEqual(self.job.issued, 0)
+        self.assertEqual(Ticket.objects.filter(issuance_job=self.job).count(), 0)
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class InventoryTests(TestCase):
+    def setUp(self):
+        self.agent = create_agent()
+        self.ticket_type = create_ticket_type()
+
+    def set_limit(self, limit):
+        self.ticket_type.inventory_limit = limit
+        self.ticket_type.save()
+        configure_inventory(self.ticket_type)
+        ticket_type_catalog.invalidate()
+
+    def test_limit_counts_tickets_sold_before_it_was_set(self):
+        seed_tickets(60, self.agent, self.ticket_type)
+        self.set_limit(100)
+
+        self.assertEqual(inventory_status(self.ticket_type), {"inventory_limit": 100, "sold": 60, "remaining": 40})
+
+        client = agent_client(self.agent)
+        sell = {'ticket_type': str(self.ticket_type.pk), 'buyer_name': 'B', 'buyer_contact': '1'}
+        self.assertEqual(client.post('/api/ticket/create-ticket/', {**sell, 'quantity': 41}, format='json').status_code, 400)
+        self.assertEqual(client.post('/api/ticket/create-ticket/', {**sell, 'quantity': 40}, format='json').status_code, 201)
+
+    def test_limit_below_sales_leaves_nothing_to_sell(self):
+        seed_tickets(60, self.agent, self.ticket_type)
+        self.set_limit(50)
+
+        self.assertEqual(inventory_status(self.ticket_type), {"inventory_limit": 50, "sold": 60, "remaining": 0})
+
+
+# SQLite locks the whole database, so concurrent sales fail there instead of waiting
+@skipUnlessDBFeature('has_select_for_update')
+@override_settings(SECURE_SSL_REDIRECT=False)
+class InventoryStressTests(TransactionTestCase):
+    SELLERS = 8
+    SALES_PER_SELLER = 10
+    QUANTITY = 3
+    LIMIT = 100
+
+    def test_parallel_sales_never_exceed_the_limit(self):
+        agents = [create_agent(login_id=f"AGT-{index:03d}") for index in range(self.SELLERS)]
+        ticket_type = create_ticket_type(inventory_limit=self.LIMIT)
+        configure_inventory(ticket_type)
+        statuses = [[] for _ in agents]
+
+        def sell(index):
+            client = agent_client(agents[index])
+            for _ in range(self.SALES_PER_SELLER):
+                response = client.post('/api/ticket/create-ticket/', {
+                    'ticket_type': str(ticket_type.pk), 'quantity': self.QUANTITY, 'buyer_name': 'B',
+                    'buyer_contact': '1',
+                }, format='json')
+                statuses[index].append(response.status_code)
+
+        # 240 tickets requested against a limit of 100
+        run_in_threads(self.SELLERS, sell)
+
+        sold = sum(status.count(201) for status in statuses) * self.QUANTITY
+        issued = Ticket.objects.filter(ticket_type=ticket_type).count()
+        self.assertLessEqual(issued, self.LIMIT)
+        self.assertEqual(issued, sold)
+        self.assertEqual(inventory_status(ticket_type)["sold"], issued)
+        # Sales only stop once fewer tickets than one sale are left
+        self.assertGreater(issued, self.LIMIT - self.QUANTITY)
+
+
+class TicketTypeCatalogTests(TestCase):
+    def test_change_after_eviction_is_seen(self):
+        ticket_type = create_ticket_type()
+        ticket_type_catalog.sync()
+        self.assertEqual(ticket_type_catalog.get(ticket_type.pk).unit_price, Decimal('10.00'))
+
+        # The version is culled, then another process changes the price and its new version is culled too
+        cache.delete(CATALOG_VERSION_KEY)
+        ticket_type_catalog.sync()
+        ticket_type_catalog.get(ticket_type.pk)
+        TicketType.objects.filter(pk=ticket_type.pk).update(unit_price=Decimal('12.50'))
+        cache.set(CATALOG_VERSION_KEY, uuid.uuid4().hex, timeout=None)
+        cache.delete(CATALOG_VERSION_KEY)
+
+        ticket_type_catalog.sync()
+        self.assertEqual(ticket_type_catalog.get(ticket_type.pk).unit_price, Decimal('12.50'))
+
+
+class CodeAllocatorTests(TestCase):
+    def test_codes_in_the_archive_are_skipped(self):
+        agent = create_agent()
+        archived_code, free_code = (ticket_codes.encode(ticket_codes.permute(number)) for number in (1, 2))
+        now = timezone.now()
+        ArchivedTicket.objects.create(
+            id=uuid.uuid4(), ticket_code=archived_code, buyer_name='B', buyer_contact='1', agent=agent,
+            created_at=now, updated_at=now, valid_until=now,
+        )
+
+        with mock.patch.object(ticket_codes, '_take_numbers', side_effect=[[1], [2]]):
+            self.assertEqual(ticket_codes.allocate(), [free_code])
+
+
+class CodeBlockReservationTests(TransactionTestCase):
+    def allocator(self):
+        return CodeAllocator('test', 10 ** 6, str, (Ticket,), 'ticket_code', block_size=10)
+
+    def test_block_survives_a_rolled_back_issuance(self):
+        class Rollback(Exception):
+            pass
+
+        # A separate connection is only used on server databases
+        with mock.patch.object(type(connections['default']), 'vendor', 'mysql'):
+            with self.assertRaises(Rollback), transaction.atomic():
+                first = self.allocator()._take_numbers(1)
+                raise Rollback
+            second = self.allocator()._take_numbers(1)
+
+        self.assertEqual(CodeBlock.objects.filter(name='test').count(), 2)
+        self.assertNotEqual(first[0] // 10, second[0] // 10)
+
+
+class ArchiveTests(TestCase):
+    def test_chunks_seek_past_the_archived_tickets(self):
+        agent = create_agent()
+        seed_tickets(7, agent, create_ticket_type(expiration_date=timezone.now() - timedelta(days=200)))
+        Ticket.objects.create(ticket_code='LIVE0001', buyer_name='B', buyer_contact='1', agent=agent,
+                              ticket_type=create_ticket_type(name='Live'), valid_until=timezone.now())
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(archive_expired_tickets(retention_days=90, chunk_size=3), 7)
+
+        self.assertEqual(list(Ticket.objects.values_list('ticket_code', flat=True)), ['LIVE0001'])
+        self.assertEqual(ArchivedTicket.objects.count(), 7)
+        # Every chunk after the first starts after the last archived id
+        selects = [query['sql'] for query in queries if 'ORDER BY "api_ticket"."id"' in query['sql']]
+        self.assertEqual(len(selects), 4)
+        self.assertTrue(all('"api_ticket"."id" >' in sql for sql in selects[1:]))
+
+
+@override_settings(TICKET_CACHE_SIZE=100)
+class TicketCacheTests(TestCase):
+    def setUp(self):
+        ticket_cache.clear()
+        self.addCleanup(ticket_cache.clear)
+        self.ticket = issue_tickets(create_agent(), create_ticket_type(), 1, 'B', '1')[0]
+
+    def change_elsewhere(self, **fields):
+        # A change made by another process: this process only sees the new revision
+        Ticket.objects.filter(pk=self.ticket.pk).update(**fields)
+        cache.set(f"ticket_rev:{self.ticket.ticket_code}", 'changed')
+
+    def test_change_in_another_process_is_seen(self):
+        ticket_cache.get(self.ticket.ticket_code)
+        self.change_elsewhere(valid=False)
+
+        self.assertFalse(ticket_cache.get(self.ticket.ticket_code).valid)
+
+    def test_change_is_seen_after_the_revision_was_evicted(self):
+        ticket_cache.get(self.ticket.ticket_code)
+        self.change_elsewhere(valid=False)
+        cache.delete(f"ticket_rev:{self.ticket.ticket_code}")
+
+        self.assertFalse(ticket_cache.get(self.ticket.ticket_code).valid)
+
+    def test_unchanged_ticket_is_served_from_memory(self):
+        cached = ticket_cache.get(self.ticket.ticket_code)
+
+        self.assertIs(ticket_cache.get(self.ticket.ticket_code), cached)
+
+    def test_database_cache_backend_is_refused(self):
+        self.assertEqual([error.id for error in checks.check_ticket_cache_backend(None)], ['api.E001'])
+
+        with self.settings(SHARED_MEMORY_CACHE=True):
+            self.assertEqual(checks.check_ticket_cache_backend(None), [])
+
+
+@mock.patch.object(code_filter, 'CATCH_UP_INTERVAL', 0)
+class TicketCodeFilterTests(TestCase):
+    def setUp(self):
+        self.agent = create_agent()
+        self.ticket_type = create_ticket_type()
+        self.code_filter = code_filter.TicketCodeFilter()
+        self.code_filter._build()
+
+    def issue_elsewhere(self, ticket_code, **fields):
+        # Issued by another process: only the shared version tells this one
+        Ticket.objects.create(ticket_code=ticket_code, buyer_name='B', buyer_contact='1', agent=self.agent,
+                              ticket_type=self.ticket_type, valid_until=self.ticket_type.expiration_date)
+        Ticket.objects.filter(ticket_code=ticket_code).update(**fields)
+        cache.set(code_filter.CODE_FILTER_VERSION_KEY, uuid.uuid4().hex)
+
+    def test_unknown_code_is_rejected(self):
+        # Only the shared version is read
+        with self.assertNumQueries(1):
+            self.assertFalse(self.code_filter.might_contain('NOTACODE'))
+
+    def test_ticket_issued_elsewhere_is_found(self):
+        self.issue_elsewhere('NEW00001')
+
+        self.assertTrue(self.code_filter.might_contain('new00001'))
+        self.assertFalse(self.code_filter.might_contain('NOTACODE'))
+
+    def test_ticket_committed_after_the_last_load_is_found(self):
+        self.issue_elsewhere('OLD00001', created_at=timezone.now() - timedelta(seconds=30))
+
+        self.assertTrue(self.code_filter.might_contain('OLD00001'))
+
+    def test_ticket_archived_since_the_last_load_is_found(self):
+        now = timezone.now()
+        ArchivedTicket.objects.create(
+            id=uuid.uuid4(), ticket_code='ARC00001', buyer_name='B', buyer_contact='1', agent=self.agent,
+            created_at=now - timedelta(days=365), updated_at=now, valid_until=now,
+        )
+        cache.set(code_filter.CODE_FILTER_VERSION_KEY, uuid.uuid4().hex)
+
+        self.assertTrue(self.code_filter.might_contain('ARC00001'))
+
+    def test_evicted_version_is_not_trusted(self):
+        self.issue_elsewhere('NEW00001')
+        cache.delete(code_filter.CODE_FILTER_VERSION_KEY)
+
+        self.assertTrue(self.code_filter.might_contain('NEW00001'))
+
+    def test_catch_up_counts_codes_read_again_once(self):
+        self.issue_elsewhere('NEW00001')
+        self.code_filter.might_contain('NEW00001')
+        count = self.code_filter._filter.count
+        cache.set(code_filter.CODE_FILTER_VERSION_KEY, uuid.uuid4().hex)
+        self.code_filter.might_contain('NOTACODE')
+
+        self.assertEqual(self.code_filter._filter.count, count)
+
+    def test_scan_during_a_load_is_left_to_the_database(self):
+        self.issue_elsewhere('NEW00001')
+
+        with self.code_filter._loading:
+            self.assertTrue(self.code_filter.might_contain('NOTACODE'))
+
+    def test_codes_are_left_to_the_database_until_the_filter_is_built(self):
+        unbuilt = code_filter.TicketCodeFilter()
+
+        with mock.patch.object(code_filter.threading, 'Thread') as thread:
+            self.assertTrue(unbuilt.might_contain('NOTACODE'))
+            # A build is already under way
+            self.assertTrue(unbuilt.might_contain('NOTACODE'))
+
+        thread.assert_called_once()
+        thread.return_value.start.assert_called_once()
+
+    def test_full_filter_is_served_while_rebuilt(self):
+        self.code_filter._filter.count = self.code_filter._filter.capacity + 1
+
+        with mock.patch.object(code_filter.threading, 'Thread') as thread:
+            self.assertFalse(self.code_filter.might_contain('NOTACODE'))
+
+        thread.return_value.start.assert_called_once()
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class SnapshotPermissionTests(TestCase):
+    def setUp(self):
+        self.ticket_type = create_ticket_type()
+        self.url = f'/api/ticket/ticket-type/{self.ticket_type.pk}/snapshot/'
+
+    def test_scanner_can_download_snapshot(self):
+        self.assertEqual(agent_client(create_scanner()).get(self.url).status_code, 200)
+
+    def test_agent_cannot(self):
+        self.assertEqual(agent_client(create_agent()).get(self.url).status_code, 403)
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class RedemptionTests(TestCase):
+    def setUp(self):
+        ticket_cache.clear()
+        self.addCleanup(ticket_cache.clear)
+        self.agent = create_agent()
+        self.ticket = issue_tickets(self.agent, create_ticket_type(), 1, 'B', '1')[0]
+        self.url = f'/api/ticket/redeem-ticket/{self.ticket.ticket_code}/'
+
+    def test_second_redemption_is_a_conflict(self):
+        client = agent_client(create_scanner())
+
+        first = client.post(self.url, {'location': 'Gate 1'}, format='json')
+        second = client.post(self.url, {'location': 'Gate 2'}, format='json')
+
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(second.status_code, 409)
+        self.assertEqual(second.json()['redeemed_location'], 'Gate 1')
+
+    def test_agent_cannot_redeem(self):
+        self.assertEqual(agent_client(self.agent).post(self.url, {}, format='json').status_code, 403)
+        self.ticket.refresh_from_db()
+        self.assertIsNone(self.ticket.redeemed_at)
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class RedemptionRaceTests(TransactionTestCase):
+    GATES = 8
+
+    def setUp(self):
+        # Connections to an in-memory SQLite database fail on concurrent writes instead of waiting
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            self.skipTest("Needs a database shared by threads")
+
+    def test_exactly_one_gate_redeems(self):
+        ticket_cache.clear()
+        ticket = issue_tickets(create_agent(), create_ticket_type(), 1, 'B', '1')[0]
+        scanners = [create_scanner(login_id=f"SCN-{gate:03d}") for gate in range(self.GATES)]
+        statuses = [None] * self.GATES
+
+        def redeem(gate):
+            response = agent_client(scanners[gate]).post(
+                f'/api/ticket/redeem-ticket/{ticket.ticket_code}/', {'location': f"Gate {gate}"}, format='json'
+            )
+            statuses[gate] = response.status_code
+
+        run_in_threads(self.GATES, redeem)
+
+        self.assertEqual(sorted(statuses), [200] + [409] * (self.GATES - 1))
+        ticket.refresh_from_db()
+        self.assertEqual(ticket.redeemed_location, f"Gate {statuses.index(200)}")
+
+
+@skipIf(middleware.fcntl is None or not hasattr(os, 'fork'), "Needs fcntl and fork")
+@override_settings(ADMISSION_BACKEND='host', ADMISSION_MAX_IN_FLIGHT=4, ADMISSION_CRITICAL_RESERVE=1,
+                   ADMISSION_HEAVY_LIMIT=1)
+class HostAdmissionTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, 'admission')
+        self.enterContext(self.settings(ADMISSION_HOST_FILE=path))
+        self.controller = middleware.AdmissionController()
+
+    def test_requests_of_another_worker_count(self):
+        # One pipe each way, so neither process can read back its own message
+        admitted_read, admitted_write = os.pipe()
+        exit_read, exit_write = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            # Worker holding a heavy slot until its parent closes the pipe
+            os.close(admitted_read)
+            os.close(exit_write)
+            admitted = middleware.AdmissionController().acquire(middleware.HEAVY)
+            os.write(admitted_write, b'1' if admitted else b'0')
+            os.read(exit_read, 1)
+            os._exit(0)
+
+        os.close(admitted_write)
+        os.close(exit_read)
+        self.assertEqual(os.read(admitted_read, 1), b'1')
+        os.close(admitted_read)
+        self.assertFalse(self.controller.acquire(middleware.HEAVY))
+        self.assertTrue(self.controller.acquire(middleware.DEFAULT))
+        self.assertEqual(self.controller.stats()[middleware.HEAVY], {"in_flight": 1, "admitted": 1, "rejected": 1})
+
+        # The worker exits without releasing its slot, as a killed one would
+        os.close(exit_write)
+        os.waitpid(pid, 0)
+
+        self.assertTrue(self.controller.acquire(middleware.HEAVY))
+
+    def test_critical_requests_use_the_reserve(self):
+        for _ in range(3):
+            self.assertTrue(self.controller.acquire(middleware.DEFAULT))
+
+        self.assertFalse(self.controller.acquire(middleware.DEFAULT))
+        self.assertTrue(self.controller.acquire(middleware.CRITICAL))
+        self.assertFalse(self.controller.acquire(middleware.CRITICAL))
+
+        self.controller.release(middleware.CRITICAL)
+        self.assertTrue(self.controller.acquire(middleware.CRITICAL))
+
+
+class DrawTests(TestCase):
+    def setUp(self):
+        self.agent = create_agent()
+        self.ticket_type = create_ticket_type()
+        seed_tickets(20, self.agent, self.ticket_type)
+        # Sold before the draw's cutoff
+        Ticket.objects.update(created_at=timezone.now() - timedelta(hours=1))
+
+    def winner_codes(self, draw):
+        return [winner.ticket_code for winner in draw.winners.order_by('rank')]
+
+    def test_same_seed_picks_the_same_winners(self):
+        first = draws.run_draw(self.ticket_type, 5, None, seed='audit')
+        second = draws.run_draw(self.ticket_type, 5, None, seed='audit')
+
+        self.assertEqual(self.winner_codes(first), self.winner_codes(second))
+        self.assertEqual(first.candidate_count, 20)
+        self.assertNotEqual(self.winner_codes(first), self.winner_codes(draws.run_draw(self.ticket_type, 5, None)))
+
+    def test_tickets_sold_after_the_cutoff_are_excluded(self):
+        draw = draws.run_draw(self.ticket_type, 30, None, seed='audit')
+        late = issue_tickets(self.agent, self.ticket_type, 3, 'Late', '1')
+
+        replayed, candidate_count = draws.replay_draw(draw)
+
+        self.assertEqual(draw.candidate_count, 20)
+        self.assertEqual(candidate_count, 20)
+        self.assertEqual([code for _, code in replayed], self.winner_codes(draw))
+        self.assertFalse({ticket.ticket_code for ticket in late} & set(self.winner_codes(draw)))
+
+    def test_last_draw_time_is_recorded(self):
+        draw = draws.run_draw(self.ticket_type, 1, None)
+
+        self.assertEqual(ticket_type_catalog.get(self.ticket_type.pk).last_draw_at, draw.created_at)
+
+    def test_winners_are_uniform(self):
+        tickets_until = timezone.now()
+        wins = {}
+        for seed in range(1000):
+            winners, _ = draws.sample_winners(self.ticket_type, 1, seed, tickets_until)
+            wins[winners[0][1]] = wins.get(winners[0][1], 0) + 1
+
+        # 50 expected per ticket; the bounds are about 5 standard deviations wide
+        self.assertEqual(len(wins), 20)
+        self.assertTrue(all(15 <= count <= 85 for count in wins.values()), wins)
+
+
+class RowEncoderParityTests(TestCase):
+    """
+    The row encoders must render the same JSON as the serializers they mirror.
+    """
+
+    def setUp(self):
+        self.agent = create_agent()
+        live = create_ticket_type()
+        expired = create_ticket_type(name='Expired')
+        deleted = create_ticket_type(name='Deleted')
+        seed_tickets(2, self.agent, live)
+        Ticket.objects.create(ticket_code='EXPIRED1', buyer_name='B', buyer_contact='1', agent=self.agent,
+                              ticket_type=expired, valid_until=expired.expiration_date)
+        Ticket.objects.create(ticket_code='DELETED1', buyer_name='B', buyer_contact='1', agent=self.agent,
+                              ticket_type=deleted, valid_until=deleted.expiration_date)
+        Ticket.objects.filter(ticket_code='SEED0001').update(redeemed_at=timezone.now(), redeemed_location='Gate 1')
+        # Expired and deleted after the sale: validity follows the type, not the stored row
+        TicketType.objects.filter(pk=expired.pk).update(expiration_date=timezone.now() - timedelta(hours=1))
+        TicketType.objects.filter(pk=deleted.pk).update(deleted_at=timezone.now())
+        ticket_type_catalog.invalidate()
+
+    def assertSameJSON(self, expected, actual):
+        self.assertEqual(JSONRenderer().render(actual), JSONRenderer().render(expected))
+
+    def test_tickets(self):
+        tickets = Ticket.objects.order_by('ticket_code')
+
+        encoded = ticket_row_encoder.render(tickets)
+
+        self.assertSameJSON(TicketSerializer(tickets, many=True).data, encoded)
+        # DELETED1, EXPIRED1, SEED0000, SEED0001 (redeemed)
+        self.assertEqual([data['valid'] for data in encoded], [False, False, True, False])
+
+    def test_ticket_fields_and_expand(self):
+        tickets = Ticket.objects.order_by('ticket_code')
+        encoder = ticket_row_encoder.select(['ticket_code', 'agent', 'valid'], expand=['ticket_type'])
+
+        expected = [
+            {'ticket_code': data['ticket_code'], 'agent': ticket.agent_id, 'ticket_type': data['ticket_type'],
+             'valid': data['valid']}
+            for ticket, data in zip(tickets, TicketSerializer(tickets, many=True).data)
+        ]
+        self.assertSameJSON(expected, encoder.render(tickets))
+
+    def test_vouchers(self):
+        seller = create_agent(login_id='MER-001')
+        Voucher.objects.create(voucher_code='V-1', owner=self.agent, seller=seller, amount=Decimal('1500.50'))
+        Voucher.objects.create(voucher_code='V-2', owner=self.agent, seller=seller, amount=Decimal('0.10'),
+                               processed=True)
+        vouchers = Voucher.objects.order_by('voucher_code')
+
+        self.assertSameJSON(VoucherListSerializer(vouchers, many=True).data, voucher_list_encoder.render(vouchers))
+
+    def test_payout_requests(self):
+        PayoutRequest.objects.create(user=self.agent, amount=Decimal('250.00'), payment_id='PAY-1')
+        PayoutRequest.objects.create(user=self.agent, amount=Decimal('12.34'), salary=Decimal('99.99'),
+                                     status='approved')
+        payouts = PayoutRequest.objects.order_by('pk')
+
+        self.assertSameJSON(PayoutRequestSerializer(payouts, many=True).data, payout_request_encoder.render(payouts))
+
+
+class FastJSONTests(SimpleTestCase):
+    """
+    The orjson renderer and parser must behave exactly like DRF's JSON classes.
+    """
+    payload = {
+        'decimals': [Decimal('1500.50'), Decimal('0.10'), Decimal('-3'), Decimal('123456789.99')],
+        'datetimes': [
+            datetime.datetime(2026, 10, 18, 13, 5, 7, 123456, tzinfo=datetime.timezone.utc),
+            datetime.datetime(2026, 10, 18, 13, 5, 7, tzinfo=datetime.timezone(datetime.timedelta(hours=2))),
+            datetime.datetime(2026, 10, 18, 13, 5, 7, 5),
+            datetime.date(2026, 10, 18),
+            datetime.time(13, 5, 7, 250),
+            datetime.timedelta(minutes=90),
+        ],
+        'id': uuid.UUID('01a14f54-0bfd-7f4e-8f2d-7285cb5c1d98'),
+        'text': ['Café \u2028 \u2029 \U0001f39f', gettext_lazy('Ticket')],
+        'numbers': [2 ** 63 - 1, 0.5, True, None],
+    }
+
+    def test_renderer_output(self):
+        # The payload goes through orjson, the other cases through the stdlib fallback
+        fallbacks = [{'serial': 2 ** 70}, {1: 'non-string key'}, {'amount': Decimal('1E+20')},
+                     {'amount': Decimal('0.0000001')}]
+        for data in [self.payload] + fallbacks:
+            with self.subTest(data=data):
+                self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_renderer_indent(self):
+        media_type = 'application/json; indent=4'
+        self.assertEqual(FastJSONRenderer().render(self.payload, media_type),
+                         JSONRenderer().render(self.payload, media_type))
+
+    def test_parser(self):
+        bodies = [
+            b'{"amount": "1500.50", "quantity": 3, "price": 10.25, "name": "Caf\\u00e9"}',
+            b'{"serial": 123456789012345678901234}',
+        ]
+        for body in bodies:
+            with self.subTest(body=body):
+                self.assertEqual(FastJSONParser().parse(io.BytesIO(body)), JSONParser().parse(io.BytesIO(body)))
+
+    def test_parser_errors(self):
+        for body in (b'{"amount": ', b'[NaN, Infinity]'):
+            errors = []
+            for parser in (FastJSONParser(), JSONParser()):
+                with self.subTest(body=body), self.assertRaises(ParseError) as context:
+                    parser.parse(io.BytesIO(body))
+                errors.append(str(context.exception))
+            self.assertEqual(errors[0], errors[1])
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class KeysetPaginationTests(TestCase):
+    def test_pages_cover_every_ticket_once(self):
+        agent = create_agent()
+        seed_tickets(25, agent, create_ticket_type())
+        # Ties on created_at are broken by id
+        Ticket.objects.filter(ticket_code__lt='SEED0010').update(created_at=timezone.now())
+        client = agent_client(agent)
+
+        codes, cursor = [], ''
+        while cursor is not None:
+            response = client.get('/api/ticket/get-agent-tickets/', {'page_size': 10, 'cursor': cursor})
+            self.assertEqual(response.status_code, 200)
+            codes += [ticket['ticket_code'] for ticket in response.data['tickets']]
+            cursor = response.data['next_cursor']
+
+        expected = Ticket.objects.order_by('created_at', 'id').values_list('ticket_code', flat=True)
+        self.assertEqual(codes, list(expected))
+
+
+@override_settings(SECURE_SSL_REDIRECT=False, TICKET_VELOCITY_PER_MINUTE=10, TICKET_VELOCITY_PER_HOUR=100,
+                   TICKET_ISSUANCE_ASYNC_THRESHOLD=10)
+class VelocityLimitTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.agent = create_agent()
+        self.ticket_type = create_ticket_type()
+        self.client = agent_client(self.agent)
+
+    def sell(self, quantity, **headers):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post('/api/ticket/create-ticket/', {
+                'ticket_type': str(self.ticket_type.pk), 'quantity': quantity, 'buyer_name': 'B', 'buyer_contact': '1',
+            }, format='json', **headers)
+
+    def sold_this_minute(self):
+        return velocity_limiter.velocity(self.agent.pk)['minute']['tickets']
+
+    def test_background_sale_at_the_threshold_is_allowed(self):
+        with mock.patch('api.ticket.views.enqueue_issuance_job'):
+            self.assertEqual(self.sell(10).status_code, 202)
+        self.assertEqual(self.sold_this_minute(), 10)
+
+    def test_quantity_over_a_configured_limit_is_refused(self):
+        response = self.sell(11)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertNotIn('Retry-After', response)
+
+    def test_failed_sale_is_not_counted(self):
+        self.ticket_type.inventory_limit = 3
+        self.ticket_type.save()
+        configure_inventory(self.ticket_type)
+        ticket_type_catalog.invalidate()
+
+        self.assertEqual(self.sell(5).status_code, 400)
+        self.assertEqual(self.sold_this_minute(), 0)
+
+    def test_limited_sale_is_not_replayed(self):
+        self.assertEqual(self.sell(8).status_code, 201)
+        self.assertEqual(self.sell(5, HTTP_IDEMPOTENCY_KEY='key-1').status_code, 429)
+
+        with self.settings(TICKET_VELOCITY_PER_MINUTE=20):
+            self.assertEqual(self.sell(5, HTTP_IDEMPOTENCY_KEY='key-1').status_code, 201)
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class DefaultVelocityTests(TestCase):
+    def test_large_background_sale_is_accepted(self):
+        agent = create_agent(balance=Decimal('1000000.00'))
+        ticket_type = create_ticket_type()
+        quantity = settings.TICKET_ISSUANCE_ASYNC_THRESHOLD * 5
+
+        with mock.patch('api.ticket.views.enqueue_issuance_job'), self.captureOnCommitCallbacks(execute=True):
+            response = agent_client(agent).post('/api/ticket/create-ticket/', {
+                'ticket_type': str(ticket_type.pk), 'quantity': quantity, 'buyer_name': 'B', 'buyer_contact': '1',
+            }, format='json')
+
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(TicketIssuanceJob.objects.get().quantity, quantity)
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class TicketTypeValidityTests(TestCase):
+    """
+    Ticket validity follows the ticket type at read time; changing or deleting a type
+    never rewrites its tickets.
+    """
+
+    def setUp(self):
+        ticket_cache.clear()
+        self.addCleanup(ticket_cache.clear)
+        self.agent = create_agent()
+        self.ticket_type = create_ticket_type()
+        self.ticket = issue_tickets(self.agent, self.ticket_type, 1, 'B', '1')[0]
+        self.admin = agent_client(create_admin())
+        self.type_url = f'/api/ticket/ticket_type/{self.ticket_type.pk}/'
+
+    def check(self, ticket_code=None):
+        return self.admin.get(f'/api/ticket/check-ticket/{ticket_code or self.ticket.ticket_code}/')
+
+    def assertTicketsNotWritten(self, queries):
+        update = f"UPDATE {connection.ops.quote_name(Ticket._meta.db_table)}"
+        self.assertFalse([query['sql'] for query in queries if query['sql'].startswith(update)])
+
+    def test_extended_type_extends_its_tickets(self):
+        expiration_date = timezone.now() + timedelta(days=30)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.admin.put(self.type_url, {'expiration_date': expiration_date.isoformat()}, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTicketsNotWritten(queries)
+        check = self.check()
+        self.assertTrue(check.data['valid'])
+        self.assertEqual(check.data['ticket_info']['valid_until'], expiration_date)
+        self.ticket.refresh_from_db()
+        self.assertEqual(self.ticket.valid_until, self.ticket_type.expiration_date)
+
+    def test_type_expired_after_the_sale_invalidates_its_tickets(self):
+        TicketType.objects.filter(pk=self.ticket_type.pk).update(expiration_date=timezone.now() - timedelta(hours=1))
+        ticket_type_catalog.invalidate()
+
+        check = self.check()
+
+        self.assertEqual(check.status_code, 200)
+        self.assertFalse(check.data['valid'])
+        self.assertEqual(check.data['message'], "Ticket is invalid or expired.")
+        listed = agent_client(self.agent).get('/api/ticket/get-agent-tickets/')
+        self.assertFalse(listed.data['tickets'][0]['valid'])
+
+    def test_deleted_type_invalidates_its_tickets(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.admin.delete(f'/api/ticket/ticket-type/{self.ticket_type.pk}/delete/')
+
+        self.assertEqual(response.status_code, 204)
+        self.assertTicketsNotWritten(queries)
+        self.assertEqual(self.check().status_code, 410)
+        listed = agent_client(self.agent).get('/api/ticket/get-agent-tickets/')
+        self.assertFalse(listed.data['tickets'][0]['valid'])
+        # The name is free for a new type
+        create_ticket_type(name=self.ticket_type.name)
+
+    def test_deleted_type_cannot_be_changed_or_deleted_again(self):
+        self.admin.delete(f'/api/ticket/ticket-type/{self.ticket_type.pk}/delete/')
+
+        self.assertEqual(self.admin.put(self.type_url, {'unit_price': '5.00'}, format='json').status_code, 404)
+        self.assertEqual(self.admin.delete(f'/api/ticket/ticket-type/{self.ticket_type.pk}/delete/').status_code, 404)
+
+    def test_invalid_change_is_refused(self):
+        past = (timezone.now() - timedelta(days=1)).isoformat()
+
+        self.assertEqual(self.admin.put(self.type_url, {'expiration_date': past}, format='json').status_code, 400)
+        self.assertEqual(self.admin.put(self.type_url, {'unit_price': '-1.00'}, format='json').status_code, 400)
+        self.assertEqual(self.admin.put(f'/api/ticket/ticket_type/{uuid.uuid4()}/', {}, format='json').status_code,
+                         404)
+        self.assertTrue(self.check().data['valid'])
+
+    def test_agent_cannot_change_a_type(self):
+        response = agent_client(self.agent).put(self.type_url, {'unit_price': '5.00'}, format='json')
+
+        self.assertEqual(response.status_code, 403)
+
+    def test_unknown_code_is_not_found(self):
+        self.assertEqual(self.check('NOPE0000').status_code, 404)
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class ListingQueryCountTests(TestCase):
+    """
+    A listing costs the same number of queries whatever its size.
+    """
+
+    def setUp(self):
+        self.agent = create_agent()
+        self.merchant = User.objects.create_user(username='MER-001', password='x', login_id='MER-001',
+                                                 role='Merchant')
+        self.ticket_types = [create_ticket_type(), create_ticket_type(name='Raffle')]
+
+    def sell_tickets(self, count, start=0):
+        Ticket.objects.bulk_create([
+            Ticket(ticket_code=f"LIST{serial:04d}", buyer_name='B', buyer_contact='1', agent=self.agent,
+                   ticket_type=self.ticket_types[serial % 2], valid_until=timezone.now() + timedelta(days=1))
+            for serial in range(start, start + count)
+        ])
+
+    def sell_vouchers(self, count, start=0):
+        Voucher.objects.bulk_create([
+            Voucher(voucher_code=f"V-{serial}", owner=self.agent, seller=self.merchant, amount=Decimal('10.00'))
+            for serial in range(start, start + count)
+        ])
+
+    def assertFixedQueries(self, client, url, params, sell, key=None):
+        def listed():
+            # Warm the per-process catalog so only the listing itself is counted
+            client.get(url, params)
+            with CaptureQueriesContext(connection) as queries:
+                response = client.get(url, params)
+            self.assertEqual(response.status_code, 200)
+            rows = response.data[key] if key else response.data
+            return len(rows), len(queries)
+
+        empty_rows, empty_queries = listed()
+        sell(1)
+        one_row, one_queries = listed()
+        sell(30, start=1)
+        many_rows, many_queries = listed()
+
+        self.assertEqual((empty_rows, one_row, many_rows), (0, 1, 31))
+        self.assertEqual(empty_queries, one_queries)
+        self.assertEqual(one_queries, many_queries)
+
+    def test_agent_tickets(self):
+        self.assertFixedQueries(agent_client(self.agent), '/api/ticket/get-agent-tickets/', {}, self.sell_tickets,
+                                key='tickets')
+
+    def test_agent_tickets_page(self):
+        self.assertFixedQueries(agent_client(self.agent), '/api/ticket/get-agent-tickets/', {'page_size': 50},
+                                self.sell_tickets, key='tickets')
+
+    def test_all_tickets_for_admin(self):
+        self.assertFixedQueries(agent_client(create_admin()), '/api/ticket/get-agent-tickets/',
+                                {'expand': 'agent,ticket_type'}, self.sell_tickets, key='tickets')
+
+    def test_sold_vouchers(self):
+        self.assertFixedQueries(agent_client(self.merchant), '/api/voucher/sold_vouchers/', {}, self.sell_vouchers)
+
+    def test_bought_vouchers(self):
+        self.assertFixedQueries(agent_client(self.agent), '/api/voucher/bought_vouchers/', {}, self.sell_vouchers)
+
+    def test_voucher_is_fetched_with_its_owner_and_seller(self):
+        self.sell_vouchers(1)
+        voucher = Voucher.objects.get()
+        client = agent_client(self.agent)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get('/api/voucher/get_voucher/', {'voucher_code': voucher.voucher_code})
+
+        self.assertEqual(response.status_code, 200)
+        # Other queries only read the catalog version from the cache table
+        user_table = connection.ops.quote_name(User._meta.db_table)
+        self.assertEqual(len([query for query in queries if user_table in query['sql']]), 1)
+        self.assertEqual(response.data['owner']['first_name'], self.agent.first_name)
+        self.assertIn('seller', response.data)
+
+    def test_voucher_errors(self):
+        self.sell_vouchers(1)
+        voucher = Voucher.objects.get()
+        stranger = agent_client(create_agent(login_id='AGT-002'))
+
+        self.assertEqual(agent_client(self.agent).get('/api/voucher/get_voucher/').status_code, 400)
+        self.assertEqual(agent_client(self.agent).get('/api/voucher/get_voucher/', {'id': uuid.uuid4()}).status_code,
+                         404)
+        self.assertEqual(stranger.get('/api/voucher/get_voucher/', {'id': voucher.pk}).status_code, 403)
+
+    def test_serializer_renders_each_ticket_type_once(self):
+        self.sell_tickets(4)
+        tickets = list(Ticket.objects.select_related('agent').order_by('ticket_code'))
+        ticket_type_catalog.all()
+
+        with self.assertNumQueries(0):
+            data = TicketSerializer(tickets, many=True).data
+
+        self.assertIs(data[0]['ticket_type'], data[2]['ticket_type'])
+        self.assertIsNot(data[0]['ticket_type'], data[1]['ticket_type'])
+        self.assertEqual(data[1]['ticket_type']['name'], 'Raffle')
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class SparseFieldsetTests(TestCase):
+    def setUp(self):
+        self.agent = create_agent()
+        seed_tickets(3, self.agent, create_ticket_type())
+        self.client = agent_client(self.agent)
+
+    def tickets(self, **params):
+        return self.client.get('/api/ticket/get-agent-tickets/', params)
+
+    def test_fields_narrow_rows_and_columns(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.tickets(fields='ticket_code,buyer_name,created_at')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([set(row) for row in response.data['tickets']],
+                         [{'ticket_code', 'buyer_name', 'created_at'}] * 3)
+        ticket_table = connection.ops.quote_name(Ticket._meta.db_table)
+        [listing] = [query['sql'] for query in queries if f'FROM {ticket_table}' in query['sql']]
+        self.assertNotIn('JOIN', listing)
+        self.assertNotIn('buyer_contact', listing)
+
+    def test_relations_are_ids_unless_expanded(self):
+        plain = self.tickets(fields='ticket_code,agent,ticket_type').data['tickets'][0]
+        expanded = self.tickets(fields='ticket_code', expand='agent').data['tickets'][0]
+
+        self.assertEqual(plain['agent'], self.agent.pk)
+        self.assertEqual(set(expanded), {'ticket_code', 'agent'})
+        self.assertEqual(expanded['agent']['first_name'], self.agent.first_name)
+
+    def test_empty_fields_return_everything(self):
+        full = self.tickets().data['tickets']
+
+        self.assertEqual(self.tickets(fields='').data['tickets'], full)
+        self.assertEqual(self.tickets(fields=' , ').data['tickets'], full)
+        self.assertIsInstance(full[0]['agent'], dict)
+
+    def test_names_are_trimmed(self):
+        response = self.tickets(fields=' ticket_code , valid ')
+
+        self.assertEqual(set(response.data['tickets'][0]), {'ticket_code', 'valid'})
+
+    def test_page_leaves_out_the_cursor_columns(self):
+        response = self.tickets(fields='buyer_name', page_size=2)
+
+        self.assertEqual([set(row) for row in response.data['tickets']], [{'buyer_name'}] * 2)
+        self.assertIsNotNone(response.data['next_cursor'])
+
+    def test_unknown_or_unexpandable_names_are_refused(self):
+        for params in ({'fields': 'ticket_code,secret'}, {'expand': 'agent,owner'}, {'expand': 'buyer_name'}):
+            with self.subTest(**params):
+                response = self.tickets(**params)
+
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('error', response.data)
+
+    def test_vouchers(self):
+        Voucher.objects.create(voucher_code='V-1', owner=self.agent, seller=create_agent(login_id='MER-001'),
+                               amount=Decimal('5.00'))
+
+        response = self.client.get('/api/voucher/bought_vouchers/', {'fields': 'voucher_code,owner'})
+
+        self.assertEqual(response.data, [{'voucher_code': 'V-1', 'owner': self.agent.pk}])
+        self.assertEqual(self.client.get('/api/voucher/bought_vouchers/', {'fields': 'seller'}).status_code, 400)
+
+    def test_payout_requests(self):
+        PayoutRequest.objects.create(user=self.agent, amount=Decimal('250.00'), payment_id='PAY-1')
+
+        response = self.client.get('/api/payout/list/', {'fields': 'amount,status', 'expand': 'user'})
+
+        [row] = response.data['data']
+        self.assertEqual(set(row), {'amount', 'status', 'user'})
+        self.assertEqual(row['status'], 'pending')
+        self.assertEqual(self.client.get('/api/payout/list/', {'expand': 'amount'}).status_code, 400)
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class BatchCheckTests(TestCase):
+    url = '/api/ticket/check-tickets/'
+
+    def setUp(self):
+        ticket_cache.clear()
+        self.addCleanup(ticket_cache.clear)
+        self.agent = create_agent()
+        self.client = agent_client(self.agent)
+        self.tickets = issue_tickets(self.agent, create_ticket_type(), 2, 'B', '1')
+        deleted = create_ticket_type(name='Deleted')
+        self.deleted = issue_tickets(self.agent, deleted, 1, 'B', '1')[0]
+        TicketType.objects.filter(pk=deleted.pk).update(deleted_at=timezone.now())
+        ticket_type_catalog.invalidate()
+
+    def check(self, ticket_codes):
+        return self.client.post(self.url, {'ticket_codes': ticket_codes}, format='json')
+
+    def test_results_match_the_single_check_in_request_order(self):
+        first, second = (ticket.ticket_code for ticket in self.tickets)
+        codes = [second, 'NOPE0000', first, self.deleted.ticket_code, second]
+
+        response = self.check(codes)
+
+        self.assertEqual(response.status_code, 200)
+        results = response.data['results']
+        self.assertEqual([result['ticket_code'] for result in results], codes)
+        self.assertEqual([result['status'] for result in results], [200, 404, 200, 410, 200])
+        for code, result in zip(codes, results):
+            single = self.client.get(f'/api/ticket/check-ticket/{code}/')
+            self.assertEqual(result['status'], single.status_code)
+            self.assertEqual({key: value for key, value in result.items() if key not in ('ticket_code', 'status')},
+                             single.data)
+
+    def test_invalid_batches_are_refused(self):
+        too_many = [f"CODE{serial:04d}" for serial in range(501)]
+        for body in ({}, {'ticket_codes': []}, {'ticket_codes': 'ABC'}, {'ticket_codes': too_many},
+                     {'ticket_codes': ['X' * 17]}):
+            with self.subTest(body=str(body)[:40]):
+                response = self.client.post(self.url, body, format='json')
+
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('ticket_codes', response.data)
+
+    def test_largest_batch_is_accepted(self):
+        codes = [f"CODE{serial:04d}" for serial in range(499)] + [self.tickets[0].ticket_code]
+
+        response = self.check(codes)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 500)
+        self.assertTrue(response.data['results'][-1]['valid'])
+
+    def test_query_count_does_not_grow_with_the_batch(self):
+        # An unknown code in each batch, so both fall back to the archive table
+        self.check([self.tickets[0].ticket_code, 'NOPE0000'])
+        with CaptureQueriesContext(connection) as one:
+            self.check([self.tickets[0].ticket_code, 'NOPE0000'])
+        with CaptureQueriesContext(connection) as many:
+            self.check([ticket.ticket_code for ticket in self.tickets] + [self.deleted.ticket_code, 'NOPE0000', 'NOPE0001'])
+
+        self.assertEqual(len(one), len(many))
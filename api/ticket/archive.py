@@ -0,0 +1,139 @@
+from datetime import timedelta
+
+from django.db import DatabaseError, connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from api.models import Ticket, ArchivedTicket
+
+# Columns copied from Ticket to ArchivedTicket
+ARCHIVED_FIELDS = [
+    'id', 'ticket_code', 'buyer_name', 'buyer_contact', 'agent_id', 'ticket_type_id',
+    'created_at', 'updated_at', 'valid_until', 'valid', 'redeemed_at', 'redeemed_by_id', 'redeemed_location',
+]
+
+
+def archivable_tickets(cutoff):
+    """
+    Tickets that stopped being valid before `cutoff`: their type expired or was deleted,
+    or (for tickets whose type is gone) their own `valid_until` passed.
+    """
+    return Ticket.objects.filter(
+        Q(ticket_type__expiration_date__lt=cutoff)
+        | Q(ticket_type__deleted_at__lt=cutoff)
+        | Q(ticket_type__isnull=True, valid_until__lt=cutoff)
+    )
+
+
+def archive_expired_tickets(retention_days, chunk_size=1000, max_chunks=None):
+    """
+    Move tickets that expired more than `retention_days` ago to the archive table.
+
+    Works in chunks of `chunk_size` tickets, each copied and deleted in its own short
+    transaction, so the run can be stopped at any point and resumed later. Each chunk
+    seeks past the last archived id instead of rescanning the deleted range, so a run
+    costs the same per chunk however far it got. Stops after `max_chunks` chunks if given.
+
+    Returns:
+    - The number of archived tickets.
+    """
+    cutoff = timezone.now() - timedelta(days=retention_days)
+    archived = 0
+    chunks = 0
+    last_pk = None
+
+    while max_chunks is None or chunks < max_chunks:
+        with transaction.atomic():
+            tickets = archivable_tickets(cutoff).order_by('pk')
+            if last_pk is not None:
+                tickets = tickets.filter(pk__gt=last_pk)
+            ids = list(tickets.values_list('pk', flat=True)[:chunk_size])
+            if not ids:
+                break
+
+            rows = Ticket.objects.select_for_update().filter(pk__in=ids).values(*ARCHIVED_FIELDS)
+            ArchivedTicket.objects.bulk_create([ArchivedTicket(**row) for row in rows], ignore_conflicts=True)
+            Ticket.objects.filter(pk__in=ids).delete()
+
+        archived += len(ids)
+        chunks += 1
+        last_pk = ids[-1]
+
+    return archived
+
+
+def table_sizes():
+    """
+    Rows, data and index bytes of the ticket tables. Sizes come from MySQL's
+    information_schema (estimates) or SQLite's dbstat table; other databases, and SQLite
+    builds without dbstat, only report exact row counts.
+    """
+    tables = [Ticket._meta.db_table, ArchivedTicket._meta.db_table]
+    sizes = {table: {"rows": None, "data_bytes": None, "index_bytes": None} for table in tables}
+
+    with connection.cursor() as cursor:
+        if connection.vendor == 'mysql':
+            cursor.execute(
+                "SELECT table_name, table_rows, data_length, index_length FROM information_schema.tables "
+                "WHERE table_schema = DATABASE() AND table_name IN (%s, %s)",
+                tables,
+            )
+            return {name: {"rows": rows, "data_bytes": data, "index_bytes": index}
+                    for name, rows, data, index in cursor.fetchall()}
+
+        if connection.vendor == 'sqlite':
+            try:
+                cursor.execute(
+                    "SELECT m.tbl_name, m.type, SUM(s.pgsize) FROM sqlite_master m JOIN dbstat s ON s.name = m.name "
+                    "WHERE m.tbl_name IN (%s, %s) GROUP BY m.tbl_name, m.type",
+                    tables,
+                )
+                for table, kind, size in cursor.fetchall():
+                    sizes[table]["data_bytes" if kind == 'table' else "index_bytes"] = size
+            except DatabaseError:
+                pass
+
+    sizes[Ticket._meta.db_table]["rows"] = Ticket.objects.count()
+    sizes[ArchivedTicket._meta.db_table]["rows"] = ArchivedTicket.objects.count()
+    return sizes
+
+
+def find_ticket(ticket_code):
+    """
+    Look a ticket up by code, falling back to the archive for tickets that were moved there.
+
+    Raises:
+    - Ticket.DoesNotExist: If the code is in neither table.
+    """
+    try:
+        return Ticket.objects.select_related('agent').get(ticket_code=ticket_code)
+    except Ticket.DoesNotExist:
+        archived = ArchivedTicket.objects.select_related('agent').filter(ticket_code=ticket_code).first()
+        if archived is None:
+            raise
+        return archived
+
+
+def find_tickets(ticket_codes):
+    """
+    Look many tickets up by code in one query per table, falling back to the archive for
+    codes not in the Ticket table.
+
+    Returns:
+    - A dict of upper-cased ticket code to ticket; unknown codes are left out. The database
+      may match codes case-insensitively (MySQL does), so look results up upper-cased.
+    """
+    ticket_codes = set(ticket_codes)
+    tickets = {
+        ticket.ticket_code.upper(): ticket
+        for ticket in Ticket.objects.select_related('agent').filter(ticket_code__in=ticket_codes)
+    }
+
+    missing = [code for code in ticket_codes if code.upper() not in tickets]
+    if missing:
+        tickets.update(
+            (ticket.ticket_code.upper(), ticket)
+            for ticket in ArchivedTicket.objects.select_related('agent').filter(ticket_code__in=missing)
+        )
+
+    return tickets
@@ -0,0 +1,125 @@
+import threading
+import uuid
+
+from django.core.cache import cache
+from django.db import transaction
+
+from api.models import TicketType
+
+# Shared cache key bumped whenever a ticket type is created, updated or deleted
+CATALOG_VERSION_KEY = 'ticket_type_catalog_version'
+
+
+class TicketTypeCatalog:
+    """
+    Per-process copy of all ticket types, keyed by id and by name. Deleted types are
+    kept only so `for_ticket()` can tell them apart from unknown ones.
+
+    The catalog is small and rarely changes, so it is loaded in one query and served
+    from memory. Writers call `invalidate()`, which bumps a version in the shared cache;
+    every process compares that version at the start of each request (`sync()`) and
+    drops its copy when it changed. Returned instances are shared and must not be
+    modified.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._by_id = None
+        self._by_name = None
+
+    def sync(self):
+        # Never None, so an evicted version cannot match the one the catalog was loaded at
+        version = cache.get_or_set(CATALOG_VERSION_KEY, lambda: uuid.uuid4().hex, timeout=None)
+        if version != self._version:
+            with self._lock:
+                self._version = version
+                self._by_id = None
+                self._by_name = None
+
+    def invalidate(self):
+        with self._lock:
+            self._by_id = None
+            self._by_name = None
+
+        # Other processes reload once the change is visible to them
+        transaction.on_commit(lambda: cache.set(CATALOG_VERSION_KEY, uuid.uuid4().hex, timeout=None))
+
+    def _fill(self, ticket_types):
+        self._by_name = {
+            ticket_type.name: ticket_type for ticket_type in ticket_types if ticket_type.deleted_at is None
+        }
+        self._by_id = {ticket_type.id: ticket_type for ticket_type in ticket_types}
+
+    def _load(self):
+        by_id, by_name = self._by_id, self._by_name
+        if by_id is not None:
+            return by_id, by_name
+
+        with self._lock:
+            if self._by_id is None:
+                self._fill(list(TicketType.objects.all()))
+            return self._by_id, self._by_name
+
+    def get(self, pk, include_deleted=False):
+        """
+        Return the ticket type with id `pk`, raising `TicketType.DoesNotExist` like the ORM.
+        """
+        if not isinstance(pk, uuid.UUID):
+            try:
+                pk = uuid.UUID(str(pk))
+            except ValueError:
+                raise TicketType.DoesNotExist(f"Ticket type {pk} not found.")
+
+        by_id, _ = self._load()
+        ticket_type = by_id.get(pk)
+        if ticket_type is None or (ticket_type.deleted_at is not None and not include_deleted):
+            raise TicketType.DoesNotExist(f"Ticket type {pk} not found.")
+        return ticket_type
+
+    def get_by_name(self, name):
+        _, by_name = self._load()
+        try:
+            return by_name[name]
+        except KeyError:
+            raise TicketType.DoesNotExist(f"Ticket type {name} not found.")
+
+    def for_ticket(self, ticket):
+        """
+        Return the ticket type of `ticket` without a query, falling back to the relation
+        if the type is newer than this process's copy. None if the type was deleted.
+        """
+        if ticket.ticket_type_id is None:
+            return None
+
+        by_id, _ = self._load()
+        ticket_type = by_id.get(ticket.ticket_type_id) or ticket.ticket_type
+        return ticket_type if ticket_type.deleted_at is None else None
+
+    def for_type_id(self, ticket_type_id):
+        """
+        Like `for_ticket()`, for a bare ticket type id (e.g. from a `values()` row).
+        """
+        if ticket_type_id is None:
+            return None
+
+        by_id, _ = self._load()
+        ticket_type = by_id.get(ticket_type_id) or TicketType.objects.filter(pk=ticket_type_id).first()
+        return ticket_type if ticket_type is not None and ticket_type.deleted_at is None else None
+
+    @staticmethod
+    def _listed(by_id, include_deleted):
+        if include_deleted:
+            return list(by_id.values())
+        return [ticket_type for ticket_type in by_id.values() if ticket_type.deleted_at is None]
+
+    def all(self, include_deleted=False):
+        by_id, _ = self._load()
+        return self._listed(by_id, include_deleted)
+
+
+ticket_type_catalog = TicketTypeCatalog()
+
+
+def sync_catalog(sender, **kwargs):
+    ticket_type_catalog.sync()
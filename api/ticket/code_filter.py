@@ -0,0 +1,235 @@
+import hashlib
+import logging
+import math
+import threading
+import time
+import uuid
+from datetime import timedelta
+from itertools import islice
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.utils import timezone
+
+from api.models import Ticket, ArchivedTicket
+
+logger = logging.getLogger(__name__)
+
+# Shared cache key bumped whenever tickets are issued
+CODE_FILTER_VERSION_KEY = 'ticket_code_filter_version'
+
+# Smallest number of codes a filter is sized for
+MIN_CAPACITY = 1_000_000
+
+# How far before the previous load a catch-up starts reading: covers issuance and
+# archival transactions still open during that load, and clock skew between servers
+CATCH_UP_OVERLAP = timedelta(seconds=60)
+
+# Shortest time between two catch-ups of a process, in seconds; meanwhile codes the
+# filter does not know are left to the database lookup
+CATCH_UP_INTERVAL = 1.0
+
+LOAD_CHUNK_SIZE = 10000
+
+
+def _current_version():
+    # Never None, so an evicted version cannot match the one a filter was loaded at
+    return cache.get_or_set(CODE_FILTER_VERSION_KEY, lambda: uuid.uuid4().hex, timeout=None)
+
+
+class BloomFilter:
+    """
+    Fixed-size Bloom filter over strings. `capacity` items give a false positive
+    rate of about `error_rate`; there are no false negatives.
+    """
+
+    def __init__(self, capacity, error_rate):
+        self.capacity = capacity
+        self.size = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.count = 0
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item):
+        digest = hashlib.blake2b(item.encode('utf-8'), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+        return ((first + i * second) % self.size for i in range(self.hash_count))
+
+    def add(self, item):
+        for position in self._positions(item):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item):
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+    @property
+    def memory_bytes(self):
+        return len(self._bits)
+
+
+class TicketCodeFilter:
+    """
+    Per-process Bloom filter of every issued ticket code (live and archived), so the
+    validity check can answer 404 for mistyped or forged codes without a ticket query.
+
+    The filter is built from the database and sized for twice the current number of
+    tickets; it is rebuilt larger once that fills up. Tickets issued
+    in this process are added as they are created. Issuance also bumps a version in the
+    shared cache; a code the filter does not know is only rejected while that version
+    matches, otherwise the tickets created (or archived) since the last load are read
+    first, so a ticket issued by another process is never rejected. Codes are compared
+    upper-cased, like the (case-insensitive) database lookup.
+
+    The filter is built in a background thread, started with the first request a process
+    serves (`start()`) and again once the filter fills up; until the first build is done
+    every code is a "maybe" left to the database lookup. Catch-ups run in the scan, one
+    thread at a time and without holding the lock scans use; scans arriving meanwhile, or
+    within `CATCH_UP_INTERVAL` of the last catch-up, also answer "maybe".
+    """
+
+    def __init__(self):
+        # Guards writes to the filter and the fields below; never held during queries
+        self._lock = threading.Lock()
+        # Held by the thread building or catching up the filter (released by the builder thread)
+        self._loading = threading.Lock()
+        self._filter = None
+        self._version = None
+        self._loaded_until = None
+        self._caught_up_at = None
+
+    @staticmethod
+    def _normalize(ticket_code):
+        return ticket_code.upper()
+
+    def _read_codes(self, since=None):
+        """
+        Yield lists of the codes of every ticket, or with `since` of the tickets created
+        and the tickets archived since then (both indexed ranges).
+        """
+        querysets = [Ticket.objects.all(), ArchivedTicket.objects.all()]
+        if since is not None:
+            querysets = [Ticket.objects.filter(created_at__gte=since),
+                         ArchivedTicket.objects.filter(archived_at__gte=since)]
+
+        for queryset in querysets:
+            ticket_codes = queryset.values_list('ticket_code', flat=True).iterator(chunk_size=LOAD_CHUNK_SIZE)
+            while chunk := list(islice(ticket_codes, LOAD_CHUNK_SIZE)):
+                yield [self._normalize(ticket_code) for ticket_code in chunk]
+
+    def _build(self):
+        version = _current_version()
+        loaded_until = timezone.now()
+        caught_up_at = time.monotonic()
+
+        # The new filter is private until swapped in, so it is filled without the lock
+        total = Ticket.objects.count() + ArchivedTicket.objects.count()
+        bloom = BloomFilter(max(total * 2, MIN_CAPACITY), settings.TICKET_CODE_FILTER_ERROR_RATE)
+        for ticket_codes in self._read_codes():
+            for ticket_code in ticket_codes:
+                bloom.add(ticket_code)
+
+        logger.info(
+            "Built ticket code filter: %d codes, %d hash functions, %.2f MB (%.2f MB per million codes)",
+            bloom.count, bloom.hash_count, bloom.memory_bytes / 2 ** 20,
+            bloom.memory_bytes / bloom.capacity * 1_000_000 / 2 ** 20,
+        )
+        with self._lock:
+            self._filter, self._version, self._loaded_until = bloom, version, loaded_until
+            self._caught_up_at = caught_up_at
+
+    def _catch_up(self):
+        version = _current_version()
+        loaded_until = timezone.now()
+        caught_up_at = time.monotonic()
+
+        for ticket_codes in self._read_codes(since=self._loaded_until - CATCH_UP_OVERLAP):
+            with self._lock:
+                for ticket_code in ticket_codes:
+                    # The overlap is read again every time, count its codes once
+                    if ticket_code not in self._filter:
+                        self._filter.add(ticket_code)
+
+        with self._lock:
+            self._version, self._loaded_until, self._caught_up_at = version, loaded_until, caught_up_at
+
+    def _build_in_background(self):
+        try:
+            self._build()
+        except Exception:
+            logger.exception("Building the ticket code filter failed")
+        finally:
+            connection.close()
+            self._loading.release()
+
+    def _start_build(self):
+        if not self._loading.acquire(blocking=False):
+            return
+        try:
+            threading.Thread(target=self._build_in_background, name='ticket-code-filter', daemon=True).start()
+        except BaseException:
+            self._loading.release()
+            raise
+
+    def start(self):
+        """
+        Start building the filter in the background, unless it is built or being built.
+        """
+        if settings.TICKET_CODE_FILTER_ENABLED and self._filter is None:
+            self._start_build()
+
+    def might_contain(self, ticket_code):
+        """
+        False only if no ticket with `ticket_code` was ever issued.
+        """
+        if not settings.TICKET_CODE_FILTER_ENABLED:
+            return True
+
+        ticket_code = self._normalize(ticket_code)
+
+        bloom = self._filter
+        if bloom is None:
+            self._start_build()
+            return True
+        if bloom.count > bloom.capacity:
+            # A full filter has more false positives but no false negatives; serve it until replaced
+            self._start_build()
+
+        if ticket_code in bloom:
+            return True
+        if cache.get(CODE_FILTER_VERSION_KEY) == self._version:
+            return False
+
+        # The filter is behind
+        if not self._loading.acquire(blocking=False):
+            return True
+        try:
+            if time.monotonic() - self._caught_up_at < CATCH_UP_INTERVAL:
+                return True
+            self._catch_up()
+            return ticket_code in self._filter
+        finally:
+            self._loading.release()
+
+    def add(self, ticket_codes):
+        """
+        Record newly issued `ticket_codes` here and, once the current transaction commits,
+        tell the other processes to catch up.
+        """
+        if not settings.TICKET_CODE_FILTER_ENABLED:
+            return
+
+        with self._lock:
+            if self._filter is not None:
+                for ticket_code in ticket_codes:
+                    self._filter.add(self._normalize(ticket_code))
+
+        transaction.on_commit(lambda: cache.set(CODE_FILTER_VERSION_KEY, uuid.uuid4().hex, timeout=None))
+
+
+ticket_code_filter = TicketCodeFilter()
+
+
+def start_code_filter(sender, **kwargs):
+    ticket_code_filter.start()
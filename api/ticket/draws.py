@@ -0,0 +1,122 @@
+import random
+import secrets
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from api.models import Draw, DrawWinner, Ticket, TicketType
+
+from .catalog import ticket_type_catalog
+
+# Candidates read per keyset page
+CHUNK_SIZE = 5000
+
+# Tickets created this recently are left out of a draw: sales still being committed could
+# otherwise appear when the draw is replayed without having been part of it
+CUTOFF_MARGIN = timedelta(seconds=60)
+
+
+def _candidates(ticket_type, tickets_until):
+    # Keyset pagination on the primary key: constant memory, stable order for a given set
+    last_pk = None
+    while True:
+        queryset = Ticket.objects.filter(ticket_type=ticket_type, valid=True, created_at__lte=tickets_until)
+        queryset = queryset.order_by('pk')
+        if last_pk is not None:
+            queryset = queryset.filter(pk__gt=last_pk)
+
+        rows = list(queryset.values_list('pk', 'ticket_code')[:CHUNK_SIZE])
+        if not rows:
+            return
+        yield from rows
+        last_pk = rows[-1][0]
+
+
+def sample_winners(ticket_type, winner_count, seed, tickets_until):
+    """
+    Pick `winner_count` tickets uniformly at random among the valid tickets of
+    `ticket_type` created up to `tickets_until`, reading them in chunks and keeping only
+    a reservoir of winners. The same arguments always pick the same winners.
+
+    Returns:
+    - The winners as (ticket id, ticket code) tuples in rank order, and the number of candidates.
+    """
+    rng = random.Random(seed)
+    reservoir = []
+    candidate_count = 0
+
+    for candidate in _candidates(ticket_type, tickets_until):
+        if candidate_count < winner_count:
+            reservoir.append(candidate)
+        else:
+            index = rng.randrange(candidate_count + 1)
+            if index < winner_count:
+                reservoir[index] = candidate
+        candidate_count += 1
+
+    # Reservoir positions depend on arrival order; shuffle so ranks are uniform as well
+    rng.shuffle(reservoir)
+    return reservoir, candidate_count
+
+
+def run_draw(ticket_type, winner_count, created_by, seed=None):
+    """
+    Draw and store the winners of `ticket_type` among its tickets sold until
+    `CUTOFF_MARGIN` ago. A random seed is generated unless given; the seed and the cutoff
+    are stored so the draw can be replayed (`replay_draw()`).
+
+    Returns:
+    - The saved `Draw`.
+    """
+    seed = seed or secrets.token_hex(16)
+    tickets_until = timezone.now() - CUTOFF_MARGIN
+    winners, candidate_count = sample_winners(ticket_type, winner_count, seed, tickets_until)
+
+    with transaction.atomic():
+        draw = Draw.objects.create(
+            ticket_type=ticket_type,
+            winner_count=winner_count,
+            seed=seed,
+            tickets_until=tickets_until,
+            candidate_count=candidate_count,
+            created_by=created_by,
+        )
+        DrawWinner.objects.bulk_create([
+            DrawWinner(draw=draw, rank=rank, ticket_id=ticket_id, ticket_code=ticket_code)
+            for rank, (ticket_id, ticket_code) in enumerate(winners, start=1)
+        ])
+        TicketType.objects.filter(pk=ticket_type.pk).update(last_draw_at=draw.created_at)
+
+    ticket_type_catalog.invalidate()
+    return draw
+
+
+def replay_draw(draw):
+    """
+    Sample the winners of `draw` again from its seed and cutoff, to audit it. Matches the
+    stored winners as long as none of its candidates were invalidated or archived since.
+
+    Returns:
+    - The winners as (ticket id, ticket code) tuples in rank order, and the number of candidates.
+    """
+    return sample_winners(draw.ticket_type, draw.winner_count, draw.seed, draw.tickets_until)
+
+
+def _winnings(winners):
+    winnings = {}
+    for winner in winners:
+        winnings.setdefault(winner.ticket_code, []).append({
+            "draw_id": winner.draw_id,
+            "rank": winner.rank,
+            "drawn_at": winner.draw.created_at,
+        })
+    return winnings
+
+
+def find_winnings(ticket_codes):
+    """
+    Return the draws won by each of `ticket_codes`, as a dict of code to a list of
+    `draw_id`, `rank` and `drawn_at`; codes that never won are left out.
+    """
+    return _winnings(DrawWinner.objects.select_related('draw').filter(ticket_code__in=ticket_codes))
@@ -0,0 +1,134 @@
+import random
+
+from django.db import transaction
+from django.db.models import F, Sum
+
+from api.models import ArchivedTicket, Ticket, TicketInventoryStripe, TicketIssuanceJob
+
+# Number of counter rows a capped ticket type's stock is spread over
+STRIPE_COUNT = 8
+
+
+def _locked_stripes(ticket_type_id):
+    # Always lock in stripe order so concurrent rebalances cannot deadlock
+    return list(
+        TicketInventoryStripe.objects.select_for_update().filter(ticket_type_id=ticket_type_id).order_by('stripe')
+    )
+
+
+def _sold_without_limit(ticket_type_id):
+    """
+    Tickets of a type sold while it had no stripes: issued ones (archived included) and
+    the ones queued background jobs have yet to issue.
+    """
+    queued = TicketIssuanceJob.objects.filter(
+        ticket_type_id=ticket_type_id, status__in=['pending', 'running']
+    ).aggregate(quantity=Sum('quantity'), issued=Sum('issued'))
+
+    return (
+        Ticket.objects.filter(ticket_type_id=ticket_type_id).count()
+        + ArchivedTicket.objects.filter(ticket_type_id=ticket_type_id).count()
+        + (queued['quantity'] or 0) - (queued['issued'] or 0)
+    )
+
+
+def configure_inventory(ticket_type):
+    """
+    Create, resize or remove the stock stripes of `ticket_type` to match its `inventory_limit`.
+
+    Tickets already sold stay counted, including those sold before the type had a limit;
+    the remaining stock is spread evenly over the stripes.
+    """
+    with transaction.atomic():
+        stripes = _locked_stripes(ticket_type.pk)
+
+        if ticket_type.inventory_limit is None:
+            TicketInventoryStripe.objects.filter(ticket_type_id=ticket_type.pk).delete()
+            return
+
+        if not stripes:
+            stripes = [TicketInventoryStripe(ticket_type_id=ticket_type.pk, stripe=stripe)
+                       for stripe in range(STRIPE_COUNT)]
+            stripes[0].sold = _sold_without_limit(ticket_type.pk)
+            stripes = TicketInventoryStripe.objects.bulk_create(stripes)
+
+        sold = sum(stripe.sold for stripe in stripes)
+        share, extra = divmod(max(ticket_type.inventory_limit - sold, 0), len(stripes))
+
+        for index, stripe in enumerate(stripes):
+            stripe.capacity = stripe.sold + share + (1 if index < extra else 0)
+
+        TicketInventoryStripe.objects.bulk_update(stripes, ['capacity'])
+
+
+def reserve_inventory(ticket_type, quantity):
+    """
+    Take `quantity` tickets from the stock of a capped ticket type.
+
+    Tries single-row conditional updates on the stripes in random order, which only lock
+    the stripe that is hit. If no stripe has room on its own, the stripes are locked
+    together and the request is served from their combined free stock. Must run inside
+    the caller's transaction so a failed sale gives the stock back.
+
+    Raises:
+    - ValueError: If fewer than `quantity` tickets are left.
+    """
+    if ticket_type.inventory_limit is None:
+        return
+
+    stripes = list(range(STRIPE_COUNT))
+    random.shuffle(stripes)
+
+    for stripe in stripes:
+        reserved = TicketInventoryStripe.objects.filter(
+            ticket_type_id=ticket_type.pk, stripe=stripe, capacity__gte=F('sold') + quantity
+        ).update(sold=F('sold') + quantity)
+
+        if reserved:
+            return
+
+    # The free stock is split across stripes (or sold out): serve it from all of them
+    stripes = _locked_stripes(ticket_type.pk)
+    if sum(stripe.capacity - stripe.sold for stripe in stripes) < quantity:
+        raise ValueError("Not enough tickets left for the selected Ticket Type.")
+
+    for stripe in stripes:
+        taken = min(quantity, stripe.capacity - stripe.sold)
+        stripe.sold += taken
+        quantity -= taken
+
+    TicketInventoryStripe.objects.bulk_update(stripes, ['sold'])
+
+
+def release_inventory(ticket_type_id, quantity):
+    """
+    Give back `quantity` reserved tickets that were never issued.
+    """
+    with transaction.atomic():
+        stripes = _locked_stripes(ticket_type_id)
+
+        for stripe in stripes:
+            returned = min(quantity, stripe.sold)
+            stripe.sold -= returned
+            quantity -= returned
+
+        TicketInventoryStripe.objects.bulk_update(stripes, ['sold'])
+
+
+def inventory_status(ticket_type):
+    """
+    Return the limit, sold and remaining stock of `ticket_type` (None when unlimited).
+    """
+    if ticket_type.inventory_limit is None:
+        return {"inventory_limit": None, "sold": None, "remaining": None}
+
+    totals = TicketInventoryStripe.objects.filter(ticket_type_id=ticket_type.pk).aggregate(
+        capacity=Sum('capacity'), sold=Sum('sold')
+    )
+    sold = totals['sold'] or 0
+
+    return {
+        "inventory_limit": ticket_type.inventory_limit,
+        "sold": sold,
+        "remaining": (totals['capacity'] or 0) - sold,
+    }
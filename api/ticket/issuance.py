@@ -0,0 +1,39 @@
+from api.models import Ticket
+from api.utilities import generate_ticket_codes
+
+from .code_filter import ticket_code_filter
+
+# Number of rows sent per INSERT statement when issuing tickets in bulk
+BULK_CREATE_BATCH_SIZE = 500
+
+
+def issue_tickets(agent, ticket_type, quantity, buyer_name, buyer_contact, issuance_job=None):
+    """
+    Issue `quantity` tickets of `ticket_type` for `agent` in bulk.
+
+    The request is expected to be validated already; codes are allocated in one
+    step and the rows are written with batched INSERTs. Must be called inside the
+    caller's transaction so the tickets and the wallet debit commit together.
+
+    Returns:
+    - The list of created `Ticket` instances.
+    """
+    codes = generate_ticket_codes(quantity, ticket_type)
+
+    tickets = [
+        Ticket(
+            ticket_code=code,
+            buyer_name=buyer_name,
+            buyer_contact=buyer_contact,
+            agent=agent,
+            ticket_type=ticket_type,
+            valid_until=ticket_type.expiration_date,
+            issuance_job=issuance_job,
+        )
+        for code in codes
+    ]
+
+    tickets = Ticket.objects.bulk_create(tickets, batch_size=BULK_CREATE_BATCH_SIZE)
+    ticket_code_filter.add(codes)
+
+    return tickets
@@ -0,0 +1,136 @@
+import logging
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from api.models import TicketIssuanceJob
+from .issuance import issue_tickets
+from .inventory import release_inventory
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=settings.TICKET_ISSUANCE_WORKERS,
+                                       thread_name_prefix="ticket-issuance")
+    return _executor
+
+
+def enqueue_issuance_job(job):
+    """
+    Hand a job to the in-process worker once the surrounding transaction commits.
+
+    When `TICKET_ISSUANCE_WORKERS` is 0 the job stays pending for
+    `manage.py process_issuance_jobs`.
+    """
+    if settings.TICKET_ISSUANCE_WORKERS <= 0:
+        return
+
+    transaction.on_commit(lambda: _get_executor().submit(_run_in_thread, job.pk))
+
+
+def _run_in_thread(job_id):
+    try:
+        run_issuance_job(job_id)
+    finally:
+        # Worker threads own their connections, close them once the job is done
+        connections.close_all()
+
+
+class LeaseLost(Exception):
+    """
+    Another worker took the job over after this one missed its heartbeats.
+    """
+
+
+def run_issuance_job(job_id, resume=False):
+    """
+    Issue the tickets of a job in chunks of `TICKET_ISSUANCE_CHUNK_SIZE`.
+
+    Each chunk commits together with the job's progress counter, so an interrupted job
+    resumes from the last committed chunk. If issuance fails, the job is marked failed
+    and the cost of the tickets that were not issued is refunded to the agent's wallet.
+
+    The worker holds a lease on the job: every chunk commits only if the job still
+    belongs to it, and renews its heartbeat. A job is never run by two workers at once.
+
+    - `resume` (bool): Also take over a job left `running` by a worker whose lease
+      expired (no heartbeat for `TICKET_ISSUANCE_LEASE_SECONDS`), e.g. after a restart.
+    """
+    worker_id = uuid.uuid4().hex
+    now = timezone.now()
+    claimable = Q(status='pending')
+    if resume:
+        lease_expired = now - timedelta(seconds=settings.TICKET_ISSUANCE_LEASE_SECONDS)
+        claimable |= Q(status='running') & (Q(heartbeat_at__lt=lease_expired) | Q(heartbeat_at__isnull=True))
+
+    claimed = TicketIssuanceJob.objects.filter(claimable, pk=job_id).update(
+        status='running', worker_id=worker_id, heartbeat_at=now, updated_at=now
+    )
+    if not claimed:
+        return
+
+    job = TicketIssuanceJob.objects.select_related('agent', 'ticket_type').get(pk=job_id)
+    owned = TicketIssuanceJob.objects.filter(pk=job_id, status='running', worker_id=worker_id)
+    chunk_size = settings.TICKET_ISSUANCE_CHUNK_SIZE
+
+    try:
+        if job.ticket_type is None:
+            raise ValueError("The selected Ticket Type no longer exists.")
+
+        while job.issued < job.quantity:
+            count = min(chunk_size, job.quantity - job.issued)
+
+            with transaction.atomic():
+                issue_tickets(job.agent, job.ticket_type, count, job.buyer_name, job.buyer_contact,
+                              issuance_job=job)
+                # Rolls the chunk back if the job was taken over in the meantime
+                if not owned.update(issued=F('issued') + count, heartbeat_at=timezone.now(),
+                                    updated_at=timezone.now()):
+                    raise LeaseLost
+
+            job.issued += count
+
+        owned.update(status='completed', updated_at=timezone.now())
+
+    except LeaseLost:
+        logger.warning(f"Ticket issuance job {job.pk} was taken over by another worker, stopping.")
+
+    except Exception as e:
+        logger.error(f"Ticket issuance job {job.pk} failed: {str(e)}")
+        logger.error(traceback.format_exc())
+        fail_issuance_job(job.pk, str(e), worker_id=worker_id)
+
+
+def fail_issuance_job(job_id, error, worker_id=None):
+    """
+    Mark a job as failed and refund the tickets it did not issue.
+
+    - `worker_id` (str, optional): Only fail the job if this worker still holds it.
+    """
+    with transaction.atomic():
+        job = TicketIssuanceJob.objects.select_for_update().select_related('agent__wallet').get(pk=job_id)
+        if job.status in ('completed', 'failed'):
+            return
+        if worker_id is not None and job.worker_id != worker_id:
+            return
+
+        job.status = 'failed'
+        job.error = error
+        job.save(update_fields=['status', 'error', 'updated_at'])
+
+        unissued = job.quantity - job.issued
+        if unissued > 0:
+            job.agent.wallet.credit_voucher_balance(unissued * job.unit_price)
+            if job.ticket_type_id:
+                release_inventory(job.ticket_type_id, unissued)
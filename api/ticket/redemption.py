@@ -0,0 +1,28 @@
+from django.utils import timezone
+
+from api.models import Ticket
+
+from .ticket_cache import ticket_cache
+
+
+def redeem_ticket(ticket, user, location=''):
+    """
+    Mark `ticket` as redeemed by `user` at `location`.
+
+    A single conditional UPDATE that only matches valid, unredeemed tickets, so when
+    several gates scan the same code at once exactly one of them succeeds, without
+    locking the row beforehand. The caller checks the ticket type first.
+
+    Returns:
+    - The redemption time if this call redeemed the ticket, otherwise None.
+    """
+    now = timezone.now()
+    redeemed = Ticket.objects.filter(pk=ticket.pk, valid=True, redeemed_at__isnull=True).update(
+        redeemed_at=now, redeemed_by=user, redeemed_location=location, updated_at=now
+    )
+
+    if not redeemed:
+        return None
+
+    ticket_cache.invalidate(ticket.ticket_code)
+    return now
@@ -1,8 +1,10 @@
 from rest_framework import serializers
-from api.models import TicketType, Ticket
+from api.models import TicketType, Ticket, TicketIssuanceJob, Draw, DrawWinner, ticket_valid_until, ticket_is_valid
+from api.encoders import RowEncoder
 from django.utils import timezone
 from api.utilities import generate_ticket_code
 from api.account.serializers import UserSerializer
+from api.ticket.catalog import ticket_type_catalog
 
 
 class CreateTicketTypeSerializer(serializers.ModelSerializer):
@@ -19,6 +21,12 @@ class CreateTicketTypeSerializer(serializers.ModelSerializer):
 
         return attrs
 
+def render_ticket_type(rendered_types, ticket_type_id, ticket_type):
+    if ticket_type_id not in rendered_types:
+        rendered_types[ticket_type_id] = CreateTicketTypeSerializer(ticket_type).data
+    return rendered_types[ticket_type_id]
+
+
 class TicketSerializer(serializers.ModelSerializer):
     agent = UserSerializer(read_only=True)
     ticket_code = serializers.CharField(read_only=True)
@@ -26,13 +34,24 @@ class TicketSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Ticket
-        fields = ['id', 'ticket_code', 'buyer_name', 'buyer_contact', 'agent', 'ticket_type', 'created_at', 'updated_at', 'valid_until', 'valid']
+        fields = ['id', 'ticket_code', 'buyer_name', 'buyer_contact', 'agent', 'ticket_type', 'created_at', 'updated_at', 'valid_until', 'valid',
+                  'redeemed_at', 'redeemed_location']
 
 
     def to_representation(self, instance):
         representation = super().to_representation(instance)
-        # Add nested ticket type details
-        representation['ticket_type'] = CreateTicketTypeSerializer(instance.ticket_type).data
+        # Add nested ticket type details, served from the per-process catalog and rendered
+        # once per distinct type for the whole response (rows share the rendered dict)
+        ticket_type = ticket_type_catalog.for_ticket(instance)
+        representation['ticket_type'] = render_ticket_type(
+            self.context.setdefault('rendered_ticket_types', {}), instance.ticket_type_id, ticket_type
+        )
+
+        # Validity follows the ticket type's current expiration and deleted state
+        representation['valid_until'] = self.fields['valid_until'].to_representation(
+            instance.effective_valid_until(ticket_type)
+        )
+        representation['valid'] = instance.is_valid(ticket_type)
         return representation
 
     def create(self, validated_data):
@@ -43,7 +62,7 @@ class TicketSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("Agent information is required to create the ticket.")
 
         # Set the agent and valid_until fields
-        ticket_code = generate_ticket_code()
+        ticket_code = generate_ticket_code(validated_data['ticket_type'])
         validated_data['ticket_code'] = ticket_code
         validated_data['agent'] = agent
         validated_data['valid_until'] = validated_data['ticket_type'].expiration_date
@@ -53,8 +72,107 @@ class TicketSerializer(serializers.ModelSerializer):
 
         return ticket
 
+class TicketRowEncoder(RowEncoder):
+    """
+    `values()` fast path of `TicketSerializer` for listings, including its ticket type
+    and validity handling.
+    """
+
+    # Columns the computed fields are derived from
+    VALIDITY_LOOKUPS = ['ticket_type', 'valid_until', 'valid', 'redeemed_at']
+
+    def __init__(self):
+        super().__init__(TicketSerializer)
+
+    @property
+    def expandable(self):
+        return super().expandable | {'ticket_type'}
+
+    @property
+    def _names(self):
+        return {name for name, _, _, _ in self.fields}
+
+    @property
+    def value_fields(self):
+        lookups = super().value_fields
+        if self._names & {'valid_until', 'valid'}:
+            lookups += [lookup for lookup in self.VALIDITY_LOOKUPS if lookup not in lookups]
+        return lookups
+
+    def encode_many(self, rows):
+        names = self._names
+        expand_type = 'ticket_type' in names and self.is_expanded('ticket_type')
+        valid_until_representation = next(
+            (to_representation for name, _, to_representation, _ in self.fields if name == 'valid_until'), None
+        )
+        needs_type = expand_type or bool(names & {'valid_until', 'valid'})
+        rendered_types = {}
+        now = timezone.now()
+
+        encoded = []
+        for row in rows:
+            data = self.encode(row)
+            ticket_type = ticket_type_catalog.for_type_id(row['ticket_type']) if needs_type else None
+            if expand_type:
+                data['ticket_type'] = render_ticket_type(rendered_types, row['ticket_type'], ticket_type)
+            if valid_until_representation is not None:
+                data['valid_until'] = valid_until_representation(ticket_valid_until(row['valid_until'], ticket_type))
+            if 'valid' in names:
+                data['valid'] = ticket_is_valid(row['valid'], row['redeemed_at'], ticket_type, now)
+            encoded.append(data)
+        return encoded
+
+
+ticket_row_encoder = TicketRowEncoder()
+
+
 class CreateTicketSerializer(serializers.Serializer):
-    buyer_name = serializers.CharField(max_length=255)
-    buyer_contact = serializers.CharField(max_length=20)
+    # Lengths follow the Ticket model, since the bulk path skips TicketSerializer validation
+    buyer_name = serializers.CharField(max_length=50)
+    buyer_contact = serializers.CharField(max_length=50)
     ticket_type = serializers.UUIDField()
-    quantity = serializers.IntegerField(min_value=1)
+    quantity = serializers.IntegerField(min_value=1, default=1)
+    background = serializers.BooleanField(default=False)
+
+
+class CheckTicketsSerializer(serializers.Serializer):
+    ticket_codes = serializers.ListField(
+        child=serializers.CharField(max_length=Ticket._meta.get_field('ticket_code').max_length),
+        allow_empty=False,
+        max_length=500,
+    )
+
+
+class RedeemTicketSerializer(serializers.Serializer):
+    location = serializers.CharField(max_length=100, required=False, allow_blank=True, default='')
+
+
+class TicketIssuanceJobSerializer(serializers.ModelSerializer):
+    progress = serializers.SerializerMethodField()
+
+    class Meta:
+        model = TicketIssuanceJob
+        fields = ['id', 'status', 'ticket_type', 'quantity', 'issued', 'progress', 'error', 'created_at', 'updated_at']
+
+    def get_progress(self, obj):
+        return round(obj.issued * 100 / obj.quantity, 2) if obj.quantity else 100
+
+
+class CreateDrawSerializer(serializers.Serializer):
+    winner_count = serializers.IntegerField(min_value=1, max_value=10000)
+    seed = serializers.CharField(max_length=64, required=False)
+
+
+class DrawWinnerSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = DrawWinner
+        fields = ['rank', 'ticket_id', 'ticket_code']
+
+
+class DrawSerializer(serializers.ModelSerializer):
+    winners = DrawWinnerSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = Draw
+        fields = ['id', 'ticket_type', 'winner_count', 'seed', 'tickets_until', 'candidate_count', 'created_by',
+                  'created_at', 'winners']
@@ -0,0 +1,83 @@
+import hashlib
+import struct
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.utils import timezone
+
+from api.models import Ticket
+
+SNAPSHOT_MAGIC = b'TKS1'
+SNAPSHOT_HEADER = struct.Struct('>4sqqI')
+
+# Changes are re-sent from this long before the cursor, so rows written by transactions
+# that committed after the previous sync are not missed
+CURSOR_SKEW = timedelta(minutes=5)
+
+# Beyond this many changed tickets the client is asked to download a new snapshot
+MAX_CHANGES = 50000
+
+
+def code_hash(ticket_code):
+    """
+    64-bit hash identifying a ticket code in snapshots; scanners hash scanned codes the same way.
+    """
+    return int.from_bytes(hashlib.blake2b(ticket_code.upper().encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+def to_cursor(moment):
+    return int(moment.timestamp() * 1000)
+
+
+def from_cursor(cursor):
+    """
+    Raises:
+    - ValueError: If `cursor` is not a cursor returned by a snapshot or a sync.
+    """
+    return datetime.fromtimestamp(int(cursor) / 1000, tz=dt_timezone.utc)
+
+
+def build_snapshot(ticket_type):
+    """
+    Encode the valid tickets of `ticket_type` for offline scanners.
+
+    Layout (big-endian): the magic `TKS1`, the cursor (int64, ms since the epoch) to pass
+    to the next sync, the type's expiration (int64, ms since the epoch), the number of
+    tickets (uint32), then that many sorted uint64 code hashes (see `code_hash`). Scanners
+    look a scanned code up by binary search and compare the expiration themselves.
+
+    Returns:
+    - A tuple of the snapshot bytes and its cursor.
+    """
+    cursor = to_cursor(timezone.now())
+    hashes = sorted(
+        code_hash(ticket_code)
+        for ticket_code in Ticket.objects.filter(ticket_type=ticket_type, valid=True, redeemed_at__isnull=True)
+        .values_list('ticket_code', flat=True).iterator(chunk_size=10000)
+    )
+
+    header = SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, cursor, to_cursor(ticket_type.expiration_date), len(hashes))
+    return header + struct.pack(f'>{len(hashes)}Q', *hashes), cursor
+
+
+def changes_since(ticket_type, since):
+    """
+    Tickets of `ticket_type` sold, invalidated or redeemed since `since` (minus `CURSOR_SKEW`).
+
+    Returns:
+    - A dict with the next `cursor` and the `added` and `removed` code hashes (hex), or
+      None if more than `MAX_CHANGES` tickets changed.
+    """
+    cursor = to_cursor(timezone.now())
+    rows = (
+        Ticket.objects.filter(ticket_type=ticket_type, updated_at__gte=since - CURSOR_SKEW)
+        .values_list('ticket_code', 'valid', 'redeemed_at')[:MAX_CHANGES + 1]
+    )
+
+    added, removed = [], []
+    for ticket_code, valid, redeemed_at in rows:
+        (added if valid and redeemed_at is None else removed).append(format(code_hash(ticket_code), '016x'))
+
+    if len(added) + len(removed) > MAX_CHANGES:
+        return None
+
+    return {"cursor": cursor, "added": added, "removed": removed}
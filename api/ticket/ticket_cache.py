@@ -0,0 +1,99 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .archive import find_ticket
+
+
+def _revision_key(ticket_code):
+    return f"ticket_rev:{ticket_code}"
+
+
+def _new_revision():
+    return uuid.uuid4().hex
+
+
+class TicketCache:
+    """
+    Per-process LRU cache of tickets (with their agent) keyed by ticket code, used by
+    the validity check so a scan costs no ticket query.
+
+    Only ticket-level data is cached; the ticket type and the `valid_until > now`
+    comparison are still resolved on every request (the type through the catalog), so
+    type changes and expiry never need an invalidation here. Entries live for at most
+    `TICKET_CACHE_TTL` seconds and the cache holds at most `TICKET_CACHE_SIZE` tickets.
+
+    Writers call `invalidate(code)`, which bumps a per-code revision in the shared cache,
+    and readers give a code without a revision a new one before loading it. A hit is
+    only served while its revision still matches, so other processes never serve a
+    ticket that changed after it was cached, even if the shared cache evicted the
+    revision meanwhile. Cached instances are shared and must not be modified.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def _cached(self, ticket_code, revision, now):
+        with self._lock:
+            entry = self._entries.get(ticket_code)
+            if entry is not None:
+                ticket, entry_revision, expires_at = entry
+                if entry_revision == revision and expires_at > now:
+                    self._entries.move_to_end(ticket_code)
+                    return ticket
+                del self._entries[ticket_code]
+        return None
+
+    def _store(self, ticket_code, ticket, revision, now):
+        with self._lock:
+            self._entries[ticket_code] = (ticket, revision, now + settings.TICKET_CACHE_TTL)
+            self._entries.move_to_end(ticket_code)
+            while len(self._entries) > settings.TICKET_CACHE_SIZE:
+                self._entries.popitem(last=False)
+
+    def get(self, ticket_code):
+        """
+        Return the ticket with `ticket_code`, loading it on a miss.
+
+        Raises:
+        - Ticket.DoesNotExist: If the code is unknown (misses are not cached).
+        """
+        if settings.TICKET_CACHE_SIZE <= 0:
+            return find_ticket(ticket_code)
+
+        # Read the revision before loading, so a change committed meanwhile makes the entry
+        # stale. A missing one (never set, or evicted) is replaced rather than matched.
+        revision = cache.get_or_set(_revision_key(ticket_code), _new_revision, timeout=settings.TICKET_CACHE_TTL * 2)
+        now = time.monotonic()
+
+        ticket = self._cached(ticket_code, revision, now)
+        if ticket is None:
+            ticket = find_ticket(ticket_code)
+            self._store(ticket_code, ticket, revision, now)
+        return ticket
+
+    def invalidate(self, ticket_code):
+        """
+        Drop `ticket_code` here and, once the current transaction commits, in every process.
+        """
+        with self._lock:
+            self._entries.pop(ticket_code, None)
+
+        # The revision must outlive any entry cached before it, so entries from before the
+        # change can never match again
+        transaction.on_commit(lambda: cache.set(
+            _revision_key(ticket_code), _new_revision(), timeout=settings.TICKET_CACHE_TTL * 2
+        ))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+ticket_cache = TicketCache()
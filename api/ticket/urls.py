@@ -1,12 +1,22 @@
 from django.urls import path
-from .views import create_ticket_type,list_ticket_types,update_ticket_type, delete_ticket_type, create_tickets,check_ticket_validity,get_agent_tickets
+from .views import create_ticket_type,list_ticket_types,update_ticket_type, delete_ticket_type, create_tickets,check_ticket_validity, check_tickets_validity, get_agent_tickets, get_issuance_job, get_ticket_type_stock, \
+    get_ticket_type_snapshot, get_ticket_type_changes, redeem_ticket_view, \
+    create_draw, get_draw
 
 urlpatterns = [
     path("ticket-type/", create_ticket_type, name="create_ticket_type"),
     path("ticket-types/list/", list_ticket_types, name="list_ticket_types"),
     path("ticket_type/<str:id>/", update_ticket_type, name="update_ticket_type"),
     path("ticket-type/<str:id>/delete/", delete_ticket_type, name="delete_ticket_type"),
+    path("ticket-type/<str:id>/stock/", get_ticket_type_stock, name="get_ticket_type_stock"),
+    path("ticket-type/<str:id>/snapshot/", get_ticket_type_snapshot, name="get_ticket_type_snapshot"),
+    path("ticket-type/<str:id>/changes/", get_ticket_type_changes, name="get_ticket_type_changes"),
+    path("ticket-type/<str:id>/draw/", create_draw, name="create_draw"),
+    path("draws/<uuid:draw_id>/", get_draw, name="get_draw"),
     path("create-ticket/", create_tickets, name="create_tickets"),
     path("check-ticket/<str:ticket_code>/", check_ticket_validity, name="check_ticket_validity"),
+    path("check-tickets/", check_tickets_validity, name="check_tickets_validity"),
+    path("redeem-ticket/<str:ticket_code>/", redeem_ticket_view, name="redeem_ticket"),
     path("get-agent-tickets/", get_agent_tickets, name="get_agent_tickets"),
+    path("issuance-jobs/<uuid:job_id>/", get_issuance_job, name="get_issuance_job"),
 ]
\ No newline at end of file
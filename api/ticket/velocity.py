@@ -0,0 +1,163 @@
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+# Window name -> (length in seconds, setting holding its limit)
+WINDOWS = {
+    'minute': (60, 'TICKET_VELOCITY_PER_MINUTE'),
+    'hour': (3600, 'TICKET_VELOCITY_PER_HOUR'),
+}
+
+# Local counters are pruned of idle agents once there are more than this many
+LOCAL_PRUNE_THRESHOLD = 10000
+
+
+def _estimate(previous, current, window_start, length, now):
+    # Sliding window approximation: the part of the previous fixed window still covered,
+    # plus everything in the current one
+    return previous * (1 - (now - window_start) / length) + current
+
+
+class LocalCounters:
+    """
+    Fixed-window counts kept in this process: per agent and window, the index of the
+    current window and the counts of the current and previous ones.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = {}
+
+    def _buckets(self, agent_id, name, index):
+        bucket_index, previous, current = self._counts.get((agent_id, name), (index, 0, 0))
+        if bucket_index == index:
+            return previous, current
+        if bucket_index == index - 1:
+            # The stored current window has become the previous one
+            return current, 0
+        return 0, 0
+
+    def read(self, agent_id, name, index):
+        with self._lock:
+            return self._buckets(agent_id, name, index)
+
+    def add(self, agent_id, name, index, quantity):
+        with self._lock:
+            previous, current = self._buckets(agent_id, name, index)
+            self._counts[(agent_id, name)] = (index, previous, current + quantity)
+
+            if len(self._counts) > LOCAL_PRUNE_THRESHOLD:
+                self._prune()
+
+    def _prune(self):
+        now = time.time()
+        for key, (index, _, _) in list(self._counts.items()):
+            length = WINDOWS[key[1]][0]
+            if index < now // length - 1:
+                del self._counts[key]
+
+
+class CacheCounters:
+    """
+    Fixed-window counts kept in the shared cache, so the limits hold across processes.
+    """
+
+    @staticmethod
+    def _key(agent_id, name, index):
+        return f"ticket_velocity:{agent_id}:{name}:{index}"
+
+    def read(self, agent_id, name, index):
+        counts = cache.get_many([self._key(agent_id, name, index - 1), self._key(agent_id, name, index)])
+        return counts.get(self._key(agent_id, name, index - 1), 0), counts.get(self._key(agent_id, name, index), 0)
+
+    def add(self, agent_id, name, index, quantity):
+        key = self._key(agent_id, name, index)
+        # Kept for two windows: long enough to serve as the previous window
+        if not cache.add(key, quantity, timeout=WINDOWS[name][0] * 2):
+            try:
+                cache.incr(key, quantity)
+            except ValueError:
+                # Expired between add() and incr()
+                cache.set(key, quantity, timeout=WINDOWS[name][0] * 2)
+
+
+class VelocityLimiter:
+    """
+    Per-agent sales velocity over sliding windows of a minute and an hour, approximated
+    from two fixed-window counters per window so each sale costs O(1) regardless of volume.
+
+    Counters live in the shared cache (`TICKET_VELOCITY_BACKEND = 'cache'`) so the limits
+    apply across processes, or in this process (`'local'`), where each worker keeps its
+    own counts. A limit of 0 disables it.
+    """
+
+    def __init__(self):
+        self._local = LocalCounters()
+        self._shared = CacheCounters()
+
+    def _counters(self):
+        return self._shared if settings.TICKET_VELOCITY_BACKEND == 'cache' else self._local
+
+    def velocity(self, agent_id):
+        """
+        Return the tickets sold by `agent_id` in the last minute and hour, with their limits.
+        """
+        counters = self._counters()
+        now = time.time()
+        result = {}
+        for name, (length, limit_setting) in WINDOWS.items():
+            index = int(now // length)
+            previous, current = counters.read(agent_id, name, index)
+            result[name] = {
+                "tickets": math.ceil(_estimate(previous, current, index * length, length, now)),
+                "limit": getattr(settings, limit_setting) or None,
+            }
+        return result
+
+    def check(self, agent_id, quantity):
+        """
+        Check whether `agent_id` may sell `quantity` more tickets within every limit. The
+        sale is only counted by `record()`, once it went through.
+
+        Returns:
+        - None if the sale is allowed, otherwise the exceeded window as a dict with its
+          `window`, `limit`, current `tickets` and `retry_after` (seconds; None when
+          `quantity` alone is over the limit, so waiting would not help).
+        """
+        counters = self._counters()
+        now = time.time()
+
+        for name, (length, limit_setting) in WINDOWS.items():
+            limit = getattr(settings, limit_setting)
+            if not limit:
+                continue
+
+            index = int(now // length)
+            previous, current = counters.read(agent_id, name, index)
+            tickets = _estimate(previous, current, index * length, length, now)
+            if tickets + quantity > limit:
+                return {
+                    "window": name,
+                    "limit": limit,
+                    "tickets": math.ceil(tickets),
+                    "retry_after": math.ceil((index + 1) * length - now) if quantity <= limit else None,
+                }
+
+        return None
+
+    def record(self, agent_id, quantity):
+        """
+        Count a sale of `quantity` tickets by `agent_id`.
+        """
+        counters = self._counters()
+        now = time.time()
+
+        for name, (length, limit_setting) in WINDOWS.items():
+            if getattr(settings, limit_setting):
+                counters.add(agent_id, name, int(now // length), quantity)
+
+
+velocity_limiter = VelocityLimiter()
@@ -1,22 +1,40 @@
 from datetime import datetime, timedelta
 
+from django.conf import settings
+from django.http import HttpResponse
 from django.utils import timezone
 
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAdminUser
 from rest_framework.response import Response
 from rest_framework import status
-from .serializer import CreateTicketTypeSerializer, TicketSerializer, CreateTicketSerializer
+from .serializer import CreateTicketTypeSerializer, TicketSerializer, CreateTicketSerializer, TicketIssuanceJobSerializer, \
+    CheckTicketsSerializer, RedeemTicketSerializer, CreateDrawSerializer, DrawSerializer, ticket_row_encoder
+from .issuance import issue_tickets
+from .jobs import enqueue_issuance_job
+from .catalog import ticket_type_catalog
+from .inventory import configure_inventory, reserve_inventory, inventory_status
+from .ticket_cache import ticket_cache
+from .archive import find_tickets
+from .code_filter import ticket_code_filter
+from .snapshot import build_snapshot, changes_since, from_cursor
+from .redemption import redeem_ticket
+from .velocity import velocity_limiter
+from .draws import run_draw, find_winnings
+from .pagination import CURSOR_FIELDS, page_params, keyset_page, split_page
+from ..signed_codes import is_signed_code, verify_ticket_code
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
 from decimal import Decimal
-from api.models import TicketType, Ticket, Agent
+from api.models import TicketType, Ticket, Agent, TicketIssuanceJob, Draw
 from django.db import transaction
 import traceback
 
 import logging
 
-from ..account.permissions import IsAgent
+from ..account.permissions import CanScanTickets, IsAgent
+from ..idempotency import idempotent, idempotency_key_param
+from ..encoders import fields_param, expand_param
 
 # Create a logger instance
 logger = logging.getLogger(__name__)
@@ -39,6 +57,7 @@ def create_ticket_type(request):
     - `unit_price` (Decimal): The price of the ticket type.
     - `description` (str): Description of the ticket type.
     - `expiration_datetime` (DateTime): Expiration date and time for the ticket.
+    - `inventory_limit` (int, optional): Maximum number of tickets that can be sold.
 
     Returns:
     - On success: Details of the newly created ticket type.
@@ -48,10 +67,14 @@ def create_ticket_type(request):
 
     if serializer.is_valid():
         try:
-            serializer.save()
+            with transaction.atomic():
+                ticket_type = serializer.save()
+                configure_inventory(ticket_type)
         except Exception as e:
             return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+        ticket_type_catalog.invalidate()
+
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -72,9 +95,9 @@ def list_ticket_types(request):
     - On success: List of ticket types.
     """
     name = request.query_params.get('name', None)
-    queryset = TicketType.objects.all()
+    queryset = ticket_type_catalog.all()
     if name:
-        queryset = queryset.filter(name__icontains=name)
+        queryset = [ticket_type for ticket_type in queryset if name.lower() in ticket_type.name.lower()]
 
     serializer = CreateTicketTypeSerializer(queryset, many=True)
     return Response(serializer.data, status=status.HTTP_200_OK)
@@ -99,22 +122,17 @@ def update_ticket_type(request, id):
     """
 
     try:
-        ticket_type = TicketType.objects.get(pk=id)
+        ticket_type = TicketType.objects.get(pk=id, deleted_at__isnull=True)
     except TicketType.DoesNotExist:
         return Response({"error": "Ticket type not found."}, status=status.HTTP_404_NOT_FOUND)
 
     serializer = CreateTicketTypeSerializer(ticket_type, data=request.data, partial=True)
     if serializer.is_valid():
         ticket_type = serializer.save()
-
-        # Update the `valid_until` field of all tickets with this TicketType
-        Ticket.objects.filter(ticket_type=ticket_type).update(valid_until=ticket_type.expiration_date)
-
-        #If there is an increase in expiration date, should reflect for all tickets
-        if ticket_type.expiration_date > timezone.now():
-            Ticket.objects.filter(ticket_type=ticket_type).update(valid=True)
-        else:
-            Ticket.objects.filter(ticket_type=ticket_type).update(valid=False)
+        if 'inventory_limit' in serializer.validated_data:
+            configure_inventory(ticket_type)
+        # Tickets read their expiration from the type, so none of them need rewriting
+        ticket_type_catalog.invalidate()
 
         return Response({"message": "Successfully updated ticket type.",
             "updated_fields": serializer.validated_data,
@@ -123,6 +141,231 @@ def update_ticket_type(request, id):
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+@swagger_auto_schema(
+    method='GET',
+    operation_summary="Get Ticket Type Stock",
+    operation_description="Report the inventory limit, sold and remaining tickets of a ticket type.",
+    responses={
+        200: openapi.Response(
+            description="Stock of the ticket type. All values are null for unlimited ticket types.",
+            schema=openapi.Schema(
+                type=openapi.TYPE_OBJECT,
+                properties={
+                    'ticket_type': openapi.Schema(type=openapi.TYPE_STRING),
+                    'inventory_limit': openapi.Schema(type=openapi.TYPE_INTEGER),
+                    'sold': openapi.Schema(type=openapi.TYPE_INTEGER),
+                    'remaining': openapi.Schema(type=openapi.TYPE_INTEGER),
+                },
+            ),
+        ),
+        404: "Ticket type not found."
+    }
+)
+@api_view(["GET"])
+def get_ticket_type_stock(request, id):
+    """
+    Report the remaining stock of a Ticket Type.
+
+    - `id`: ID of the ticket type.
+
+    Returns:
+    - On success: `inventory_limit`, `sold` and `remaining` (null when the type is unlimited).
+    - On failure: Ticket type not found.
+    """
+    try:
+        ticket_type = ticket_type_catalog.get(id)
+    except TicketType.DoesNotExist:
+        return Response({"error": "Ticket type not found."}, status=status.HTTP_404_NOT_FOUND)
+
+    return Response({"ticket_type": ticket_type.id, **inventory_status(ticket_type)}, status=status.HTTP_200_OK)
+
+
+@swagger_auto_schema(
+    method='GET',
+    operation_summary="Download Ticket Type Snapshot",
+    operation_description="Binary snapshot of the valid tickets of a ticket type for offline scanners: the magic "
+                          "`TKS1`, the sync cursor (int64 ms), the type's expiration (int64 ms), the ticket count "
+                          "(uint32) and the sorted 64-bit BLAKE2b hashes of the upper-cased codes, all big-endian.",
+    responses={
+        200: "Snapshot (application/octet-stream). The cursor is also sent in the `Snapshot-Cursor` header.",
+        404: "Ticket type not found.",
+        410: "Ticket type deleted.",
+    }
+)
+@api_view(["GET"])
+@permission_classes([CanScanTickets | IsAdminUser])
+def get_ticket_type_snapshot(request, id):
+    """
+    Export the valid ticket codes of a Ticket Type for offline validation. Open to admins
+    and to scanner accounts holding the `api.scan_tickets` permission.
+
+    - `id`: ID of the ticket type.
+
+    Returns:
+    - On success: The binary snapshot; its cursor is the starting point for `get_ticket_type_changes`.
+    - On failure: Ticket type not found or deleted.
+    """
+    try:
+        ticket_type = ticket_type_catalog.get(id, include_deleted=True)
+    except TicketType.DoesNotExist:
+        return Response({"error": "Ticket type not found."}, status=status.HTTP_404_NOT_FOUND)
+
+    if ticket_type.deleted_at is not None:
+        return Response({"error": "Ticket type deleted"}, status=status.HTTP_410_GONE)
+
+    snapshot, cursor = build_snapshot(ticket_type)
+    response = HttpResponse(snapshot, content_type='application/octet-stream')
+    response['Snapshot-Cursor'] = str(cursor)
+    return response
+
+
+@swagger_auto_schema(
+    method='GET',
+    operation_summary="Sync Ticket Type Changes",
+    operation_description="Tickets sold (`added`) or invalidated (`removed`) since a snapshot or previous sync, as "
+                          "hex code hashes, with the type's current expiration and deleted state. Changes close to "
+                          "the cursor may be sent again; applying them twice is harmless.",
+    manual_parameters=[
+        openapi.Parameter(
+            'cursor',
+            openapi.IN_QUERY,
+            description="Cursor of the snapshot or of the previous sync.",
+            type=openapi.TYPE_INTEGER,
+            required=True,
+        ),
+    ],
+    responses={
+        200: openapi.Response(
+            description="Changes since the cursor.",
+            schema=openapi.Schema(
+                type=openapi.TYPE_OBJECT,
+                properties={
+                    'cursor': openapi.Schema(type=openapi.TYPE_INTEGER),
+                    'ticket_type': openapi.Schema(type=openapi.TYPE_OBJECT),
+                    'added': openapi.Schema(type=openapi.TYPE_ARRAY, items=openapi.Schema(type=openapi.TYPE_STRING)),
+                    'removed': openapi.Schema(type=openapi.TYPE_ARRAY, items=openapi.Schema(type=openapi.TYPE_STRING)),
+                },
+            ),
+        ),
+        400: "Missing or invalid cursor.",
+        404: "Ticket type not found.",
+        410: "Too many changes; download a new snapshot.",
+    }
+)
+@api_view(["GET"])
+@permission_classes([CanScanTickets | IsAdminUser])
+def get_ticket_type_changes(request, id):
+    """
+    Return the changes to a Ticket Type's valid tickets since `cursor`. Same access as
+    `get_ticket_type_snapshot`.
+
+    - `id`: ID of the ticket type.
+    - `cursor` (int): Cursor of the snapshot or of the previous sync.
+
+    Returns:
+    - On success: The next `cursor`, the type's `expiration_date` and `deleted` state, and
+      the `added` and `removed` code hashes.
+    - On failure: Invalid cursor, ticket type not found, or too many changes for a sync.
+    """
+    try:
+        since = from_cursor(request.query_params.get('cursor'))
+    except (TypeError, ValueError, OverflowError, OSError):
+        return Response({"error": "A valid cursor is required."}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        ticket_type = ticket_type_catalog.get(id, include_deleted=True)
+    except TicketType.DoesNotExist:
+        return Response({"error": "Ticket type not found."}, status=status.HTTP_404_NOT_FOUND)
+
+    changes = changes_since(ticket_type, since)
+    if changes is None:
+        return Response({"error": "Too many changes since this cursor, download a new snapshot."},
+                        status=status.HTTP_410_GONE)
+
+    return Response({
+        "cursor": changes["cursor"],
+        "ticket_type": {
+            "id": ticket_type.id,
+            "expiration_date": ticket_type.expiration_date,
+            "deleted": ticket_type.deleted_at is not None,
+        },
+        "added": changes["added"],
+        "removed": changes["removed"],
+    }, status=status.HTTP_200_OK)
+
+
+@swagger_auto_schema(
+    method='POST',
+    operation_summary="Run Lottery Draw",
+    operation_description="Pick `winner_count` uniformly random winners among the valid tickets of a ticket type "
+                          "sold until a minute ago. The seed and that cutoff (`tickets_until`) are recorded so the "
+                          "draw can be reproduced.",
+    request_body=CreateDrawSerializer,
+    responses={
+        201: DrawSerializer,
+        400: "Invalid input data.",
+        404: "Ticket type not found.",
+    }
+)
+@api_view(["POST"])
+@permission_classes([IsAdminUser])
+def create_draw(request, id):
+    """
+    Run a lottery draw for a Ticket Type.
+
+    - `id`: ID of the ticket type.
+    - `winner_count` (int): Number of winning tickets.
+    - `seed` (str, optional): Seed to draw with; a random one is generated and recorded otherwise.
+
+    Returns:
+    - On success: The draw with its seed, number of candidates and winners in rank order.
+    - On failure: Validation error or ticket type not found.
+    """
+    try:
+        ticket_type = ticket_type_catalog.get(id)
+    except TicketType.DoesNotExist:
+        return Response({"error": "Ticket type not found."}, status=status.HTTP_404_NOT_FOUND)
+
+    serializer = CreateDrawSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    draw = run_draw(ticket_type, serializer.validated_data['winner_count'], request.user,
+                    seed=serializer.validated_data.get('seed'))
+    logger.info(f"Draw {draw.id} for ticket type {ticket_type.id}: "
+                f"{draw.winners.count()} winners among {draw.candidate_count} tickets")
+
+    return Response(DrawSerializer(draw).data, status=status.HTTP_201_CREATED)
+
+
+@swagger_auto_schema(
+    method='GET',
+    operation_summary="Get Lottery Draw",
+    responses={
+        200: DrawSerializer,
+        404: "Draw not found.",
+    }
+)
+@api_view(["GET"])
+@permission_classes([IsAdminUser])
+def get_draw(request, draw_id):
+    """
+    Retrieve a lottery draw and its winners.
+
+    - `draw_id` (uuid): ID of the draw.
+
+    Returns:
+    - On success: The draw with its seed, number of candidates and winners in rank order.
+    - On failure: Draw not found.
+    """
+    try:
+        draw = Draw.objects.prefetch_related('winners').get(pk=draw_id)
+    except Draw.DoesNotExist:
+        return Response({"error": "Draw not found."}, status=status.HTTP_404_NOT_FOUND)
+
+    return Response(DrawSerializer(draw).data, status=status.HTTP_200_OK)
+
+
 @swagger_auto_schema(
     method='DELETE',
     responses={204: "No Content"}
@@ -140,13 +383,15 @@ def delete_ticket_type(request, id):
     - On failure: Ticket type not found.
     """
     try:
-        ticket_type = TicketType.objects.get(pk=id)
-
-        with transaction.atomic():
-            #Invalidate Every Ticket Created Using This Type and set the Ticket Type to Null
-            Ticket.objects.filter(ticket_type=ticket_type).update(valid=False, ticket_type=None)
-            ticket_type.delete()
-            return Response(status=status.HTTP_204_NO_CONTENT)
+        ticket_type = TicketType.objects.get(pk=id, deleted_at__isnull=True)
+
+        # Mark the type deleted instead of rewriting its tickets; they read as invalid from now on.
+        # The name gets a unique suffix so it can be reused by a new ticket type.
+        ticket_type.deleted_at = timezone.now()
+        ticket_type.name = f"{ticket_type.name[:41]}~{ticket_type.id.hex[:8]}"
+        ticket_type.save(update_fields=['deleted_at', 'name', 'updated_at'])
+        ticket_type_catalog.invalidate()
+        return Response(status=status.HTTP_204_NO_CONTENT)
     except TicketType.DoesNotExist:
         return Response({"error": "Ticket type not found."}, status=status.HTTP_404_NOT_FOUND)
 
@@ -154,10 +399,12 @@ def delete_ticket_type(request, id):
 @swagger_auto_schema(
     method='POST',
     request_body=CreateTicketSerializer,
+    manual_parameters=[idempotency_key_param],
     responses={201: "Success"}
 )
 @api_view(["POST"])
 @permission_classes([IsAgent])
+@idempotent
 def create_tickets(request):
     """
     Create new tickets by an agent.
@@ -166,10 +413,14 @@ def create_tickets(request):
     - `quantity` (int): Number of tickets to create (default 1).
     - `buyer_name` (str): Name of the ticket buyer.
     - `buyer_contact` (str): Contact information for the buyer.
+    - `background` (bool, optional): Issue the tickets with a background job. Implied for
+      quantities of at least `TICKET_ISSUANCE_ASYNC_THRESHOLD`.
 
     Returns:
-    - On success: Details of the newly created tickets.
-    - On failure: Validation error or server error.
+    - On success: Details of the newly created tickets, or the id of the issuance job (202)
+      to poll at `issuance-jobs/<job_id>/` when issued in the background.
+    - On failure: Validation error (also for a quantity over the per-minute or per-hour
+      ticket limit), 429 when the agent's recent sales leave no room for it, or server error.
     """
 
     # Fetch the agent from the logged-in user
@@ -181,14 +432,22 @@ def create_tickets(request):
     wallet = agent.user.wallet  # Access the agent's wallet
     # wallet.bonus_balance += Decimal(100000)
     # wallet.save()
-    ticket_type_id = request.data.get('ticket_type')
-    quantity = int(request.data.get('quantity', 1))
-    buyer_name = request.data.get('buyer_name')
-    buyer_contact = request.data.get('buyer_contact')
+
+    # Validate the request once for the whole batch
+    create_serializer = CreateTicketSerializer(data=request.data)
+    if not create_serializer.is_valid():
+        return Response({"errors": create_serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
+
+    ticket_type_id = create_serializer.validated_data['ticket_type']
+    quantity = create_serializer.validated_data['quantity']
+    buyer_name = create_serializer.validated_data['buyer_name']
+    buyer_contact = create_serializer.validated_data['buyer_contact']
+    background = (create_serializer.validated_data['background']
+                  or quantity >= settings.TICKET_ISSUANCE_ASYNC_THRESHOLD)
 
     try:
         # Check if the ticket type exists
-        ticket_type = TicketType.objects.get(pk=ticket_type_id)
+        ticket_type = ticket_type_catalog.get(ticket_type_id)
 
         current_time = timezone.now()
         if current_time >= ticket_type.expiration_date:
@@ -201,27 +460,58 @@ def create_tickets(request):
             return Response({"error": "Insufficient balance in the agent's wallet."},
                             status=status.HTTP_400_BAD_REQUEST)
 
-        tickets_created = []
+        exceeded = velocity_limiter.check(user.pk, quantity)
+        if exceeded and exceeded['retry_after'] is None:
+            return Response({"error": f"At most {exceeded['limit']} tickets can be sold per {exceeded['window']}."},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if exceeded:
+            logger.warning(f"Agent {user.pk} exceeded the per-{exceeded['window']} ticket limit "
+                           f"({exceeded['tickets']} + {quantity} > {exceeded['limit']})")
+            response = Response({"error": f"Too many tickets sold in the last {exceeded['window']}, "
+                                          f"the limit is {exceeded['limit']}."},
+                                status=status.HTTP_429_TOO_MANY_REQUESTS)
+            response['Retry-After'] = str(exceeded['retry_after'])
+            return response
+
+        if background:
+            # Reserve the funds now and let a worker issue the tickets in chunks
+            with transaction.atomic():
+                reserve_inventory(ticket_type, quantity)
+                if not wallet.debit_voucher_balance(total_cost):
+                    raise ValueError("Insufficient balance in the agent's wallet.")
+
+                job = TicketIssuanceJob.objects.create(
+                    agent=user,
+                    ticket_type=ticket_type,
+                    buyer_name=buyer_name,
+                    buyer_contact=buyer_contact,
+                    quantity=quantity,
+                    unit_price=unit_price,
+                )
+                enqueue_issuance_job(job)
+                transaction.on_commit(lambda: velocity_limiter.record(user.pk, quantity))
+
+            return Response(
+                {
+                    "message": f"Issuance of {quantity} tickets has been queued.",
+                    "job_id": job.id,
+                    "status": job.status,
+                    "total_cost": total_cost,
+                    "voucher_balance": wallet.voucher_balance,
+                },
+                status=status.HTTP_202_ACCEPTED
+            )
+
         with transaction.atomic():  # Ensure both ticket creation and wallet deduction are atomic
-            for _ in range(quantity):
-                ticket_data = {
-                    'ticket_type': ticket_type_id,
-                    'buyer_name': buyer_name,
-                    'buyer_contact': buyer_contact,
-                }
-
-                # Pass the agent through the context to the serializer
-                serializer = TicketSerializer(data=ticket_data, context={'agent': user})
-
-                # Validate and save the ticket
-                if serializer.is_valid():
-                    ticket = serializer.save()
-                    tickets_created.append(ticket)
-                else:
-                    return Response({"errors": serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
-
-            wallet.voucher_balance -= total_cost
-            wallet.save()
+            tickets_created = issue_tickets(user, ticket_type, quantity, buyer_name, buyer_contact)
+
+            # Take stock and debit last so the stripe and wallet rows stay locked only until commit
+            reserve_inventory(ticket_type, quantity)
+            if not wallet.debit_voucher_balance(total_cost):
+                raise ValueError("Insufficient balance in the agent's wallet.")
+
+            # Only sales that go through count towards the limits
+            transaction.on_commit(lambda: velocity_limiter.record(user.pk, quantity))
 
     except TicketType.DoesNotExist:
         return Response({"error": "Invalid Ticket Type ID provided."}, status=status.HTTP_400_BAD_REQUEST)
@@ -257,6 +547,77 @@ def create_tickets(request):
         status=status.HTTP_201_CREATED
     )
 
+
+def _signed_code_result(ticket_code, ticket_types):
+    """
+    Check a signed ticket code against `ticket_types` (including deleted ones) without the
+    database. Returns the response body and status for forged, deleted-type or expired
+    codes, or None if the ticket must be looked up.
+    """
+    if not is_signed_code(ticket_code):
+        return None
+
+    ticket_type = verify_ticket_code(ticket_code, ticket_types)
+    if ticket_type is None:
+        return {"error": "Ticket not found."}, status.HTTP_404_NOT_FOUND
+    if ticket_type.deleted_at is not None:
+        return {"error": "Ticket type deleted"}, status.HTTP_410_GONE
+    if ticket_type.expiration_date <= timezone.now():
+        return {"valid": False, "message": "Ticket is invalid or expired."}, status.HTTP_200_OK
+    return None
+
+
+def _draws_won(tickets):
+    """
+    Return the lottery draws won by `tickets`, keyed by ticket code. Only tickets of types
+    that had a draw are looked up, so checks of other types cost no query.
+    """
+    ticket_codes = []
+    for ticket in tickets:
+        ticket_type = ticket_type_catalog.for_ticket(ticket)
+        if ticket_type is not None and ticket_type.last_draw_at is not None:
+            ticket_codes.append(ticket.ticket_code)
+
+    return find_winnings(ticket_codes) if ticket_codes else {}
+
+
+def _ticket_check_result(ticket, ticket_type, draws_won=()):
+    """
+    Build the validity check response body and status for `ticket` of `ticket_type`
+    (None if the type was deleted), listing the lottery `draws_won` by the ticket.
+    """
+    if ticket_type is None:
+        return {"error": "Ticket type deleted"}, status.HTTP_410_GONE
+
+    ticket_info = {
+        "ticket_code": ticket.ticket_code,
+        "buyer_name": ticket.buyer_name,
+        "buyer_contact": ticket.buyer_contact,
+        "ticket_type": {
+            "id": ticket_type.id,
+            "name": ticket_type.name,
+            "description": ticket_type.description,
+        },
+        "agent": {
+            "name": f"{ticket.agent.first_name} {ticket.agent.last_name}",
+            "login_id": ticket.agent.login_id,
+        },
+        "valid_until": ticket.effective_valid_until(ticket_type),
+        "created_at": ticket.created_at,
+        "updated_at": ticket.updated_at,
+        "redeemed_at": ticket.redeemed_at,
+        "redeemed_location": ticket.redeemed_location,
+        "draws_won": list(draws_won),
+    }
+
+    if ticket.is_valid(ticket_type):
+        return {"valid": True, "ticket_info": ticket_info}, status.HTTP_200_OK
+    if ticket.redeemed_at is not None:
+        return {"valid": False, "ticket_info": ticket_info, "message": "Ticket was already redeemed."}, \
+            status.HTTP_200_OK
+    return {"valid": False, "ticket_info": ticket_info, "message": "Ticket is invalid or expired."}, status.HTTP_200_OK
+
+
 @swagger_auto_schema(
     method='GET',
     operation_summary="Check Ticket Validity",
@@ -330,45 +691,212 @@ def create_tickets(request):
 @api_view(["GET"])
 def check_ticket_validity(request, ticket_code):
     """
-    Check if a ticket is valid given its ticket_code.
+    Check if a ticket is valid given its ticket_code. Archived tickets are found as well;
+    forged or expired signed codes are answered without a database lookup.
 
     Returns:
     - On success: Ticket details if valid.
     - On failure: if not valid or ticket does not exist.
     """
 
+    signed_result = _signed_code_result(ticket_code, ticket_type_catalog.all(include_deleted=True))
+    if signed_result is not None:
+        data, status_code = signed_result
+        return Response(data, status=status_code)
+
+    if not ticket_code_filter.might_contain(ticket_code):
+        return Response({"error": "Ticket not found."}, status=status.HTTP_404_NOT_FOUND)
+
     try:
-        ticket = Ticket.objects.get(ticket_code=ticket_code)
-        if ticket.ticket_type is None:
-            return Response({"error": "Ticket type deleted"}, status=status.HTTP_410_GONE)
-        ticket_info = {
-            "ticket_code": ticket.ticket_code,
-            "buyer_name": ticket.buyer_name,
-            "buyer_contact": ticket.buyer_contact,
-            "ticket_type": {
-                "id": ticket.ticket_type.id,
-                "name": ticket.ticket_type.name,
-                "description": ticket.ticket_type.description,
-            },
-            "agent": {
-                "name": f"{ticket.agent.first_name} {ticket.agent.last_name}",
-                "login_id": ticket.agent.login_id,
-            },
-            "valid_until": ticket.valid_until,
-            "created_at": ticket.created_at,
-            "updated_at": ticket.updated_at,
-        }
-
-        if ticket.valid and ticket.valid_until > timezone.now():
-            return Response({"valid": True, "ticket_info": ticket_info}, status=status.HTTP_200_OK)
+        ticket = ticket_cache.get(ticket_code)
+        ticket_type = ticket_type_catalog.for_ticket(ticket)
+        draws_won = _draws_won([ticket]).get(ticket.ticket_code, [])
+        data, status_code = _ticket_check_result(ticket, ticket_type, draws_won)
+        return Response(data, status=status_code)
+
+    except Ticket.DoesNotExist:
+        return Response({"error": "Ticket not found."}, status=status.HTTP_404_NOT_FOUND)
+
+
+@swagger_auto_schema(
+    method='POST',
+    operation_summary="Check Tickets in Batch",
+    operation_description="Check the validity of up to 500 tickets in one request. Each result has the same "
+                          "shape as the single ticket check, plus the `ticket_code` and the `status` the single "
+                          "check would have returned.",
+    request_body=CheckTicketsSerializer,
+    responses={
+        200: openapi.Response(
+            description="One result per requested code, in request order.",
+            schema=openapi.Schema(
+                type=openapi.TYPE_OBJECT,
+                properties={
+                    'results': openapi.Schema(
+                        type=openapi.TYPE_ARRAY,
+                        items=openapi.Schema(
+                            type=openapi.TYPE_OBJECT,
+                            properties={
+                                'ticket_code': openapi.Schema(type=openapi.TYPE_STRING),
+                                'status': openapi.Schema(type=openapi.TYPE_INTEGER),
+                                'valid': openapi.Schema(type=openapi.TYPE_BOOLEAN),
+                                'ticket_info': openapi.Schema(type=openapi.TYPE_OBJECT),
+                                'message': openapi.Schema(type=openapi.TYPE_STRING),
+                                'error': openapi.Schema(type=openapi.TYPE_STRING),
+                            },
+                        ),
+                    ),
+                },
+            ),
+        ),
+        400: "Invalid input data.",
+    },
+)
+@api_view(["POST"])
+def check_tickets_validity(request):
+    """
+    Check the validity of many tickets at once.
+
+    - `ticket_codes` (list of str): Codes to check (at most 500).
+
+    Returns:
+    - On success: A result per code, in request order (duplicates repeated).
+    - On failure: Validation errors.
+    """
+    serializer = CheckTicketsSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    ticket_codes = serializer.validated_data['ticket_codes']
+    ticket_types = ticket_type_catalog.all(include_deleted=True)
+    signed_results = {code: _signed_code_result(code, ticket_types) for code in set(ticket_codes)}
+    tickets = find_tickets([
+        code for code, signed_result in signed_results.items()
+        if signed_result is None and ticket_code_filter.might_contain(code)
+    ])
+
+    draws_won = _draws_won(tickets.values())
+
+    results = []
+    for ticket_code in ticket_codes:
+        ticket = tickets.get(ticket_code.upper())
+        if signed_results[ticket_code] is not None:
+            data, status_code = signed_results[ticket_code]
+        elif ticket is None:
+            data, status_code = {"error": "Ticket not found."}, status.HTTP_404_NOT_FOUND
         else:
-            ticket.valid = False
-            return Response({"valid": False, "ticket_info": ticket_info, "message": "Ticket is invalid or expired."},
-                            status=status.HTTP_200_OK)
+            data, status_code = _ticket_check_result(ticket, ticket_type_catalog.for_ticket(ticket),
+                                                     draws_won.get(ticket.ticket_code, []))
+        results.append({"ticket_code": ticket_code, "status": status_code, **data})
 
+    return Response({"results": results}, status=status.HTTP_200_OK)
+
+
+@swagger_auto_schema(
+    method='POST',
+    operation_summary="Redeem Ticket",
+    operation_description="Check a ticket in at a gate. Succeeds for exactly one caller per ticket; later attempts "
+                          "get 409 with the original redemption.",
+    request_body=RedeemTicketSerializer,
+    manual_parameters=[idempotency_key_param],
+    responses={
+        200: openapi.Response(
+            description="Ticket redeemed.",
+            schema=openapi.Schema(
+                type=openapi.TYPE_OBJECT,
+                properties={
+                    'ticket_code': openapi.Schema(type=openapi.TYPE_STRING),
+                    'redeemed_at': openapi.Schema(type=openapi.TYPE_STRING, format=openapi.FORMAT_DATETIME),
+                    'redeemed_location': openapi.Schema(type=openapi.TYPE_STRING),
+                },
+            ),
+        ),
+        400: "Ticket is invalid or expired.",
+        404: "Ticket not found.",
+        409: "Ticket already redeemed.",
+        410: "Ticket type deleted.",
+    },
+)
+@api_view(["POST"])
+@permission_classes([CanScanTickets | IsAdminUser])
+@idempotent
+def redeem_ticket_view(request, ticket_code):
+    """
+    Redeem a ticket given its ticket_code. Open to admins and to scanner accounts holding
+    the `api.scan_tickets` permission; agents cannot check tickets in.
+
+    - `location` (str, optional): Gate or place of the redemption.
+
+    Returns:
+    - On success: The redemption time and location.
+    - On failure: Ticket not found, invalid or expired, or already redeemed (with the original
+      redemption time and location).
+    """
+    serializer = RedeemTicketSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    location = serializer.validated_data['location']
+
+    if not ticket_code_filter.might_contain(ticket_code):
+        return Response({"error": "Ticket not found."}, status=status.HTTP_404_NOT_FOUND)
+
+    try:
+        ticket = ticket_cache.get(ticket_code)
     except Ticket.DoesNotExist:
         return Response({"error": "Ticket not found."}, status=status.HTTP_404_NOT_FOUND)
 
+    ticket_type = ticket_type_catalog.for_ticket(ticket)
+    if ticket_type is None:
+        return Response({"error": "Ticket type deleted"}, status=status.HTTP_410_GONE)
+
+    # Archived tickets are expired, so only live tickets get this far
+    redeemed_at = None
+    if isinstance(ticket, Ticket) and ticket_type.expiration_date > timezone.now():
+        redeemed_at = redeem_ticket(ticket, request.user, location)
+
+    if redeemed_at is not None:
+        logger.info(f"Ticket {ticket.ticket_code} redeemed by {request.user.pk} at '{location}'")
+        return Response({"ticket_code": ticket.ticket_code, "redeemed_at": redeemed_at,
+                         "redeemed_location": location}, status=status.HTTP_200_OK)
+
+    # Lost the race or was never redeemable: read the current state to explain why
+    current = Ticket.objects.filter(pk=ticket.pk).values('redeemed_at', 'redeemed_location').first()
+    if current is not None and current['redeemed_at'] is not None:
+        return Response({"error": "Ticket already redeemed.", **current}, status=status.HTTP_409_CONFLICT)
+
+    return Response({"error": "Ticket is invalid or expired."}, status=status.HTTP_400_BAD_REQUEST)
+
+
+def _filter_tickets_by_date(tickets, query_params):
+    """
+    Apply the `period` or `start_date`/`end_date` filters of the ticket listing.
+
+    Returns:
+    - The filtered queryset and an error message (None if the filters are valid).
+    """
+    start_date = query_params.get('start_date')
+    end_date = query_params.get('end_date')
+    period = query_params.get('period')
+
+    if period == 'today':
+        today = timezone.now().date()
+        tickets = tickets.filter(created_at__date=today)
+    elif period == 'week':
+        start_of_week = timezone.now() - timedelta(days=7)
+        tickets = tickets.filter(created_at__gte=start_of_week)
+    elif period == 'month':
+        start_of_month = timezone.now() - timedelta(days=30)
+        tickets = tickets.filter(created_at__gte=start_of_month)
+    elif start_date and end_date:
+        # Validate and filter by specific date range
+        try:
+            start_date = timezone.make_aware(datetime.strptime(start_date, '%Y-%m-%d'))
+            end_date = timezone.make_aware(datetime.strptime(end_date, '%Y-%m-%d')) + timedelta(days=1)  # Inclusive
+            tickets = tickets.filter(created_at__range=(start_date, end_date))
+        except ValueError:
+            return tickets, "Invalid date format. Use YYYY-MM-DD."
+
+    return tickets, None
+
 
 @swagger_auto_schema(
     method='GET',
@@ -394,6 +922,20 @@ def check_ticket_validity(request, ticket_code):
             type=openapi.TYPE_STRING,
             enum=['today', 'week', 'month'],
         ),
+        openapi.Parameter(
+            'page_size',
+            openapi.IN_QUERY,
+            description="Return a page of this many tickets (default 100, max 1000), ordered by creation time.",
+            type=openapi.TYPE_INTEGER,
+        ),
+        openapi.Parameter(
+            'cursor',
+            openapi.IN_QUERY,
+            description="The `next_cursor` of the previous page.",
+            type=openapi.TYPE_STRING,
+        ),
+        fields_param,
+        expand_param,
     ],
     responses={
         200: openapi.Response(
@@ -416,6 +958,8 @@ def check_ticket_validity(request, ticket_code):
                             },
                         ),
                     ),
+                    'next_cursor': openapi.Schema(type=openapi.TYPE_STRING,
+                                                  description="Only when paginating; null on the last page."),
                 },
             ),
         ),
@@ -436,8 +980,15 @@ def get_agent_tickets(request):
     """
     Retrieve tickets associated with the authenticated agent or all tickets if the user is an admin,
     with optional date filtering.
+
+    - `page_size` (int, optional) / `cursor` (str, optional): Return one page ordered by creation
+      time, with the `next_cursor` to pass for the following page (null on the last page).
+      Without either parameter, all matching tickets are returned.
+    - `fields` (str, optional): Comma-separated fields to return, e.g. `ticket_code,buyer_name,created_at`.
+      `agent` and `ticket_type` come back as ids unless also listed in `expand` (str, optional).
     """
 
+    # Agents come with the tickets and types from the catalog, so any page costs a fixed number of queries
     if request.user.is_staff or request.user.is_superuser:
         tickets = Ticket.objects.all()
     else:
@@ -447,29 +998,92 @@ def get_agent_tickets(request):
 
         tickets = Ticket.objects.filter(agent=request.user)
 
-    start_date = request.query_params.get('start_date')
-    end_date = request.query_params.get('end_date')
-    period = request.query_params.get('period')
+    tickets, error = _filter_tickets_by_date(tickets, request.query_params)
+    if error:
+        return Response({"error": error}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        page = page_params(request.query_params)
+        encoder = ticket_row_encoder.select_from_params(request.query_params)
+    except ValueError as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    # Serialize the tickets from a values() projection of the requested fields
+    rows = _ticket_rows(tickets, encoder, page)
+    if page is None:
+        return Response({"tickets": encoder.encode_many(rows)}, status=status.HTTP_200_OK)
+
+    rows, next_cursor = split_page(list(rows), page[1])
+    return Response({"tickets": encoder.encode_many(rows), "next_cursor": next_cursor},
+                    status=status.HTTP_200_OK)
 
-    if period == 'today':
-        today = timezone.now().date()
-        tickets = tickets.filter(created_at__date=today)
-    elif period == 'week':
-        start_of_week = timezone.now() - timedelta(days=7)
-        tickets = tickets.filter(created_at__gte=start_of_week)
-    elif period == 'month':
-        start_of_month = timezone.now() - timedelta(days=30)
-        tickets = tickets.filter(created_at__gte=start_of_month)
-    elif start_date and end_date:
-        # Validate and filter by specific date range
-        try:
-            start_date = timezone.make_aware(datetime.strptime(start_date, '%Y-%m-%d'))
-            end_date = timezone.make_aware(datetime.strptime(end_date, '%Y-%m-%d')) + timedelta(days=1)  # Inclusive
-            tickets = tickets.filter(created_at__range=(start_date, end_date))
-        except ValueError:
-            return Response({"error": "Invalid date format. Use YYYY-MM-DD."}, status=status.HTTP_400_BAD_REQUEST)
 
-    # Serialize and return the tickets
-    ticket_serializer = TicketSerializer(tickets, many=True)
+def _ticket_rows(tickets, encoder, page):
+    """
+    The `values()` rows `encoder` needs from `tickets`, limited to the requested page if any.
+    """
+    if page is None:
+        return tickets.values(*encoder.value_fields)
+
+    lookups = encoder.value_fields
+    lookups += [lookup for lookup in CURSOR_FIELDS if lookup not in lookups]
+    cursor, page_size = page
+    return keyset_page(tickets.values(*lookups), cursor, page_size)
+
+
+@swagger_auto_schema(
+    method='GET',
+    operation_summary="Get Ticket Issuance Job",
+    operation_description="Poll the progress of a background ticket issuance job and page through the issued codes.",
+    manual_parameters=[
+        openapi.Parameter(
+            'page',
+            openapi.IN_QUERY,
+            description="Page of issued ticket codes to return (starting at 1).",
+            type=openapi.TYPE_INTEGER,
+        ),
+        openapi.Parameter(
+            'page_size',
+            openapi.IN_QUERY,
+            description="Number of ticket codes per page (default 100, max 1000).",
+            type=openapi.TYPE_INTEGER,
+        ),
+    ],
+    responses={200: TicketIssuanceJobSerializer(), 404: "Job not found."}
+)
+@api_view(['GET'])
+@permission_classes([IsAgent | IsAdminUser])
+def get_issuance_job(request, job_id):
+    """
+    Retrieve the progress of a background ticket issuance job and a page of its issued ticket codes.
+
+    - `job_id` (uuid): ID returned by `create_tickets`.
+    - `page` (int, optional): Page of ticket codes, starting at 1.
+    - `page_size` (int, optional): Ticket codes per page (default 100, max 1000).
+    """
+    try:
+        job = TicketIssuanceJob.objects.get(pk=job_id)
+    except TicketIssuanceJob.DoesNotExist:
+        return Response({"error": "Issuance job not found."}, status=status.HTTP_404_NOT_FOUND)
+
+    if job.agent_id != request.user.id and not (request.user.is_staff or request.user.is_superuser):
+        return Response({"error": "You are not authorized to view this job."}, status=status.HTTP_403_FORBIDDEN)
+
+    try:
+        page = max(int(request.query_params.get('page', 1)), 1)
+        page_size = min(max(int(request.query_params.get('page_size', 100)), 1), 1000)
+    except ValueError:
+        return Response({"error": "page and page_size must be integers."}, status=status.HTTP_400_BAD_REQUEST)
+
+    offset = (page - 1) * page_size
+    ticket_codes = list(
+        job.tickets.order_by('created_at', 'id').values_list('ticket_code', flat=True)[offset:offset + page_size]
+    )
 
-    return Response({"tickets": ticket_serializer.data}, status=status.HTTP_200_OK)
+    return Response({
+        "job": TicketIssuanceJobSerializer(job).data,
+        "tickets": ticket_codes,
+        "page": page,
+        "page_size": page_size,
+        "has_more": offset + len(ticket_codes) < job.issued,
+    }, status=status.HTTP_200_OK)
@@ -1,49 +1,36 @@
-import random
-import  string
-import uuid
-from api.models import User, Ticket, PayoutRequest, PayoutSettings
-from datetime import datetime
+from api.models import User, Ticket, PayoutSettings
+from api.allocator import login_ids, voucher_codes, ticket_codes, payment_ids
+from api.signed_codes import sign_ticket_code
+from django.conf import settings
 from django.utils import timezone
 
 
 def generate_loginid():
-    used_numbers = set()
-
-    while True:
-        letters = "".join(random.choices(string.ascii_uppercase, k=3))
-        number = random.randint(0, 999)
-        login_id = f"{letters}-{number:03d}"
-
-        if not login_id_exist(login_id) and number not in used_numbers:
-            used_numbers.add(number)
-            return login_id
-
-        if len(used_numbers) == 1000:
-            used_numbers.clear()
+    return login_ids.allocate(1)[0]
 
 def login_id_exist(login_id):
    return User.objects.filter(login_id=login_id).exists()
 
 def generate_voucher_code():
-    chars = string.ascii_uppercase + string.ascii_lowercase + string.digits
-    return "".join(random.choice(chars) for _ in range(10))
+    return voucher_codes.allocate(1)[0]
 
 
-def generate_ticket_code(length=8):
-    while True:
-        unique_id = ''.join(random.choices(string.ascii_uppercase + string.digits, k=length))
+def generate_ticket_code(ticket_type=None):
+    return generate_ticket_codes(1, ticket_type)[0]
 
-        if not Ticket.objects.filter(ticket_code=unique_id).exists():
-            return unique_id
 
-def generate_payment_id():
-    while True:
-        date_str = datetime.now().strftime('%Y%m%d')
-        random_str = "".join(random.choices(string.ascii_uppercase + string.digits, k=6))
-        payment_id = f"PAY{date_str}{random_str}"
+def generate_ticket_codes(count, ticket_type=None):
+    """
+    Allocate `count` unique ticket codes in one call. With `SIGNED_TICKET_CODES` on,
+    codes for `ticket_type` carry a MAC over their serial and type.
+    """
+    codes = ticket_codes.allocate(count)
+    if settings.SIGNED_TICKET_CODES and ticket_type is not None:
+        codes = [sign_ticket_code(code, ticket_type.id) for code in codes]
+    return codes
 
-        if not PayoutRequest.objects.filter(payment_id=payment_id).exists():
-            return  payment_id
+def generate_payment_id():
+    return payment_ids.allocate(1)[0]
 
 def calculate_salary(user):
     payout_settings = PayoutSettings.objects.first()
@@ -2,6 +2,7 @@ from rest_framework import serializers
 from api.models import Voucher, User
 from api.utilities import generate_voucher_code
 from api.account.serializers import UserSerializer
+from api.encoders import RowEncoder
 
 class VoucherListSerializer(serializers.ModelSerializer):
     owner = UserSerializer(read_only=True)
@@ -10,6 +11,9 @@ class VoucherListSerializer(serializers.ModelSerializer):
         model = Voucher
         fields = ['id', 'voucher_code', 'owner', 'amount', 'processed', 'created_at']
 
+# `values()` fast path of VoucherListSerializer for listings
+voucher_list_encoder = RowEncoder(VoucherListSerializer)
+
 class VoucherDetailSerializer(serializers.ModelSerializer):
     owner = UserSerializer(read_only=True)
     seller = UserSerializer(read_only=True)
@@ -46,10 +50,6 @@ class CreateVoucherSerializer(serializers.ModelSerializer):
         # Generate a unique voucher code
         voucher_code = generate_voucher_code()
 
-        # Ensure the generated code is unique
-        while Voucher.objects.filter(voucher_code=voucher_code).exists():
-            voucher_code = generate_voucher_code()
-
         validated_data['owner'] = self.context['request'].user
 
         # Create the voucher
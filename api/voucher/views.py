@@ -3,8 +3,11 @@ from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from api.account.permissions import IsAdmin, IsMerchant, IsAgent
+from api.idempotency import idempotent, idempotency_key_param
+from api.encoders import fields_param, expand_param
 from api.models import Voucher, Wallet
-from api.voucher.serializer import CreateVoucherSerializer, VoucherDetailSerializer, VoucherListSerializer, VoucherProcessSerializer
+from api.voucher.serializer import CreateVoucherSerializer, VoucherDetailSerializer, VoucherListSerializer, VoucherProcessSerializer, \
+    voucher_list_encoder
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
 from django.db import transaction
@@ -20,7 +23,7 @@ processed_param = openapi.Parameter(
 )
 @swagger_auto_schema(
     method='GET',
-    manual_parameters=[processed_param],
+    manual_parameters=[processed_param, fields_param, expand_param],
     responses={200: VoucherListSerializer(many=True)}
 )
 @api_view(['GET'])
@@ -29,8 +32,12 @@ def sold_vouchers(request):
     """
     Retrieve all vouchers sold by the authenticated merchant/admin.
 
+    - `fields` (str, optional): Comma-separated fields to return; `owner` comes back as an id
+      unless also listed in `expand` (str, optional).
+
     Returns:
     - `200 OK`: A list of vouchers sold by the merchant.
+    - `400 Bad Request`: Unknown field in `fields` or `expand`.
     - `403 Forbidden`: The user is not authorized to access this resource.
     - `401 Unauthorized`: Authentication credentials were not provided.
     """
@@ -43,15 +50,18 @@ def sold_vouchers(request):
     if processed:
         vouchers = vouchers.filter(processed=(processed.lower() == 'true'))
 
-    # Serialize the vouchers
-    serializer = VoucherListSerializer(vouchers, many=True)
+    try:
+        encoder = voucher_list_encoder.select_from_params(request.query_params)
+    except ValueError as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
-    return Response(serializer.data, status=status.HTTP_200_OK)
+    # Serialize the vouchers from a values() projection (owners are joined in the same query unless left out)
+    return Response(encoder.render(vouchers), status=status.HTTP_200_OK)
 
 
 @swagger_auto_schema(
     method='GET',
-    manual_parameters=[processed_param],
+    manual_parameters=[processed_param, fields_param, expand_param],
     responses={200: VoucherListSerializer(many=True)}
 )
 @api_view(['GET'])
@@ -59,8 +69,12 @@ def bought_vouchers(request):
     """
     Retrieve all vouchers bought by the authenticated user.
 
+    - `fields` (str, optional): Comma-separated fields to return; `owner` comes back as an id
+      unless also listed in `expand` (str, optional).
+
     Returns:
     - `200 OK`: A list of vouchers bought by the user.
+    - `400 Bad Request`: Unknown field in `fields` or `expand`.
     - `403 Forbidden`: The user is not authorized to access this resource.
     - `401 Unauthorized`: Authentication credentials were not provided.
     """
@@ -73,18 +87,23 @@ def bought_vouchers(request):
     if processed:
         vouchers = vouchers.filter(processed=(processed.lower() == 'true'))
 
-    # Serialize the vouchers
-    serializer = VoucherListSerializer(vouchers, many=True)
+    try:
+        encoder = voucher_list_encoder.select_from_params(request.query_params)
+    except ValueError as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
-    return Response(serializer.data, status=status.HTTP_200_OK)
+    # Serialize the vouchers from a values() projection (owners are joined in the same query unless left out)
+    return Response(encoder.render(vouchers), status=status.HTTP_200_OK)
 
 @swagger_auto_schema(
     method='POST',
     request_body=CreateVoucherSerializer,
+    manual_parameters=[idempotency_key_param],
     responses={
         201: "Success"}
 )
 @api_view(["POST"])
+@idempotent
 def create_voucher(request):
     """
     Create a voucher for Agents or Merchants based on their roles.
@@ -152,12 +171,12 @@ def get_voucher(request):
 
     if voucher_id:
         try:
-            voucher = Voucher.objects.get(id=voucher_id)
+            voucher = Voucher.objects.select_related('owner', 'seller').get(id=voucher_id)
         except Voucher.DoesNotExist:
             return Response({"error": "Voucher not found"}, status=status.HTTP_404_NOT_FOUND)
     elif voucher_code:
         try:
-            voucher = Voucher.objects.get(voucher_code=voucher_code)
+            voucher = Voucher.objects.select_related('owner', 'seller').get(voucher_code=voucher_code)
         except Voucher.DoesNotExist:
             return Response({"error": "Voucher not found"}, status=status.HTTP_404_NOT_FOUND)
     else:
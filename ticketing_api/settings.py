@@ -13,6 +13,7 @@ https://docs.djangoproject.com/en/4.2/ref/settings/
 from pathlib import Path
 import os
 import ssl
+import tempfile
 
 from django.conf import ENVIRONMENT_VARIABLE
 from dotenv import load_dotenv
@@ -53,6 +54,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "api.middleware.AdmissionControlMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "corsheaders.middleware.CorsMiddleware",
@@ -73,6 +75,16 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
     ),
+    # orjson-backed JSON with the same output as DRF's (plain DRF when orjson is missing)
+    'DEFAULT_RENDERER_CLASSES': (
+        'api.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    'DEFAULT_PARSER_CLASSES': (
+        'api.parsers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ),
 
 }
 
@@ -200,6 +212,18 @@ DATABASES = {
 }
 
 
+# Cache
+# Shared by all workers (catalog and code filter versions, ticket revisions), so it must not be
+# process-local. Entries can be evicted early, so idempotency keys have their own table instead.
+# The database cache needs `python manage.py createcachetable`.
+CACHES = {
+    "default": {
+        "BACKEND": os.getenv("CACHE_BACKEND", "django.core.cache.backends.db.DatabaseCache"),
+        "LOCATION": os.getenv("CACHE_LOCATION", "api_cache"),
+    }
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -255,5 +279,74 @@ EMAIL_HOST_USER = os.getenv("EMAIL_USER")
 EMAIL_HOST_PASSWORD = os.getenv("EMAIL_PASSWORD")
 DEFAULT_FROM_EMAIL = os.getenv("DEFAULT_FROM_EMAIL")
 
-
-
+# Ticket issuance
+# Requests for at least this many tickets (or with `background=true`) are issued by a background job
+TICKET_ISSUANCE_ASYNC_THRESHOLD = int(os.getenv("TICKET_ISSUANCE_ASYNC_THRESHOLD", 1000))
+# Tickets written per transaction by the background job
+TICKET_ISSUANCE_CHUNK_SIZE = int(os.getenv("TICKET_ISSUANCE_CHUNK_SIZE", 500))
+# In-process worker threads; set to 0 to leave jobs to `manage.py process_issuance_jobs`
+TICKET_ISSUANCE_WORKERS = int(os.getenv("TICKET_ISSUANCE_WORKERS", 2))
+# Seconds without a heartbeat after which `process_issuance_jobs --resume` may take a running job over;
+# keep it well above the time one chunk takes
+TICKET_ISSUANCE_LEASE_SECONDS = int(os.getenv("TICKET_ISSUANCE_LEASE_SECONDS", 120))
+
+# Ticket cache used by the validity check
+# Every lookup reads a revision from the shared cache, so the ticket cache needs a network cache
+# (Memcached or Redis); on the database cache it would cost more queries than it saves
+SHARED_MEMORY_CACHE = any(name in CACHES["default"]["BACKEND"] for name in ("memcached", "redis"))
+# Tickets kept per process; set to 0 to disable (the default without a Memcached or Redis cache)
+TICKET_CACHE_SIZE = int(os.getenv("TICKET_CACHE_SIZE", 10000 if SHARED_MEMORY_CACHE else 0))
+# Seconds a cached ticket is served before it is reloaded
+TICKET_CACHE_TTL = int(os.getenv("TICKET_CACHE_TTL", 30))
+
+# Bloom filter that rejects unknown ticket codes before they reach the database
+TICKET_CODE_FILTER_ENABLED = os.getenv("TICKET_CODE_FILTER_ENABLED", "true").lower() == "true"
+# False positive rate; 0.001 costs about 1.7 MB per million codes
+TICKET_CODE_FILTER_ERROR_RATE = float(os.getenv("TICKET_CODE_FILTER_ERROR_RATE", 0.001))
+
+# Sales velocity limits per agent (tickets per sliding window); 0 disables a limit. Off by default:
+# a single sale larger than a limit is refused with 400, so when enabling them keep the limits
+# above the largest sale an agent may make (background sales run to many thousands of tickets)
+TICKET_VELOCITY_PER_MINUTE = int(os.getenv("TICKET_VELOCITY_PER_MINUTE", 0))
+TICKET_VELOCITY_PER_HOUR = int(os.getenv("TICKET_VELOCITY_PER_HOUR", 0))
+# 'cache' shares the counts through the cache backend; 'local' counts per process, so with
+# several workers the effective limit is the limit times the number of workers
+TICKET_VELOCITY_BACKEND = os.getenv("TICKET_VELOCITY_BACKEND", "cache")
+
+# Admission control
+ADMISSION_CONTROL_ENABLED = os.getenv("ADMISSION_CONTROL_ENABLED", "true").lower() == "true"
+# 'host' counts the requests of every worker process on the host, through ADMISSION_HOST_FILE;
+# 'local' counts per process, which only limits anything with threaded or async workers
+ADMISSION_BACKEND = os.getenv("ADMISSION_BACKEND", "host")
+ADMISSION_HOST_FILE = os.getenv("ADMISSION_HOST_FILE", os.path.join(tempfile.gettempdir(), "ticketing_api_admission"))
+# Concurrent requests admitted: the requests the host's workers can serve at once (gunicorn
+# --workers x --threads). Defaults to gunicorn's WEB_CONCURRENCY, i.e. sync workers.
+ADMISSION_MAX_IN_FLIGHT = int(os.getenv("ADMISSION_MAX_IN_FLIGHT", os.getenv("WEB_CONCURRENCY", 32)))
+# Slots only ticket validation, redemption and sales may use
+ADMISSION_CRITICAL_RESERVE = int(os.getenv("ADMISSION_CRITICAL_RESERVE", ADMISSION_MAX_IN_FLIGHT // 4))
+# Concurrent heavy listings and reports
+ADMISSION_HEAVY_LIMIT = int(os.getenv("ADMISSION_HEAVY_LIMIT", max(ADMISSION_MAX_IN_FLIGHT // 8, 1)))
+# Seconds clients are asked to wait after a 503
+ADMISSION_RETRY_AFTER = int(os.getenv("ADMISSION_RETRY_AFTER", 1))
+
+# Idempotency keys
+# How long a completed response is replayed for a repeated Idempotency-Key
+IDEMPOTENCY_KEY_TTL = int(os.getenv("IDEMPOTENCY_KEY_TTL", 60 * 60 * 24))
+# How long a duplicate request waits for the first one before giving up with 409
+IDEMPOTENCY_WAIT_TIMEOUT = int(os.getenv("IDEMPOTENCY_WAIT_TIMEOUT", 30))
+# Seconds a claimed key is held for its request before a retry may run it again. Must exceed the
+# longest synchronous write (a sale just under TICKET_ISSUANCE_ASYNC_THRESHOLD) and the worker
+# timeout, or a retry can run a sale that is still in progress a second time
+IDEMPOTENCY_PENDING_TIMEOUT = int(os.getenv("IDEMPOTENCY_PENDING_TIMEOUT", 600))
+
+# Code allocator
+# Key of the permutation behind ticket, voucher, payment and login codes. Keep it stable:
+# changing it only costs extra collision checks, but it should not follow SECRET_KEY rotations.
+CODE_ALLOCATOR_SECRET = os.getenv("CODE_ALLOCATOR_SECRET", SECRET_KEY)
+
+# Signed ticket codes
+# Issue 16 character codes carrying a MAC over their serial and ticket type, so forged and
+# expired codes are rejected without the database. Existing 8 character codes keep working.
+SIGNED_TICKET_CODES = os.getenv("SIGNED_TICKET_CODES", "false").lower() == "true"
+# Changing the key invalidates every signed code already issued
+TICKET_CODE_SIGNING_KEY = os.getenv("TICKET_CODE_SIGNING_KEY", SECRET_KEY)